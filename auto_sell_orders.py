@@ -12,9 +12,13 @@ import logging.handlers
 # import sqlite3  # Migrated to PostgreSQL
 import time
 import hashlib
+import signal
+import heapq
+import threading
 from datetime import datetime
 from decimal import Decimal, ROUND_DOWN, getcontext
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 # Set Decimal precision for consistency with create_algo_triggers.py
 getcontext().prec = 28
@@ -29,13 +33,36 @@ except ImportError:
         pass
     load_dotenv()
 
-from okx_client import OKXClient, get_order_operation_error
+from okx_client import OKXClient, get_order_operation_error, get_balance_snapshot, invalidate_balance_snapshot
+from utils_rate_limit import get_rate_limiter
+from utils_instruments import get_instrument_store
+from lib.database import log_pool_stats, notify, SOLD_CHANNEL
 from utils_time import (
     get_utc_now, get_today_start_sgt_timestamp_ms,
     timestamp_to_utc_datetime_naive, format_datetime_utc, get_log_filename,
     datetime_to_timestamp_ms,
 )
 
+# Interrupted-sell recovery: one orders-history walk, then parallel get_order for the rest
+SELL_RECOVERY_PAGE_LIMIT = 100
+SELL_RECOVERY_MAX_PAGES = 5
+SELL_RECOVERY_WORKERS = 8
+# orders-history only covers the last 7 days; start a little before the earliest due sell
+SELL_RECOVERY_LOOKBACK_MS = 60 * 60 * 1000
+
+# Sell scheduler: reload deadlines for new fills, run a full pass for legacy
+# rows and pending orders, and back off lots that could not be sold yet
+SCHEDULER_REFRESH_SECONDS = 60
+SCHEDULER_RECONCILE_SECONDS = 15 * 60
+SCHEDULER_RETRY_SECONDS = 60
+
+# Columns this script reads that older filled_orders tables may lack:
+# (name, type).  Checked once per process, added only when missing.
+SELL_STATE_COLUMNS = (
+    ('sell_client_order_id', 'TEXT'),
+)
+_sell_state_columns_ready = False
+
 def setup_logging():
     """Setup logging with file rotation"""
     log_filename = get_log_filename('auto_sell_orders')
@@ -71,13 +98,20 @@ def setup_logging():
     return logger
 
 class AutoSellOrders:
-    def __init__(self):
+    def __init__(self, okx_client=None, aggregate_lots=None):
         """Initialize with environment variables and API connection"""
         self.logger = setup_logging()
         self.conn = None
         self.cursor = None
         self.min_usd_value = 0.01
         self.instrument_rules_cache = {}
+        # Sell all due lots of an instrument in one market order (needs the sell_client_order_id column)
+        if aggregate_lots is None:
+            aggregate_lots = os.getenv('OKX_AGGREGATE_SELLS', 'false').lower() == 'true'
+        self.aggregate_lots = aggregate_lots
+        # Sell scheduler control; wake() reloads deadlines immediately after new fills
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
         
         # Load environment variables
         self.api_key = os.getenv('OKX_API_KEY')
@@ -89,11 +123,14 @@ class AutoSellOrders:
         if not all([self.api_key, self.secret_key, self.passphrase]):
             raise ValueError("Missing required environment variables: OKX_API_KEY, OKX_SECRET_KEY, OKX_PASSPHRASE")
         
-        # Initialize OKX Client
-        self.okx_client = OKXClient(self.logger)
+        # Initialize OKX Client (a long-running caller may share its own)
+        self.okx_client = okx_client or OKXClient(self.logger)
         self.trade_api = self.okx_client.get_trade_api()
 
-        self.logger.info(f"🚀 Auto Sell Orders - {'Demo' if self.testnet else 'Live'} mode")
+        self.logger.info(
+            f"🚀 Auto Sell Orders - {'Demo' if self.testnet else 'Live'} mode"
+            f"{' (aggregating lots per instrument)' if self.aggregate_lots else ''}"
+        )
 
     def format_price(self, price_str):
         """Format price string using Decimal for consistency"""
@@ -125,11 +162,37 @@ class AutoSellOrders:
 
         self.min_usd_value = self.load_auto_sell_config()
 
-        from lib.database import get_database_connection
-        self.conn = get_database_connection()
+        from lib.database import acquire_connection
+        self.conn = acquire_connection()
         self.cursor = self.conn.cursor()
         self.logger.info("✅ Connected to PostgreSQL database")
         self.logger.info(f"⚙️  Auto-sell threshold loaded: ${self.min_usd_value}")
+        self.ensure_sell_state_columns()
+
+    def ensure_sell_state_columns(self):
+        """Add sell-state columns missing on databases that predate migrate_filled_orders.py.
+
+        The catalog lookup takes no table lock; ALTER TABLE only runs when a
+        column is actually missing.
+        """
+        global _sell_state_columns_ready
+        if _sell_state_columns_ready:
+            return
+        try:
+            self.cursor.execute('''
+                SELECT column_name FROM information_schema.columns
+                WHERE table_name = 'filled_orders' AND column_name = ANY(%s)
+            ''', ([name for name, _type in SELL_STATE_COLUMNS],))
+            existing = {row[0] for row in self.cursor.fetchall()}
+            for name, column_type in SELL_STATE_COLUMNS:
+                if name not in existing:
+                    self.cursor.execute(f'ALTER TABLE filled_orders ADD COLUMN IF NOT EXISTS {name} {column_type}')
+                    self.logger.info(f"🛠️ Added missing filled_orders.{name} column")
+            self.conn.commit()
+            _sell_state_columns_ready = True
+        except Exception as e:
+            self.conn.rollback()
+            self.logger.warning(f"⚠️ Could not verify filled_orders sell-state columns: {e}")
 
     def has_significant_non_usdt_assets(self):
         """Check trading account for non-USDT assets with meaningful USD value.
@@ -143,27 +206,15 @@ class AutoSellOrders:
             return True
 
         try:
-            result = account_api.get_account_balance()
-            if not result or result.get('code') != '0':
-                self.logger.warning(f"⚠️ Failed to query trading account balances, falling back to DB-backed auto-sell flow: {result}")
-                return True
-
-            data = result.get('data', [])
-            if not data:
+            snapshot = get_balance_snapshot(account_api)
+            if not snapshot.has_data:
                 self.logger.info("🔍 Trading account balance returned no data; skipping DB-backed auto-sell check")
                 return False
 
-            details = data[0].get('details', [])
-            significant_assets = []
-
-            for detail in details:
-                ccy = (detail.get('ccy') or '').upper()
-                if not ccy or ccy == 'USDT':
-                    continue
-
-                eq_usd = self._safe_float(detail.get('eqUsd'))
-                if eq_usd >= self.min_usd_value:
-                    significant_assets.append((ccy, eq_usd))
+            significant_assets = [
+                (ccy, eq_usd) for ccy, eq_usd in snapshot.non_usdt_assets()
+                if eq_usd >= self.min_usd_value
+            ]
 
             if significant_assets:
                 assets_text = ", ".join(f"{ccy}:${eq_usd:.4f}" for ccy, eq_usd in significant_assets[:10])
@@ -187,36 +238,39 @@ class AutoSellOrders:
         due_sell_time_ts = now_ts
         today_start_ts = get_today_start_sgt_timestamp_ms()
         
+        # One branch per partial index (see migrate_filled_orders.py) so each
+        # range predicate is served by an index scan instead of a table scan.
         self.cursor.execute('''
-            SELECT instId, ordId, tradeId, fillSz, side, ts, sell_time, fillPx, sold_status, sell_order_id
-            FROM filled_orders 
-            WHERE (sold_status IS NULL OR sold_status IN ('PROCESSING', 'SELL_SUBMITTED'))
-              AND side = 'buy'
-              AND (
-                (
-                  sell_time IS NOT NULL
-                  AND sell_time != ''
-                  AND sell_time ~ '^[0-9]+$'
-                  AND CAST(sell_time AS BIGINT) <= %s
-                )
-                OR
-                (
-                  (sell_time IS NULL OR sell_time = '')
-                  AND ts IS NOT NULL
-                  AND ts != ''
-                  AND ts ~ '^[0-9]+$'
-                  AND CAST(ts AS BIGINT) < %s
-                )
-              )
-            ORDER BY CAST(COALESCE(NULLIF(sell_time, ''), NULLIF(ts, '')) AS BIGINT) ASC
-        ''', (due_sell_time_ts, today_start_ts))
+            SELECT instId, ordId, tradeId, fillSz, side, ts, sell_time, fillPx, sold_status, sell_order_id, sell_client_order_id
+            FROM (
+                SELECT instId, ordId, tradeId, fillSz, side, ts, sell_time, fillPx, sold_status, sell_order_id, sell_client_order_id
+                FROM filled_orders
+                WHERE side = 'buy'
+                  AND sold_status IS NULL
+                  AND sell_time <= %s
+                UNION ALL
+                SELECT instId, ordId, tradeId, fillSz, side, ts, sell_time, fillPx, sold_status, sell_order_id, sell_client_order_id
+                FROM filled_orders
+                WHERE side = 'buy'
+                  AND sold_status IN ('PROCESSING', 'SELL_SUBMITTED')
+                  AND sell_time <= %s
+                UNION ALL
+                SELECT instId, ordId, tradeId, fillSz, side, ts, sell_time, fillPx, sold_status, sell_order_id, sell_client_order_id
+                FROM filled_orders
+                WHERE side = 'buy'
+                  AND (sold_status IS NULL OR sold_status IN ('PROCESSING', 'SELL_SUBMITTED'))
+                  AND sell_time IS NULL
+                  AND ts < %s
+            ) due
+            ORDER BY COALESCE(sell_time, ts) ASC
+        ''', (due_sell_time_ts, due_sell_time_ts, today_start_ts))
         
         orders = self.cursor.fetchall()
         
         if orders:
             self.logger.info(f"🔍 Found {len(orders)} due buy orders, ready to sell")
             for order in orders:
-                inst_id, ord_id, trade_id, fill_sz, side, ts, sell_time, fill_px, sold_status, sell_order_id = order
+                inst_id, ord_id, trade_id, fill_sz, side, ts, sell_time, fill_px, sold_status, sell_order_id, *_ = order
                 buy_datetime = timestamp_to_utc_datetime_naive(int(ts)) if ts else None
                 buy_date_str = format_datetime_utc(buy_datetime) if buy_datetime else 'N/A'
                 buy_price = self.format_price(fill_px)
@@ -241,13 +295,11 @@ class AutoSellOrders:
         """
         self.cursor.execute('''
             UPDATE filled_orders
-            SET sell_time = CAST(CAST(ts AS BIGINT) + %s AS TEXT)
+            SET sell_time = ts + %s
             WHERE side = 'buy'
               AND sold_status IS NULL
               AND ts IS NOT NULL
-              AND ts != ''
-              AND ts ~ '^[0-9]+$'
-              AND sell_time IS DISTINCT FROM CAST(CAST(ts AS BIGINT) + %s AS TEXT)
+              AND sell_time IS DISTINCT FROM ts + %s
         ''', (24 * 60 * 60 * 1000, 24 * 60 * 60 * 1000))
         updated_count = self.cursor.rowcount
         if updated_count:
@@ -268,11 +320,8 @@ class AutoSellOrders:
             FROM filled_orders
             WHERE side = 'buy'
               AND (sold_status IS NULL OR sold_status != 'SOLD')
-              AND ts IS NOT NULL
-              AND ts != ''
-              AND ts ~ '^[0-9]+$'
-              AND CAST(ts AS BIGINT) < %s
-            ORDER BY CAST(ts AS BIGINT) ASC
+              AND ts < %s
+            ORDER BY ts ASC
         ''', (today_start_ts,))
         orders = self.cursor.fetchall()
 
@@ -319,7 +368,7 @@ class AutoSellOrders:
         try:
             self.cursor.execute('''
                 UPDATE filled_orders 
-                SET sold_status = NULL, sell_order_id = NULL
+                SET sold_status = NULL, sell_order_id = NULL, sell_client_order_id = NULL
                 WHERE tradeId = %s AND sold_status IN ('PROCESSING', 'SELL_SUBMITTED')
             ''', (trade_id,))
             self.conn.commit()
@@ -342,10 +391,11 @@ class AutoSellOrders:
         return result or '0'
 
     def get_instrument_sell_rules(self, inst_id):
-        """Return the exchange lot/minimum size rules, cached per instrument.
+        """Return the exchange lot/minimum size rules from the shared instrument store.
 
         Falling back to ``None`` preserves the existing configured USD
-        threshold when exchange metadata is temporarily unavailable.
+        threshold when exchange metadata is temporarily unavailable.  Misses
+        are not cached, so a reused instance retries once the store refreshes.
         """
         cache = getattr(self, 'instrument_rules_cache', {})
         if inst_id in cache:
@@ -355,18 +405,13 @@ class AutoSellOrders:
             api = self.okx_client.get_public_api() or self.okx_client.get_market_api()
             if not api or not hasattr(api, 'get_instruments'):
                 self.logger.warning(f"⚠️ No instrument metadata API for {inst_id}; using configured USD threshold")
-                cache[inst_id] = None
-                self.instrument_rules_cache = cache
                 return None
 
-            result = api.get_instruments(instType='SPOT', instId=inst_id)
-            if result.get('code') != '0' or not result.get('data'):
+            item = get_instrument_store().get(inst_id, api)
+            if not item:
                 self.logger.warning(f"⚠️ Could not load sell rules for {inst_id}; using configured USD threshold")
-                cache[inst_id] = None
-                self.instrument_rules_cache = cache
                 return None
 
-            item = result['data'][0]
             lot_sz = Decimal(str(item.get('lotSz', '0')))
             min_sz = Decimal(str(item.get('minSz', '0')))
             if lot_sz <= 0 or min_sz <= 0:
@@ -378,8 +423,6 @@ class AutoSellOrders:
             return rules
         except Exception as e:
             self.logger.warning(f"⚠️ Could not load sell rules for {inst_id}; using configured USD threshold: {e}")
-            cache[inst_id] = None
-            self.instrument_rules_cache = cache
             return None
 
     @staticmethod
@@ -401,45 +444,34 @@ class AutoSellOrders:
                 self.logger.warning(f"⚠️ Account API not initialized, cannot get {base_ccy} trading account balance")
                 return 0.0, 0.0, 0.0, False, False
             
-            result = account_api.get_account_balance(ccy=base_ccy)
-            
-            if not result or result.get('code') != '0':
-                self.logger.warning(f"⚠️ Cannot get {base_ccy} trading account balance (OKX code: {result.get('code') if result else 'empty'})")
+            # Shared full-account snapshot instead of one request per instrument
+            snapshot = get_balance_snapshot(account_api)
+            if not snapshot.has_data:
+                self.logger.warning("⚠️ Trading account balance returned empty data")
                 return 0.0, 0.0, 0.0, False, False
-            
-            data = result.get('data', [])
-            if not data:
-                self.logger.warning(f"⚠️ Trading account balance returned empty data: {result}")
-                return 0.0, 0.0, 0.0, False, False
-            
-            details = data[0].get('details', [])
-            self.logger.info(f"📊 Trading account detail entries: {len(details)} | Returned currencies: {[d.get('ccy') for d in details][:20]}")
-            
-            for detail in details:
-                ccy = detail.get('ccy', '').upper()
-                if ccy == base_ccy:
-                    # Prioritize availBal; if missing or 0, fall back to availEq (trading account available equity)
-                    avail_val = self._safe_float(detail.get('availBal'))
-                    if avail_val <= 0:
-                        avail_val = self._safe_float(detail.get('availEq'))
-                    
-                    # Estimate USD value of available balance (not total/frozen balance)
-                    eq_usd_val = self._safe_float(detail.get('eqUsd'))
-                    total_eq = self._safe_float(detail.get('eq'))
-                    if total_eq > 0:
-                        available_usd_val = eq_usd_val * max(0.0, avail_val) / total_eq
-                    else:
-                        available_usd_val = eq_usd_val
-                    frozen_bal = self._safe_float(detail.get('frozenBal'))
-                    ord_frozen = self._safe_float(detail.get('ordFrozen'))
-                    has_frozen_balance = frozen_bal > 0 or ord_frozen > 0
-                    
-                    self.logger.info(
-                        f"💰 {base_ccy} trading account available: {avail_val} | "
-                        f"Available USD equivalent: ${available_usd_val:.6f} | "
-                        f"Total USD equivalent: ${eq_usd_val:.6f} | Frozen: {has_frozen_balance}"
-                    )
-                    return avail_val, available_usd_val, eq_usd_val, has_frozen_balance, True
+
+            detail = snapshot.get(base_ccy)
+            if detail is not None:
+                # Prioritize availBal; if missing or 0, fall back to availEq (trading account available equity)
+                avail_val = self._safe_float(detail.get('availBal'))
+                if avail_val <= 0:
+                    avail_val = self._safe_float(detail.get('availEq'))
+                
+                # Estimate USD value of available balance (not total/frozen balance)
+                eq_usd_val = self._safe_float(detail.get('eqUsd'))
+                total_eq = self._safe_float(detail.get('eq'))
+                if total_eq > 0:
+                    available_usd_val = eq_usd_val * max(0.0, avail_val) / total_eq
+                else:
+                    available_usd_val = eq_usd_val
+                has_frozen_balance = snapshot.frozen(base_ccy) > 0
+                
+                self.logger.info(
+                    f"💰 {base_ccy} trading account available: {avail_val} | "
+                    f"Available USD equivalent: ${available_usd_val:.6f} | "
+                    f"Total USD equivalent: ${eq_usd_val:.6f} | Frozen: {has_frozen_balance}"
+                )
+                return avail_val, available_usd_val, eq_usd_val, has_frozen_balance, True
             
             self.logger.warning(f"⚠️ No balance information found for {base_ccy} in trading account details")
             return 0.0, 0.0, 0.0, False, False
@@ -453,6 +485,51 @@ class AutoSellOrders:
         """Stable client order ID allows safe recovery after a crash."""
         return f"sell{hashlib.sha256(str(trade_id).encode()).hexdigest()[:24]}"
 
+    @classmethod
+    def _group_client_order_id(cls, trade_ids):
+        """Stable client order ID for lots sold together; a single lot keeps its own ID."""
+        return cls._sell_client_order_id(','.join(sorted(str(trade_id) for trade_id in trade_ids)))
+
+    def mark_trades_processing(self, trade_ids, client_order_id):
+        """Lock a lot group in one statement and record its shared clOrdId.
+
+        Returns the trade IDs actually locked; lots already taken by another
+        run are left out of the group.
+        """
+        try:
+            self.cursor.execute('''
+                UPDATE filled_orders
+                SET sold_status = 'PROCESSING', sell_client_order_id = %s
+                WHERE tradeId = ANY(%s) AND sold_status IS NULL
+                RETURNING tradeId
+            ''', (client_order_id, list(trade_ids)))
+            locked = [row[0] for row in self.cursor.fetchall()]
+            self.conn.commit()
+            skipped = len(trade_ids) - len(locked)
+            self.logger.info(
+                f"🔒 Locked {len(locked)} lot(s) for processing"
+                f"{f', skipped {skipped} already taken or processed' if skipped else ''}"
+            )
+            return locked
+        except Exception as e:
+            self.conn.rollback()
+            self.logger.error(f"❌ Error locking trades {list(trade_ids)}: {e}")
+            return []
+
+    def mark_trades_sell_submitted(self, trade_ids, order_id):
+        try:
+            self.cursor.execute('''
+                UPDATE filled_orders
+                SET sold_status = 'SELL_SUBMITTED', sell_order_id = %s
+                WHERE tradeId = ANY(%s) AND sold_status = 'PROCESSING'
+            ''', (order_id, list(trade_ids)))
+            self.conn.commit()
+            return self.cursor.rowcount == len(trade_ids)
+        except Exception as e:
+            self.conn.rollback()
+            self.logger.error(f"❌ Failed to persist submitted sell for {list(trade_ids)}: {e}")
+            return False
+
     def mark_trade_sell_submitted(self, trade_id, order_id):
         try:
             self.cursor.execute('''
@@ -482,16 +559,110 @@ class AutoSellOrders:
                 reference = order_id or client_order_id
                 self.logger.warning(f"⚠️ Could not verify market sell {reference} for {inst_id}: {error_msg}")
                 return 'UNKNOWN'
-            state = result['data'][0].get('state')
-            if state == 'filled':
-                return 'FILLED'
-            if state in {'canceled', 'mmp_canceled'}:
-                return 'FAILED'
-            return 'PENDING'
+            return self._market_sell_state_from_order(result['data'][0])
         except Exception as e:
             self.logger.warning(f"⚠️ Error verifying market sell {order_id or client_order_id} for {inst_id}: {e}")
             return 'UNKNOWN'
 
+    @staticmethod
+    def _market_sell_state_from_order(order):
+        state = order.get('state')
+        if state == 'filled':
+            return 'FILLED'
+        if state in {'canceled', 'mmp_canceled'}:
+            return 'FAILED'
+        return 'PENDING'
+
+    def get_recent_market_sells(self, begin_ts, wanted_order_ids, wanted_client_ids):
+        """Page SPOT market orders-history (newest first) from ``begin_ts`` until every wanted order is seen.
+
+        Returns ``{ordId or clOrdId: order}``.  Only completed orders are listed,
+        so live sells are left for the per-order fallback.
+        """
+        found = {}
+        after = None
+        for _ in range(SELL_RECOVERY_MAX_PAGES):
+            params = {'instType': 'SPOT', 'ordType': 'market', 'limit': str(SELL_RECOVERY_PAGE_LIMIT)}
+            if begin_ts:
+                params['begin'] = str(begin_ts)
+            if after:
+                params['after'] = after
+            result = self.trade_api.get_orders_history(**params)
+            error_msg = get_order_operation_error(result)
+            if error_msg:
+                raise RuntimeError(f"OKX orders-history error: {error_msg}")
+            orders = result.get('data') or []
+            for order in orders:
+                if order.get('ordId') in wanted_order_ids:
+                    found[order['ordId']] = order
+                if order.get('clOrdId') in wanted_client_ids:
+                    found[order['clOrdId']] = order
+            if len(orders) < SELL_RECOVERY_PAGE_LIMIT or len(found) >= len(wanted_order_ids) + len(wanted_client_ids):
+                break
+            after = orders[-1].get('ordId')
+        return found
+
+    def recover_pending_sell_states(self, orders):
+        """Resolve every PROCESSING/SELL_SUBMITTED trade in one pass.
+
+        A bulk orders-history walk answers most interrupted sells in one or two
+        requests; whatever it does not cover (live orders, history gaps, API
+        errors) is checked with rate-limited get_order calls in parallel.
+        Returns ``{trade_id: state}`` using the get_market_sell_state values.
+        """
+        pending = [
+            (trade_id, inst_id, sell_order_id,
+             (rest[0] if rest and rest[0] else self._sell_client_order_id(trade_id)), sell_time or ts)
+            for inst_id, _ord_id, trade_id, _fill_sz, _side, ts, sell_time, _fill_px, sold_status, sell_order_id, *rest in orders
+            if sold_status in ('PROCESSING', 'SELL_SUBMITTED')
+        ]
+        if not pending:
+            return {}
+
+        states = {}
+        if getattr(self, 'trade_api', None) is not None:
+            try:
+                begin_ts = min(int(due) for *_rest, due in pending) - SELL_RECOVERY_LOOKBACK_MS
+            except (TypeError, ValueError):
+                begin_ts = None
+            try:
+                history = self.get_recent_market_sells(
+                    begin_ts,
+                    {sell_order_id for _, _, sell_order_id, _, _ in pending if sell_order_id},
+                    {client_id for _, _, sell_order_id, client_id, _ in pending if not sell_order_id},
+                )
+                for trade_id, _inst_id, sell_order_id, client_id, _due in pending:
+                    order = history.get(sell_order_id) if sell_order_id else history.get(client_id)
+                    if order:
+                        states[trade_id] = self._market_sell_state_from_order(order)
+            except Exception as e:
+                self.logger.warning(f"⚠️ Bulk sell recovery failed, checking orders one by one: {e}")
+
+        remaining = [item for item in pending if item[0] not in states]
+        if remaining:
+            # Aggregated lots share one order; look each order up only once
+            lookups = sorted({
+                (inst_id, sell_order_id or '', '' if sell_order_id else client_id)
+                for _trade_id, inst_id, sell_order_id, client_id, _due in remaining
+            })
+
+            def check(lookup):
+                inst_id, sell_order_id, client_id = lookup
+                if sell_order_id:
+                    return lookup, self.get_market_sell_state(inst_id, sell_order_id)
+                return lookup, self.get_market_sell_state(inst_id, client_order_id=client_id)
+
+            with ThreadPoolExecutor(max_workers=min(SELL_RECOVERY_WORKERS, len(lookups))) as executor:
+                checked = dict(executor.map(check, lookups))
+            for trade_id, inst_id, sell_order_id, client_id, _due in remaining:
+                states[trade_id] = checked[(inst_id, sell_order_id or '', '' if sell_order_id else client_id)]
+
+        self.logger.info(
+            f"🔎 Recovered {len(pending)} interrupted sell(s): "
+            f"{len(pending) - len(remaining)} from orders history, {len(remaining)} via get_order"
+        )
+        return states
+
     def place_market_sell_order(self, inst_id, size, client_order_id):
         """Place market sell order - check balance first, then decide sell amount"""
         self.logger.info(f"📤 Processing {inst_id}: requested size={size}")
@@ -578,6 +749,9 @@ class AutoSellOrders:
             # the network failure.  Retain PROCESSING and recover by clOrdId.
             self.logger.warning(f"⚠️ Sell submission outcome unknown for {inst_id}: {e}")
             return 'UNKNOWN', None
+        finally:
+            # Any submitted sell changes balances for the next position check
+            invalidate_balance_snapshot()
         
         error_msg = get_order_operation_error(result, require_data=True)
         if error_msg:
@@ -637,8 +811,10 @@ class AutoSellOrders:
                 WHERE tradeId = %s
                   AND sold_status IN ('PROCESSING', 'SELL_SUBMITTED')
             ''', [(trade_id,) for trade_id in trade_ids])
-            self.conn.commit()
             updated_count = self.cursor.rowcount
+            if updated_count:
+                notify(self.cursor, SOLD_CHANNEL, {'tradeIds': list(trade_ids)})
+            self.conn.commit()
             self.logger.info(f"✅ Batch marked {updated_count} trades as sold")
             return updated_count
         except Exception as e:
@@ -690,9 +866,37 @@ class AutoSellOrders:
 
 
 
+    def sell_lot_group(self, inst_id, lots):
+        """Sell every due lot of ``inst_id`` with one market order.
+
+        The summed size is rounded to lotSz once, so the per-lot rounding dust
+        is sold too.  Returns ``(trade_ids, sell_result)`` for the lots locked;
+        ``sell_result`` is None when the submitted order could not be persisted.
+        """
+        requested_ids = [trade_id for trade_id, _fill_sz in lots]
+        client_order_id = self._group_client_order_id(requested_ids)
+        trade_ids = self.mark_trades_processing(requested_ids, client_order_id)
+        if not trade_ids:
+            return [], None
+
+        locked = set(trade_ids)
+        total_size = sum((Decimal(str(fill_sz)) for trade_id, fill_sz in lots if trade_id in locked), Decimal('0'))
+        self.logger.info(f"📦 Aggregating {len(trade_ids)} lot(s) of {inst_id} into one sell: size={total_size}")
+
+        sell_result, sell_order_id = self.place_market_sell_order(
+            inst_id, self._decimal_to_plain_str(total_size), client_order_id
+        )
+        if sell_order_id and not self.mark_trades_sell_submitted(trade_ids, sell_order_id):
+            # The order may exist, but without durable state it is unsafe to submit again.
+            self.logger.error(f"❌ Retaining PROCESSING locks for {inst_id} lots; submitted order was not persisted")
+            return trade_ids, None
+        return trade_ids, sell_result
+
     def process_sell_orders(self, verify_daily_close=False):
-        """Process all orders ready to sell"""
+        """Process all orders ready to sell; returns the trade IDs marked as sold"""
         self.ensure_database_initialized()
+        # Reused sellers (daemon, scheduler) re-read rules the store may have refreshed
+        self.instrument_rules_cache = {}
         has_significant_assets = self.has_significant_non_usdt_assets()
         if has_significant_assets:
             self.normalize_pending_sell_times()
@@ -703,32 +907,32 @@ class AutoSellOrders:
         successful_market_sells = 0
         trades_to_mark_sold = []  # Collect trade IDs for batch update
         market_sells_to_mark = []
+        recovered_states = self.recover_pending_sell_states(orders)
+        sell_outcomes = []  # (trade_ids, sell_result) per submitted or recovered order
+        due_lots = {}  # inst_id -> [(trade_id, fill_sz)] when aggregating lots
         
         for order in orders:
-            inst_id, ord_id, trade_id, fill_sz, side, ts, sell_time, fill_px, sold_status, sell_order_id = order
+            inst_id, ord_id, trade_id, fill_sz, side, ts, sell_time, fill_px, sold_status, sell_order_id, *_ = order
             
             try:
                 formatted_price = self.format_price(fill_px)
                 self.logger.info(f"🔄 Processing: {inst_id} | ordId: {ord_id} | tradeId: {trade_id} | Buy: ${formatted_price} | fillSz: {fill_sz}")
                 
                 if sold_status in ('PROCESSING', 'SELL_SUBMITTED'):
-                    if not sell_order_id:
-                        client_order_id = self._sell_client_order_id(trade_id)
-                        sell_result = self.get_market_sell_state(
-                            inst_id, client_order_id=client_order_id
+                    sell_result = recovered_states.get(trade_id, 'UNKNOWN')
+                    if not sell_order_id and sell_result == 'NOT_FOUND':
+                        self.logger.warning(
+                            f"⚠️ No OKX order found for interrupted trade {trade_id}; unlocking for a later retry"
                         )
-                        if sell_result == 'NOT_FOUND':
-                            self.logger.warning(
-                                f"⚠️ No OKX order found for interrupted trade {trade_id}; unlocking for a later retry"
-                            )
-                            self.clear_trade_processing(trade_id)
-                            continue
-                    else:
-                        sell_result = self.get_market_sell_state(inst_id, sell_order_id)
+                        self.clear_trade_processing(trade_id)
+                        continue
                 else:
                     if not has_significant_assets:
                         self.logger.info(f"⏭️ No significant balance for new sell {trade_id}; only reconciling submitted orders")
                         continue
+                    if getattr(self, 'aggregate_lots', False):
+                        due_lots.setdefault(inst_id, []).append((trade_id, fill_sz))
+                        continue
                     # Lock this trade before submitting a new sell order.
                     if not self.mark_trade_processing(trade_id):
                         continue
@@ -739,36 +943,50 @@ class AutoSellOrders:
                         self.logger.error(f"❌ Retaining PROCESSING lock for {trade_id}; submitted order was not persisted")
                         continue
 
-                if sell_result == 'FILLED':
-                    trades_to_mark_sold.append(trade_id)
-                    market_sells_to_mark.append(trade_id)
-                    successful_sells += 1
-                    successful_market_sells += 1
-                elif sell_result == 'INSUFFICIENT_VALUE':  # USD equivalent too small, mark as processed
-                    trades_to_mark_sold.append(trade_id)
-                    self.logger.info(f"✅ Trade {trade_id} will be marked as sold (insufficient USD value)")
-                    successful_sells += 1
-                elif sell_result in {'FAILED', 'NOT_FOUND'}:
-                    # Terminal failure: clear the lock so a later scheduled run can submit again.
-                    self.clear_trade_processing(trade_id)
-                    failed_sells += 1
-                else:
-                    # PENDING/UNKNOWN retain the submitted order ID and are verified next run.
-                    self.logger.info(f"⏳ Trade {trade_id} sell remains {sell_result}; no replacement order submitted")
-                
-                # Rate limiting: wait 0.1 seconds between orders
-                time.sleep(0.1)
+                sell_outcomes.append(([trade_id], sell_result))
                 
             except Exception as e:
                 # Keep PROCESSING/SELL_SUBMITTED for recovery by stable clOrdId.
                 failed_sells += 1
                 self.logger.error(f"❌ Error processing sell order {ord_id}: {e}")
                 continue
+
+        for inst_id, lots in due_lots.items():
+            try:
+                trade_ids, sell_result = self.sell_lot_group(inst_id, lots)
+                if trade_ids and sell_result:
+                    sell_outcomes.append((trade_ids, sell_result))
+            except Exception as e:
+                # Locked lots keep PROCESSING and are recovered by their shared clOrdId.
+                failed_sells += len(lots)
+                self.logger.error(f"❌ Error processing aggregated sell for {inst_id}: {e}")
+
+        for trade_ids, sell_result in sell_outcomes:
+            if sell_result == 'FILLED':
+                trades_to_mark_sold.extend(trade_ids)
+                market_sells_to_mark.extend(trade_ids)
+                successful_sells += len(trade_ids)
+                successful_market_sells += len(trade_ids)
+            elif sell_result == 'INSUFFICIENT_VALUE':  # USD equivalent too small, mark as processed
+                trades_to_mark_sold.extend(trade_ids)
+                self.logger.info(f"✅ Trade(s) {', '.join(map(str, trade_ids))} will be marked as sold (insufficient USD value)")
+                successful_sells += len(trade_ids)
+            elif sell_result in {'FAILED', 'NOT_FOUND'}:
+                # Terminal failure: clear the lock so a later scheduled run can submit again.
+                for trade_id in trade_ids:
+                    self.clear_trade_processing(trade_id)
+                failed_sells += len(trade_ids)
+            else:
+                # PENDING/UNKNOWN retain the submitted order ID and are verified next run.
+                self.logger.info(
+                    f"⏳ Trade(s) {', '.join(map(str, trade_ids))} sell remains {sell_result}; no replacement order submitted"
+                )
         
         # Batch update all successful sells (optimized)
         if market_sells_to_mark and not self.mark_trigger_rebuild_pending(market_sells_to_mark):
             raise RuntimeError("Could not persist trigger rebuild request after confirmed market sell")
 
+        settled_trade_ids = trades_to_mark_sold
         if trades_to_mark_sold:
             updated_count = self.mark_trades_as_sold_batch(trades_to_mark_sold)
             if updated_count != len(trades_to_mark_sold):
@@ -776,6 +994,7 @@ class AutoSellOrders:
                 # Ensure no trade remains stuck in PROCESSING if batch update partially failed
                 for trade_id in trades_to_mark_sold:
                     self.clear_trade_processing(trade_id)
+                settled_trade_ids = []
 
         if self.has_pending_trigger_rebuild():
             self.logger.info(
@@ -795,6 +1014,109 @@ class AutoSellOrders:
         if verify_daily_close:
             self.log_unsettled_orders_before_today()
 
+        return settled_trade_ids
+
+    def get_unsold_sell_times(self):
+        """Return ``(sell_time, tradeId)`` for every unsold buy lot with a deadline"""
+        self.cursor.execute('''
+            SELECT sell_time, tradeId
+            FROM filled_orders
+            WHERE side = 'buy' AND sold_status IS NULL AND sell_time IS NOT NULL
+        ''')
+        return [(int(sell_time), trade_id) for sell_time, trade_id in self.cursor.fetchall()]
+
+    def run_sell_scheduler(self, refresh_seconds=SCHEDULER_REFRESH_SECONDS,
+                           reconcile_seconds=SCHEDULER_RECONCILE_SECONDS,
+                           retry_seconds=SCHEDULER_RETRY_SECONDS, listen=False):
+        """Sell each lot within seconds of its sell_time instead of on the next cron tick.
+
+        Unsold deadlines live in a min-heap and the loop sleeps until the
+        earliest one (or until wake()/stop()).  The heap is reloaded from the
+        database every ``refresh_seconds`` to pick up new fills; a full
+        process_sell_orders pass still runs every ``reconcile_seconds`` for
+        legacy rows without sell_time and for submitted orders awaiting a
+        final state.  Lots that are due but could not be sold are retried
+        after ``retry_seconds``.
+
+        With ``listen`` the heap is reloaded on filled_orders NOTIFY events
+        instead (see lib.database.NotificationListener) and the timed reload
+        only runs at the reconcile interval as a safety net.
+        """
+        listener = None
+        if listen:
+            from lib.database import NotificationListener
+            listener = NotificationListener(logger=self.logger)
+            threading.Thread(
+                target=listener.run, args=(lambda _notifications: self.wake(),),
+                kwargs={'on_connect': self.wake}, name='sell-scheduler-listener', daemon=True,
+            ).start()
+            refresh_seconds = max(refresh_seconds, reconcile_seconds)
+        self.logger.info(
+            f"🗓️ Sell scheduler started (refresh {refresh_seconds}s, reconcile {reconcile_seconds}s"
+            f"{', reloading on NOTIFY' if listen else ''})"
+        )
+        heap = []  # (next attempt ms, sell_time ms, tradeId)
+        retry_after = {}
+        next_refresh = next_reconcile = time.monotonic()
+
+        while not self.stop_event.is_set():
+            try:
+                if self.wake_event.is_set() or time.monotonic() >= next_refresh:
+                    self.wake_event.clear()
+                    self.ensure_database_initialized()
+                    unsold = self.get_unsold_sell_times()
+                    unsold_ids = {trade_id for _sell_time, trade_id in unsold}
+                    retry_after = {trade_id: at for trade_id, at in retry_after.items() if trade_id in unsold_ids}
+                    heap = [(max(sell_time, retry_after.get(trade_id, 0)), sell_time, trade_id)
+                            for sell_time, trade_id in unsold]
+                    heapq.heapify(heap)
+                    next_refresh = time.monotonic() + refresh_seconds
+                    if heap:
+                        next_due_seconds = max(0, heap[0][0] - datetime_to_timestamp_ms(get_utc_now())) / 1000
+                        self.logger.info(f"🗓️ {len(heap)} unsold lot(s); next due in {next_due_seconds:.0f}s")
+
+                now_ms = datetime_to_timestamp_ms(get_utc_now())
+                due = []
+                while heap and heap[0][0] <= now_ms:
+                    due.append(heapq.heappop(heap))
+
+                if due or time.monotonic() >= next_reconcile:
+                    settled = set(self.process_sell_orders() or [])
+                    finished_ms = datetime_to_timestamp_ms(get_utc_now())
+                    next_reconcile = time.monotonic() + reconcile_seconds
+                    for _attempt, sell_time, trade_id in due:
+                        if trade_id in settled:
+                            retry_after.pop(trade_id, None)
+                            self.logger.info(f"⏱️ {trade_id} sold {(finished_ms - sell_time) / 1000:.1f}s after its due time")
+                        else:
+                            retry_after[trade_id] = finished_ms + retry_seconds * 1000
+                            heapq.heappush(heap, (retry_after[trade_id], sell_time, trade_id))
+                    continue
+
+                # Do not hold a pooled connection while idle
+                self.close()
+                wait = next_refresh - time.monotonic()
+                if heap:
+                    wait = min(wait, (heap[0][0] - now_ms) / 1000)
+                self.wake_event.wait(max(0.0, wait))
+            except Exception as e:
+                self.logger.error(f"❌ Sell scheduler error: {e}")
+                self.logger.debug(f"Traceback: {traceback.format_exc()}")
+                self.close()
+                self.stop_event.wait(retry_seconds)
+
+        if listener:
+            listener.stop()
+        self.logger.info("⏹️  Sell scheduler stopped")
+
+    def wake(self):
+        """Reload deadlines now (e.g. after new fills were saved)"""
+        self.wake_event.set()
+
+    def stop(self, *_args):
+        self.stop_event.set()
+        self.wake_event.set()
+
     def run_continuous_monitoring(self, interval_minutes=15):
         """Run continuous monitoring with specified interval"""
         self.logger.info(f"🔄 Continuous monitoring - check every {interval_minutes}min")
@@ -822,9 +1144,12 @@ class AutoSellOrders:
             raise
 
     def close(self):
-        """Close database connection"""
+        """Return the database connection to the shared pool"""
         if self.conn:
-            self.conn.close()
+            from lib.database import release_connection
+            release_connection(self.conn)
+            self.conn = None
+            self.cursor = None
             self.logger.info("🗄️  Database connection closed")
 
 def main():
@@ -834,21 +1159,29 @@ def main():
     parser.add_argument('--continuous', action='store_true', help='Run continuously (default: run once and exit)')
     parser.add_argument('--interval', type=int, default=15, help='Monitoring interval in minutes (default: 15)')
     parser.add_argument('--verify-daily-close', action='store_true', help='Check that buy orders from before today (SGT) are sold')
+    parser.add_argument('--scheduler', action='store_true',
+                        help='Stay resident and sell each lot as soon as its sell_time is reached')
+    parser.add_argument('--aggregate-lots', action='store_true',
+                        help='Sell all due lots of an instrument in one market order (or set OKX_AGGREGATE_SELLS=true)')
     args = parser.parse_args()
     
     start_time = datetime.now()
     logger = setup_logging()
     
-    logger.info(f"🚀 OKX Auto Sell Orders - {'continuous' if args.continuous else 'once'}")
+    mode = 'scheduler' if args.scheduler else 'continuous' if args.continuous else 'once'
+    logger.info(f"🚀 OKX Auto Sell Orders - {mode}")
     logger.info(f"⏰ Start: {start_time.strftime('%H:%M:%S')}")
     
     auto_seller = None
     exit_code = 0
     
     try:
-        auto_seller = AutoSellOrders()
+        auto_seller = AutoSellOrders(aggregate_lots=args.aggregate_lots or None)
         
-        if args.continuous:
+        if args.scheduler:
+            signal.signal(signal.SIGTERM, auto_seller.stop)
+            auto_seller.run_sell_scheduler(listen=True)
+        elif args.continuous:
             auto_seller.run_continuous_monitoring(interval_minutes=args.interval)
         else:
             auto_seller.process_sell_orders(verify_daily_close=args.verify_daily_close)
@@ -866,6 +1199,8 @@ def main():
         if auto_seller:
             auto_seller.close()
         
+        get_rate_limiter().log_stats(logger)
+        log_pool_stats(logger)
         duration = datetime.now() - start_time
         logger.info(f"⏱️  Duration: {duration}")
         logger.info("✅ Script finished" if exit_code == 0 else f"❌ Script finished (code: {exit_code})")
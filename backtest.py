@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Backtest Script
+Replays the live trading rules over historical intraday candles for every
+configured pair at once and reports what a limits configuration would have
+earned.
+
+The decisions come from the live scripts themselves, so the simulation cannot
+drift from production:
+
+- create_algo_triggers: the yesterday-gain skip and the buy plan
+  (trigger at open × best_limit%, or a direct limit buy when price is already below it)
+- fetch_filled_orders: MAX_ACTIVE_TRADING_CURRENCIES capacity, which cancels all
+  pending buys, and the SELL_DELAY_MS holding period
+- auto_sell_orders: lots are market-sold at the first bar after their sell_time
+
+Each SGT day: sell lots that are already due, then (below capacity) plan one buy
+per pair at the day's open. Intraday events (fills at min(bar open, order price)
+once a bar's low reaches the order, and due sells at the bar open) are applied
+in time order across all pairs. Unfilled buys expire at the end of the day.
+Candles come from the local candle store (utils_candles.py).
+
+    python backtest.py                                   # configured pairs, limits from the database
+    python backtest.py --config limits.json --bar 1H --days 730 --output backtest.json
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import logging
+import argparse
+from datetime import datetime, timezone
+
+# Load environment variables
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+from create_algo_triggers import get_yesterday_gain_ratio, is_yesterday_gain_too_high, plan_buy_order
+from fetch_filled_orders import is_at_trading_capacity, SELL_DELAY_MS
+from utils_candles import BAR_MS
+
+DEFAULT_BAR = '1H'
+DEFAULT_HISTORY_DAYS = 365
+DEFAULT_ORDER_SIZE = 100.0
+DEFAULT_BUY_FEE = 0.001
+DEFAULT_SELL_FEE = 0.001
+
+# Trading days start at 00:00 SGT (UTC+8)
+SGT_OFFSET_MS = 8 * 60 * 60 * 1000
+
+# Candle record columns (utils_candles.RECORD)
+TS, OPEN, HIGH, LOW, CLOSE = range(5)
+
+
+def setup_logging():
+    """Setup logging configuration"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    return logging.getLogger(__name__)
+
+
+logger = logging.getLogger(__name__)
+
+
+def sgt_day_start(ts):
+    """UTC ms timestamp of 00:00 SGT on the day containing ``ts``"""
+    return (ts + SGT_OFFSET_MS) // BAR_MS * BAR_MS - SGT_OFFSET_MS
+
+
+class _Series:
+    """Candles of one instrument with a timestamp index for bisecting"""
+
+    def __init__(self, candles):
+        self.candles = sorted(candles)
+        self.ts = [candle[TS] for candle in self.candles]
+
+    def first_at_or_after(self, ts):
+        return bisect.bisect_left(self.ts, ts)
+
+    def day_range(self, day_start):
+        return self.first_at_or_after(day_start), self.first_at_or_after(day_start + BAR_MS)
+
+
+def trade_return(buy_price, sell_price, buy_fee=DEFAULT_BUY_FEE, sell_fee=DEFAULT_SELL_FEE):
+    """Net return of one round trip, the same formula as limits_optimizer.evaluate_limits"""
+    return (sell_price * (1.0 - sell_fee)) / (buy_price * (1.0 + buy_fee)) - 1.0
+
+
+def run_backtest(candles_by_inst, crypto_configs, order_size=DEFAULT_ORDER_SIZE,
+                 buy_fee=DEFAULT_BUY_FEE, sell_fee=DEFAULT_SELL_FEE):
+    """Simulate the trigger/fill/sell lifecycle.
+
+    candles_by_inst: {inst_id: [(ts, open, high, low, close, volume), ...]} intraday bars
+    crypto_configs: limits.json ``crypto_configs`` ({inst_id: {'best_limit': ...}})
+
+    Returns a report dict with the closed trades, lots still open at the end,
+    per-instrument results and skip/cancel counters.
+    """
+    series = {
+        inst_id: _Series(candles) for inst_id, candles in candles_by_inst.items()
+        if candles and (crypto_configs.get(inst_id) or {}).get('best_limit') is not None
+    }
+    days = sorted({sgt_day_start(ts) for s in series.values() for ts in s.ts})
+
+    lots = []
+    trades = []
+    counters = {'orders': 0, 'gain_skips': 0, 'capacity_days': 0, 'capacity_cancels': 0, 'expired': 0}
+
+    def sell(lot, index):
+        candle = series[lot['inst_id']].candles[index]
+        lots.remove(lot)
+        ret = trade_return(lot['buy_price'], candle[OPEN], buy_fee, sell_fee)
+        trades.append({
+            'inst_id': lot['inst_id'],
+            'buy_ts': lot['buy_ts'],
+            'buy_price': lot['buy_price'],
+            'order_type': lot['order_type'],
+            'sell_ts': candle[TS],
+            'sell_price': candle[OPEN],
+            'return': ret,
+            'pnl': order_size * ret,
+        })
+
+    for day_start in days:
+        # Lots whose sell bar fell before today (data gaps) sell at the first bar after sell_time
+        for lot in [lot for lot in lots if lot['sell_time'] <= day_start]:
+            s = series[lot['inst_id']]
+            index = s.first_at_or_after(lot['sell_time'])
+            if index < len(s.candles):
+                sell(lot, index)
+
+        # create_algo_triggers: plan one buy per pair at the day's open unless at capacity
+        pending = []
+        if is_at_trading_capacity(len({lot['inst_id'] for lot in lots})):
+            counters['capacity_days'] += 1
+        else:
+            for inst_id, s in series.items():
+                start, end = s.day_range(day_start)
+                if start == end or s.ts[start] != day_start:
+                    continue
+                previous_start = s.first_at_or_after(day_start - BAR_MS)
+                if previous_start < start:
+                    gain_ratio = get_yesterday_gain_ratio(s.candles[previous_start][OPEN], s.candles[start - 1][CLOSE])
+                    if is_yesterday_gain_too_high(gain_ratio):
+                        counters['gain_skips'] += 1
+                        continue
+                open_price = s.candles[start][OPEN]
+                if open_price <= 0:
+                    continue
+                order_type, price = plan_buy_order(open_price, crypto_configs[inst_id]['best_limit'], open_price)
+                pending.append({'inst_id': inst_id, 'order_type': order_type, 'price': float(price)})
+            counters['orders'] += len(pending)
+
+        # Intraday events across all pairs: (ts, kind, ...); sells (0) run before fills (1) in a bar
+        events = []
+        for order in pending:
+            s = series[order['inst_id']]
+            start, end = s.day_range(day_start)
+            for index in range(start, end):
+                if s.candles[index][LOW] <= order['price']:
+                    events.append((s.ts[index], 1, order['inst_id'], index, order))
+                    break
+        for lot in lots:
+            if lot['sell_time'] < day_start + BAR_MS:
+                s = series[lot['inst_id']]
+                index = s.first_at_or_after(lot['sell_time'])
+                if index < len(s.candles) and s.ts[index] < day_start + BAR_MS:
+                    events.append((s.ts[index], 0, lot['inst_id'], index, lot))
+        events.sort(key=lambda event: event[:3])
+
+        cancelled = False
+        filled = 0
+        for ts, kind, inst_id, index, item in events:
+            if kind == 0:
+                sell(item, index)
+                continue
+            if cancelled:
+                continue
+            candle = series[inst_id].candles[index]
+            lots.append({
+                'inst_id': inst_id,
+                'order_type': item['order_type'],
+                'buy_ts': ts,
+                'buy_price': min(candle[OPEN], item['price']),
+                'sell_time': ts + SELL_DELAY_MS,
+            })
+            filled += 1
+            # fetch_filled_orders: cancel every remaining buy once capacity is reached
+            if is_at_trading_capacity(len({lot['inst_id'] for lot in lots})):
+                cancelled = True
+        unfilled = len(pending) - filled
+        if cancelled:
+            counters['capacity_cancels'] += unfilled
+        else:
+            counters['expired'] += unfilled
+
+    return build_report(trades, lots, series, order_size, counters)
+
+
+def build_report(trades, open_lots, series, order_size, counters):
+    """Summary, per-instrument breakdown and open lots marked at the last close"""
+    def summarize(rows):
+        wins = sum(1 for row in rows if row['pnl'] > 0)
+        pnl = sum(row['pnl'] for row in rows)
+        return {
+            'trades': len(rows),
+            'pnl': round(pnl, 4),
+            'win_rate': round(wins / len(rows), 4) if rows else 0.0,
+            'avg_return': round(sum(row['return'] for row in rows) / len(rows), 6) if rows else 0.0,
+        }
+
+    by_inst = {}
+    for trade in trades:
+        by_inst.setdefault(trade['inst_id'], []).append(trade)
+
+    marked_lots = []
+    for lot in open_lots:
+        last_close = series[lot['inst_id']].candles[-1][CLOSE]
+        marked_lots.append(dict(lot, mark_price=last_close,
+                                unrealized_pnl=order_size * trade_return(lot['buy_price'], last_close, 0.0, 0.0)))
+
+    all_ts = [ts for s in series.values() for ts in (s.ts[0], s.ts[-1])]
+    return {
+        'summary': dict(summarize(trades), order_size=order_size, **counters,
+                        start_ts=min(all_ts) if all_ts else None, end_ts=max(all_ts) if all_ts else None),
+        'by_inst': {inst_id: summarize(rows) for inst_id, rows in sorted(by_inst.items())},
+        'open_lots': marked_lots,
+        'trades': trades,
+    }
+
+
+def load_intraday_candles(store, inst_id, days=DEFAULT_HISTORY_DAYS, market_api=None):
+    """Last ``days`` of bars from the local candle store, syncing only missing bars first"""
+    if market_api is not None:
+        store.sync(inst_id, market_api, max_days=days)
+    return store.read(inst_id, limit=days * BAR_MS // store.bar_ms)
+
+
+def format_ts(ts):
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime('%Y-%m-%d') if ts else 'N/A'
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Backtest the live trigger/fill/sell rules on historical candles')
+    parser.add_argument('--config', type=str, default=None,
+                        help='limits.json to test (default: the current limits_config in the database)')
+    parser.add_argument('--inst-ids', type=str, default=None,
+                        help='Comma-separated instruments (default: every pair in the config)')
+    parser.add_argument('--bar', type=str, default=DEFAULT_BAR, help='Intraday candle size, e.g. 15m, 1H, 4H')
+    parser.add_argument('--days', type=int, default=DEFAULT_HISTORY_DAYS, help='Days of history per pair')
+    parser.add_argument('--order-size', type=float, default=None,
+                        help='USDT per buy (default: OKX_ORDER_SIZE or 100)')
+    parser.add_argument('--no-sync', action='store_true', help='Only use candles already in the local store')
+    parser.add_argument('--output', type=str, default=None, help='Write the full report (with trades) as JSON')
+    args = parser.parse_args()
+
+    logger = setup_logging()
+    db = None
+    try:
+        logger.info("🚀 Starting backtest")
+
+        if args.config:
+            with open(args.config, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        else:
+            from lib.database import Database
+            db = Database()
+            if not db.connect():
+                raise RuntimeError("Failed to connect to database")
+            config = db.load_limits_config()
+        if not config:
+            raise RuntimeError("No limits configuration to backtest")
+
+        crypto_configs = config.get('crypto_configs') or {}
+        params = config.get('strategy_params') or {}
+        buy_fee = float(params.get('buy_fee') or DEFAULT_BUY_FEE)
+        sell_fee = float(params.get('sell_fee') or DEFAULT_SELL_FEE)
+        order_size = args.order_size or float(os.getenv('OKX_ORDER_SIZE', DEFAULT_ORDER_SIZE))
+
+        inst_ids = ([inst_id.strip() for inst_id in args.inst_ids.split(',') if inst_id.strip()]
+                    if args.inst_ids else sorted(crypto_configs))
+        if not inst_ids:
+            raise RuntimeError("No instruments to backtest")
+
+        market_api = None
+        if not args.no_sync:
+            from okx_client import OKXClient
+            market_api = OKXClient(logger).get_market_api()
+            if not market_api:
+                raise RuntimeError("OKX market API not initialized")
+
+        from utils_candles import get_candle_store
+        store = get_candle_store(args.bar)
+        fetch_started = time.monotonic()
+        candles_by_inst = {}
+        for inst_id in inst_ids:
+            try:
+                candles_by_inst[inst_id] = load_intraday_candles(store, inst_id, args.days, market_api)
+            except Exception as e:
+                logger.warning(f"⚠️ Skipping {inst_id}: {e}")
+        logger.info(f"📈 Loaded {args.bar} candles for {len(candles_by_inst)} pairs in {time.monotonic() - fetch_started:.1f}s")
+
+        run_started = time.monotonic()
+        report = run_backtest(candles_by_inst, crypto_configs, order_size=order_size,
+                              buy_fee=buy_fee, sell_fee=sell_fee)
+        summary = report['summary']
+        logger.info(f"🧮 Simulated in {time.monotonic() - run_started:.2f}s "
+                    f"({format_ts(summary['start_ts'])} → {format_ts(summary['end_ts'])})")
+        logger.info(
+            f"💰 PnL: {summary['pnl']:.2f} USDT | Trades: {summary['trades']} | "
+            f"Win rate: {summary['win_rate'] * 100:.1f}% | Avg return: {summary['avg_return'] * 100:.2f}%"
+        )
+        logger.info(
+            f"📊 Orders: {summary['orders']} | Gain skips: {summary['gain_skips']} | "
+            f"Capacity days: {summary['capacity_days']} | Capacity cancels: {summary['capacity_cancels']} | "
+            f"Expired: {summary['expired']} | Open lots: {len(report['open_lots'])}"
+        )
+        for inst_id, result in sorted(report['by_inst'].items(), key=lambda item: item[1]['pnl'], reverse=True):
+            logger.info(f"   {inst_id}: {result['trades']} trades, PnL {result['pnl']:.2f}, win rate {result['win_rate'] * 100:.1f}%")
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            logger.info(f"💾 Wrote {args.output}")
+    except Exception as e:
+        logger.error(f"❌ Backtest failed: {e}")
+        sys.exit(1)
+    finally:
+        if db:
+            db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+End-to-end Script Benchmark
+Runs the cron scripts against mock_okx_server.py at several configured-pair
+counts and reports wall time, OKX HTTP calls and database queries per run.
+
+Each script runs in a fresh interpreter (no warm caches or pools carry over),
+against a scratch PostgreSQL database: the benchmark replaces its
+limits_config and empties filled_orders, so it refuses to use DATABASE_URL
+implicitly.
+
+    BENCHMARK_DATABASE_URL=postgresql://localhost/okx_bench python benchmark_scripts.py
+    python benchmark_scripts.py --pairs 10,100,500 --latency-ms 30 --rate-limit 20 --disconnect-rate 0.01 --output bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import runpy
+import shutil
+import tempfile
+import logging
+import argparse
+import subprocess
+
+from mock_okx_server import MockExchange, MockOKXServer, mock_inst_ids
+
+DEFAULT_PAIR_COUNTS = (10, 100, 500)
+# In run order: triggers are placed, fills ingested, due lots sold, leftovers cancelled
+DEFAULT_SCRIPTS = (
+    ('create_algo_triggers', []),
+    ('fetch_filled_orders', ['--force-db']),
+    ('auto_sell_orders', []),
+    ('cancel_pending_triggers', []),
+    ('monitor_delist', []),
+)
+SCRIPT_TIMEOUT_SECONDS = 600
+RESULT_PREFIX = 'BENCHMARK_RESULT '
+
+
+def setup_logging():
+    """Setup logging configuration"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    return logging.getLogger(__name__)
+
+
+logger = logging.getLogger(__name__)
+
+
+def install_query_counter():
+    """Count every cursor.execute/executemany on connections opened after this call.
+
+    lib.database and psycopg2.pool look up psycopg2.connect at call time, so
+    wrapping it here covers pooled, dedicated and LISTEN connections alike.
+    """
+    import psycopg2
+    import psycopg2.extensions
+
+    counter = {'queries': 0}
+    cursor_classes = {}
+
+    def counting(cursor_class):
+        if cursor_class not in cursor_classes:
+            def execute(self, *args, **kwargs):
+                counter['queries'] += 1
+                return cursor_class.execute(self, *args, **kwargs)
+
+            def executemany(self, *args, **kwargs):
+                counter['queries'] += 1
+                return cursor_class.executemany(self, *args, **kwargs)
+
+            cursor_classes[cursor_class] = type(f"Counting{cursor_class.__name__}", (cursor_class,),
+                                                {'execute': execute, 'executemany': executemany})
+        return cursor_classes[cursor_class]
+
+    class CountingConnection(psycopg2.extensions.connection):
+        def cursor(self, *args, **kwargs):
+            kwargs['cursor_factory'] = counting(kwargs.get('cursor_factory') or self.cursor_factory
+                                                or psycopg2.extensions.cursor)
+            return super().cursor(*args, **kwargs)
+
+    connect = psycopg2.connect
+
+    def counting_connect(*args, **kwargs):
+        kwargs.setdefault('connection_factory', CountingConnection)
+        return connect(*args, **kwargs)
+
+    psycopg2.connect = counting_connect
+    return counter
+
+
+def run_child(module, script_args):
+    """Child mode: run one script's __main__ in this process and print its measurements"""
+    counter = install_query_counter()
+    sys.argv = [f"{module}.py"] + script_args
+    exit_code = 0
+    started = time.perf_counter()
+    try:
+        runpy.run_module(module, run_name='__main__')
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    wall = time.perf_counter() - started
+    print(RESULT_PREFIX + json.dumps({'wall_seconds': wall, 'db_queries': counter['queries'],
+                                      'exit_code': exit_code}), flush=True)
+    return exit_code
+
+
+def seed_database(database_url, inst_ids):
+    """Replace the benchmark database's limits config with ``inst_ids`` and clear old fills.
+
+    A scratch database gets the full filled_orders schema (table, columns and
+    indexes) from migrate_filled_orders.py, like a deployed one.
+    """
+    os.environ['DATABASE_URL'] = database_url
+    from lib.database import Database, close_database_pool
+    from migrate_filled_orders import create_table, migrate
+    db = Database()
+    if not db.connect():
+        raise RuntimeError("Failed to connect to the benchmark database")
+    try:
+        db.create_tables()
+        config = {
+            'strategy_name': 'benchmark',
+            'description': 'benchmark_scripts.py fixture',
+            'strategy_type': 'daily_open_limit',
+            'duration': 1,
+            'strategy_params': {'limit_range': [60, 99], 'min_trades': 1, 'min_avg_earn': 0.0,
+                                'buy_fee': 0.001, 'sell_fee': 0.001},
+            'crypto_configs': {inst_id: {'best_limit': 95, 'best_duration': 1, 'max_returns': 1.0,
+                                         'trade_count': 10, 'trades_per_month': 1.0, 'win_rate': '0.5',
+                                         'median_earn': '0.01', 'avg_return_per_trade': '0.01'}
+                               for inst_id in inst_ids},
+        }
+        if not db.save_limits_config(config):
+            raise RuntimeError("Failed to seed limits_config")
+        if not create_table(db.cursor, logger):
+            db.cursor.execute('TRUNCATE filled_orders')
+        migrate(db.cursor, logger)
+        db.conn.commit()
+    finally:
+        db.disconnect()
+        close_database_pool()
+
+
+def run_script(module, script_args, env, server):
+    """Run ``module`` in a child interpreter; returns its measurements plus OKX call stats"""
+    server.reset_stats()
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', module, '--'] + script_args,
+        env=env, capture_output=True, text=True, timeout=SCRIPT_TIMEOUT_SECONDS,
+    )
+    process_seconds = time.perf_counter() - started
+    result = next((json.loads(line[len(RESULT_PREFIX):]) for line in reversed(completed.stdout.splitlines())
+                   if line.startswith(RESULT_PREFIX)), None)
+    if result is None:
+        tail = (completed.stderr or completed.stdout).strip().splitlines()[-5:]
+        result = {'wall_seconds': None, 'db_queries': None, 'exit_code': completed.returncode, 'error': tail}
+    stats = server.stats()
+    result.update(process_seconds=process_seconds, http_calls=stats['calls'], by_endpoint=stats['by_endpoint'],
+                  rate_limited=stats['rate_limited'], disconnects=stats['disconnects'])
+    return result
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Benchmark the trading scripts against a mock OKX server')
+    parser.add_argument('--child', type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--pairs', type=str, default=','.join(str(count) for count in DEFAULT_PAIR_COUNTS),
+                        help='Comma-separated configured-pair counts')
+    parser.add_argument('--scripts', type=str, default=None,
+                        help='Comma-separated script modules (default: all cron scripts)')
+    parser.add_argument('--database-url', type=str, default=os.getenv('BENCHMARK_DATABASE_URL'),
+                        help='Scratch PostgreSQL database (default: BENCHMARK_DATABASE_URL)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Mock latency per request')
+    parser.add_argument('--rate-limit', type=int, default=None, help='Mock requests per endpoint per 2s before 429')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help='Mock probability of a dropped request')
+    parser.add_argument('--fill-rate', type=float, default=0.1, help='Mock probability that a buy fills at once')
+    parser.add_argument('--output', type=str, default=None, help='Write all results as JSON')
+    args, script_args = parser.parse_known_args()
+
+    if args.child:
+        sys.exit(run_child(args.child, [arg for arg in script_args if arg != '--']))
+
+    logger = setup_logging()
+    if not args.database_url:
+        logger.error("❌ Set BENCHMARK_DATABASE_URL (or --database-url) to a scratch PostgreSQL database")
+        sys.exit(1)
+
+    scripts = DEFAULT_SCRIPTS
+    if args.scripts:
+        wanted = [name.strip() for name in args.scripts.split(',') if name.strip()]
+        defaults = dict(DEFAULT_SCRIPTS)
+        scripts = [(name, defaults.get(name, [])) for name in wanted]
+    pair_counts = [int(count) for count in args.pairs.split(',') if count.strip()]
+
+    exchange = MockExchange(fill_rate=args.fill_rate)
+    server = MockOKXServer(exchange, latency_ms=args.latency_ms, rate_limit=args.rate_limit,
+                           disconnect_rate=args.disconnect_rate)
+    server.start()
+    logger.info(f"🧪 Mock OKX at {server.url}")
+
+    env = dict(os.environ, OKX_API_DOMAIN=server.url, DATABASE_URL=args.database_url,
+               OKX_API_KEY='benchmark', OKX_SECRET_KEY='benchmark', OKX_PASSPHRASE='benchmark',
+               OKX_TESTNET='false')
+    cache_root = tempfile.mkdtemp(prefix='okx_bench_')
+    results = []
+    try:
+        for pairs in pair_counts:
+            exchange.reset(pairs)
+            seed_database(args.database_url, mock_inst_ids(pairs))
+            # Mock instruments and candles must not land in the real caches
+            pair_env = dict(env, OKX_INSTRUMENT_CACHE_PATH=os.path.join(cache_root, f"instruments_{pairs}.json"),
+                            OKX_CANDLE_STORE_DIR=os.path.join(cache_root, f"candles_{pairs}"))
+            for module, module_args in scripts:
+                result = run_script(module, module_args, pair_env, server)
+                result.update(script=module, pairs=pairs)
+                results.append(result)
+                wall = f"{result['wall_seconds']:.2f}s" if result['wall_seconds'] is not None else 'n/a'
+                status = '✅' if result['exit_code'] == 0 else f"❌ exit {result['exit_code']}"
+                logger.info(
+                    f"{status} {module} | {pairs} pairs | wall {wall} (process {result['process_seconds']:.2f}s) | "
+                    f"HTTP {result['http_calls']} (429s {result['rate_limited']}, drops {result['disconnects']}) | "
+                    f"DB queries {result['db_queries']}"
+                )
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(cache_root, ignore_errors=True)
+
+    logger.info("📊 Summary (wall seconds / HTTP calls / DB queries)")
+    for module, _module_args in scripts:
+        cells = []
+        for pairs in pair_counts:
+            row = next(r for r in results if r['script'] == module and r['pairs'] == pairs)
+            wall = f"{row['wall_seconds']:.2f}" if row['wall_seconds'] is not None else 'n/a'
+            cells.append(f"{pairs}: {wall}s/{row['http_calls']}/{row['db_queries']}")
+        logger.info(f"   {module:<24} " + ' | '.join(cells))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"💾 Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
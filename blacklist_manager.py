@@ -2,13 +2,17 @@
 """
 Blacklist Manager Module
 Responsible for querying blacklisted cryptocurrencies from database
+(connections are borrowed from the shared pool in lib.database)
 """
 
 import os
+import json
 import logging
-from typing import Set, Optional
+from typing import Any, Dict, List, Set, Optional
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+
+from lib.database import pooled_connection
 
 # Load environment variables first
 try:
@@ -27,6 +31,7 @@ class BlacklistManager:
     def __init__(self, logger: Optional[logging.Logger] = None):
         self.logger = logger or logging.getLogger(__name__)
         self.db_config = self._get_db_config()
+        self._crawl_state_table_ready = False
     
     def _get_db_config(self) -> dict:
         """Get database configuration from environment variables"""
@@ -60,7 +65,7 @@ class BlacklistManager:
                 self.logger.error("❌ Database credentials not fully configured; blacklist cannot be verified")
                 return None
             
-            with psycopg2.connect(**self.db_config) as conn:
+            with pooled_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                     cursor.execute("""
                         SELECT crypto_symbol 
@@ -87,7 +92,7 @@ class BlacklistManager:
             if not all(self.db_config.values()):
                 return False
             
-            with psycopg2.connect(**self.db_config) as conn:
+            with pooled_connection() as conn:
                 with conn.cursor() as cursor:
                     cursor.execute("""
                         SELECT 1 
@@ -107,7 +112,7 @@ class BlacklistManager:
             if not all(self.db_config.values()):
                 return None
             
-            with psycopg2.connect(**self.db_config) as conn:
+            with pooled_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                     cursor.execute("""
                         SELECT reason, blacklist_type 
@@ -131,7 +136,7 @@ class BlacklistManager:
                 self.logger.warning("⚠️ Database credentials not fully configured, skipping blacklist addition")
                 return False
             
-            with psycopg2.connect(**self.db_config) as conn:
+            with pooled_connection() as conn:
                 with conn.cursor() as cursor:
                     cursor.execute("""
                         INSERT INTO blacklist (crypto_symbol, reason, blacklist_type, notes)
@@ -172,7 +177,7 @@ class BlacklistManager:
             if not all(self.db_config.values()):
                 return False
             
-            with psycopg2.connect(**self.db_config) as conn:
+            with pooled_connection() as conn:
                 with conn.cursor() as cursor:
                     cursor.execute("""
                         SELECT 1 
@@ -186,6 +191,32 @@ class BlacklistManager:
             self.logger.error(f"❌ Error checking if announcement {announcement_id} is processed: {e}")
             return False
     
+    def get_unprocessed_announcement_ids(self, announcement_ids: List[str]) -> List[str]:
+        """Return the ``announcement_ids`` not processed yet, in input order, with one query.
+
+        Like ``is_announcement_processed``, lookup failures count as unprocessed.
+        """
+        if not announcement_ids:
+            return []
+        try:
+            if not all(self.db_config.values()):
+                return list(announcement_ids)
+            
+            with pooled_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT announcement_id 
+                        FROM processed_announcements 
+                        WHERE announcement_id = ANY(%s)
+                    """, (list(announcement_ids),))
+                    
+                    processed = {row[0] for row in cursor.fetchall()}
+            return [announcement_id for announcement_id in announcement_ids if announcement_id not in processed]
+                    
+        except Exception as e:
+            self.logger.error(f"❌ Error checking {len(announcement_ids)} announcements for processing state: {e}")
+            return list(announcement_ids)
+    
     def mark_announcement_processed(self, announcement_id: str, title: str, url: str, 
                                   p_time: int, affected_cryptos: Set[str] = None, 
                                   protection_executed: bool = False, notes: str = None) -> bool:
@@ -195,7 +226,7 @@ class BlacklistManager:
                 self.logger.warning("⚠️ Database credentials not fully configured, skipping announcement tracking")
                 return False
             
-            with psycopg2.connect(**self.db_config) as conn:
+            with pooled_connection() as conn:
                 with conn.cursor() as cursor:
                     cursor.execute("""
                         INSERT INTO processed_announcements 
@@ -213,6 +244,101 @@ class BlacklistManager:
         except Exception as e:
             self.logger.error(f"❌ Error marking announcement {announcement_id} as processed: {e}")
             return False
+    
+    def mark_announcement_processed_many(self, announcements: List[Dict[str, Any]]) -> bool:
+        """Mark several announcements processed in one statement.
+
+        Each entry takes the keyword arguments of ``mark_announcement_processed``.
+        """
+        if not announcements:
+            return True
+        try:
+            if not all(self.db_config.values()):
+                self.logger.warning("⚠️ Database credentials not fully configured, skipping announcement tracking")
+                return False
+            
+            rows = [
+                (ann['announcement_id'], ann['title'], ann['url'], ann['p_time'],
+                 list(ann['affected_cryptos']) if ann.get('affected_cryptos') else None,
+                 ann.get('protection_executed', False), ann.get('notes'))
+                for ann in announcements
+            ]
+            with pooled_connection() as conn:
+                with conn.cursor() as cursor:
+                    execute_values(cursor, """
+                        INSERT INTO processed_announcements 
+                        (announcement_id, title, url, p_time, affected_cryptos, protection_executed, notes)
+                        VALUES %s
+                        ON CONFLICT (announcement_id) DO NOTHING
+                    """, rows)
+                    
+                    conn.commit()
+                    self.logger.info(f"✅ Marked {len(rows)} announcements as processed")
+                    return True
+                    
+        except Exception as e:
+            self.logger.error(f"❌ Error marking {len(announcements)} announcements as processed: {e}")
+            return False
+
+    def _ensure_crawl_state_table(self, conn):
+        """Create the announcement crawl state table on first use"""
+        if self._crawl_state_table_ready:
+            return
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS announcement_crawl_state (
+                    name VARCHAR(50) PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at TIMESTAMPTZ DEFAULT NOW()
+                )
+            """)
+        conn.commit()
+        self._crawl_state_table_ready = True
+
+    def get_crawl_state(self, name: str) -> Optional[Dict[str, Any]]:
+        """Saved announcement crawl state (empty before the first save), or ``None`` when unavailable"""
+        try:
+            if not all(self.db_config.values()):
+                return None
+            
+            with pooled_connection() as conn:
+                self._ensure_crawl_state_table(conn)
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT state 
+                        FROM announcement_crawl_state 
+                        WHERE name = %s
+                    """, (name,))
+                    row = cursor.fetchone()
+                conn.commit()
+            state = json.loads(row[0]) if row else {}
+            return state if isinstance(state, dict) else {}
+                    
+        except Exception as e:
+            self.logger.error(f"❌ Error loading announcement crawl state {name}: {e}")
+            return None
+    
+    def save_crawl_state(self, name: str, state: Dict[str, Any]) -> bool:
+        """Persist announcement crawl state under ``name``"""
+        try:
+            if not all(self.db_config.values()):
+                return False
+            
+            with pooled_connection() as conn:
+                self._ensure_crawl_state_table(conn)
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        INSERT INTO announcement_crawl_state (name, state, updated_at)
+                        VALUES (%s, %s, NOW())
+                        ON CONFLICT (name) DO UPDATE
+                        SET state = EXCLUDED.state, updated_at = EXCLUDED.updated_at
+                    """, (name, json.dumps(state)))
+                conn.commit()
+            return True
+                    
+        except Exception as e:
+            self.logger.error(f"❌ Error saving announcement crawl state {name}: {e}")
+            return False
 
 
 def test_blacklist_manager():
@@ -9,7 +9,6 @@ import sys
 import logging
 import logging.handlers
 import traceback
-import time
 from datetime import datetime
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, RetryError
 
@@ -23,7 +22,8 @@ except ImportError:
         pass
     load_dotenv()
 
-from okx_client import OKXClient
+from okx_client import OKXClient, invalidate_balance_snapshot
+from utils_rate_limit import get_rate_limiter
 
 # Configure logging with rotation
 def setup_logging():
@@ -66,7 +66,7 @@ def setup_logging():
 logger = setup_logging()
 
 class OKXLimitOrderManager:
-    def __init__(self):
+    def __init__(self, okx_client=None):
         """Initialize OKX API connection"""
         try:
             self.api_key = os.getenv('OKX_API_KEY')
@@ -89,8 +89,8 @@ class OKXLimitOrderManager:
             # Set flag for demo/live trading
             self.okx_flag = "1" if self.testnet else "0"
             
-            # Initialize OKX Client
-            self.okx_client = OKXClient(logger)
+            # Initialize OKX Client (a long-running caller may share its own)
+            self.okx_client = okx_client or OKXClient(logger)
             self.trade_api = self.okx_client.get_trade_api()
             
             logger.info("🚀 OKX Pending Limit Order Canceller")
@@ -180,6 +180,8 @@ class OKXLimitOrderManager:
                 
                 if s_code == '0':
                     logger.info(f"✅ Successfully cancelled limit order {ord_id} for {inst_id}")
+                    # Released funds change the next balance check
+                    invalidate_balance_snapshot()
                     return True
                 else:
                     logger.error(f"❌ Failed to cancel order {ord_id}: {s_msg} (sCode: {s_code})")
@@ -199,7 +201,11 @@ class OKXLimitOrderManager:
 
 
     def cancel_all_pending_limits(self, side=None, inst_ids=None):
-        """Cancel pending limit orders. If inst_ids is provided (set/list of inst_id e.g. BTC-USDT), only cancel those; otherwise cancel all."""
+        """Cancel pending limit orders. If inst_ids is provided (set/list of inst_id e.g. BTC-USDT), only cancel those; otherwise cancel all.
+
+        Per-order outcomes of the last call are left in ``self.cancel_results``.
+        """
+        self.cancel_results = []
         try:
             # Get pending orders
             side_text = f" {side}" if side else ""
@@ -239,26 +245,30 @@ class OKXLimitOrderManager:
                 if not inst_id or not ord_id:
                     logger.warning(f"⚠️  Skipping order with missing data: {order}")
                     skipped_orders += 1
+                    self.cancel_results.append({'inst_id': inst_id or '', 'order_id': ord_id or '', 'order_type': 'limit',
+                                                'cancelled': False, 'error': 'missing order data'})
                     continue
                 
                 # Log progress
                 logger.info(f"🔄 Cancelling {inst_id}... ({index}/{total_orders})")
                 
+                error = None
                 try:
                     if self.cancel_limit_order(ord_id, inst_id):
                         successful_cancellations += 1
                     else:
+                        error = 'API returned error'
                         failed_orders.append(f"{inst_id}: {ord_id}")
                 except RetryError as e:
                     logger.error(f"❌ Max retries exceeded for order {ord_id}: {e}")
+                    error = 'retry failed'
                     failed_orders.append(f"{inst_id}: {ord_id} (retry failed)")
                 except Exception as e:
                     logger.error(f"❌ Unexpected error cancelling order {ord_id}: {e}")
+                    error = f'unexpected error: {e}'
                     failed_orders.append(f"{inst_id}: {ord_id} (unexpected error)")
-                
-                # Rate limiting delay
-                if index < total_orders:  # Don't delay after the last order
-                    time.sleep(0.5)
+                self.cancel_results.append({'inst_id': inst_id, 'order_id': ord_id, 'order_type': 'limit',
+                                            'cancelled': error is None, 'error': error})
             
             # Summary
             logger.info("============================================================")
@@ -334,6 +344,7 @@ def main():
         logger.debug(f"Traceback: {traceback.format_exc()}")
         exit_code = 1
     finally:
+        get_rate_limiter().log_stats(logger)
         end_time = datetime.now()
         duration = end_time - start_time
         logger.info(f"⏰ End time: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
@@ -24,6 +24,7 @@ except ImportError:
     load_dotenv()
 
 from okx_client import OKXClient, get_order_operation_error
+from utils_rate_limit import get_rate_limiter
 
 
 
@@ -68,7 +69,7 @@ def setup_logging():
 logger = setup_logging()
 
 class OKXOrderManager:
-    def __init__(self):
+    def __init__(self, okx_client=None):
         self.api_key = os.getenv('OKX_API_KEY')
         self.secret_key = os.getenv('OKX_SECRET_KEY')
         self.passphrase = os.getenv('OKX_PASSPHRASE')
@@ -83,8 +84,8 @@ class OKXOrderManager:
         # Convert to OKX flag: true -> "1" (demo), false -> "0" (live)
         okx_flag = "1" if testnet.lower() == "true" else "0"
         
-        # Initialize OKX Client
-        self.okx_client = OKXClient()
+        # Initialize OKX Client (a long-running caller may share its own)
+        self.okx_client = okx_client or OKXClient()
         self.trade_api = self.okx_client.get_trade_api()
     
     @retry(
@@ -127,9 +128,6 @@ class OKXOrderManager:
                     after = orders[-1].get('algoId')
                     if not after:
                         break
-                    
-                    # Small delay to avoid rate limiting
-                    time.sleep(0.1)
                 else:
                     error_msg = result.get('msg', 'Unknown error')
                     logger.error(f"❌ Failed to get pending orders: {error_msg}")
@@ -208,7 +206,11 @@ class OKXOrderManager:
             raise  # Re-raise for retry mechanism
     
     def cancel_all_pending_triggers(self, inst_ids=None):
-        """Cancel pending trigger orders. If inst_ids is provided (set/list of inst_id e.g. BTC-USDT), only cancel those; otherwise cancel all."""
+        """Cancel pending trigger orders. If inst_ids is provided (set/list of inst_id e.g. BTC-USDT), only cancel those; otherwise cancel all.
+
+        Per-order outcomes of the last call are left in ``self.cancel_results``.
+        """
+        self.cancel_results = []
         try:
             logger.info("🚀 OKX Pending Trigger Order Canceller")
             logger.info("=" * 60)
@@ -313,11 +315,6 @@ class OKXOrderManager:
                         logger.error(f"   ❌ Exception while cancelling batch {batch_num}: {e}")
                         failed_orders.extend([(order.get('instId', ''), order.get('algoId', ''), f"{str(e)} (attempt {attempt})") for order in batch])
                         continue
-                    
-                    # Rate limiting: OKX allows 20 requests per 2 seconds, so we can be more aggressive
-                    # With batch size 10, we can process batches faster
-                    if batch_num < total_current_batches:  # Don't sleep after the last batch
-                        time.sleep(0.2)  # Reduced from 0.5s to 0.2s for batch processing
                 
                 # Verify after every attempt, including the final one.  The
                 # exchange acknowledgement alone is not sufficient evidence
@@ -341,6 +338,18 @@ class OKXOrderManager:
             
             logger.info("\n" + "=" * 60)
             operation_succeeded = not remaining_orders
+            still_pending = {order.get('algoId') for order in remaining_orders}
+            last_errors = {algo_id: reason for _inst_id, algo_id, reason in failed_orders}
+            self.cancel_results = [
+                {
+                    'inst_id': order.get('instId', ''),
+                    'order_id': order.get('algoId', ''),
+                    'order_type': 'trigger',
+                    'cancelled': order.get('algoId') not in still_pending,
+                    'error': last_errors.get(order.get('algoId')) if order.get('algoId') in still_pending else None,
+                }
+                for order in trigger_orders
+            ]
             verified_cancellations = total_count - len(remaining_orders)
             logger.info(
                 f"📊 Summary: {verified_cancellations}/{total_count} orders absent after final verification"
@@ -387,6 +396,7 @@ def main():
         # Create OKX client and cancel pending triggers
         okx_client = OKXOrderManager()
         operation_succeeded = okx_client.cancel_all_pending_triggers(inst_ids=inst_ids)
+        get_rate_limiter().log_stats(logger)
         if operation_succeeded:
             logger.info("✅ Script completed successfully")
         else:
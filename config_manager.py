@@ -32,6 +32,12 @@ class ConfigManager:
             self.logger.error(f"❌ Database connection error: {e}")
             self.db = None
     
+    def close(self):
+        """Return the database connection to the shared pool"""
+        if self.db:
+            self.db.disconnect()
+            self.db = None
+    
     def load_configured_cryptos(self) -> Set[str]:
         """Load configured cryptocurrency list from database"""
         try:
@@ -6,6 +6,7 @@ Uses OKX official Python SDK for API interactions
 
 import json
 import os
+import hashlib
 import sys
 import logging
 import logging.handlers
@@ -26,17 +27,54 @@ except ImportError:
         pass
     load_dotenv()
 
-from okx_client import OKXClient, get_order_operation_error
+from okx_client import OKXClient, get_order_operation_error, get_balance_snapshot
+from utils_rate_limit import get_rate_limiter
+from utils_instruments import get_instrument_store
+from utils_candles import get_candle_store
+from lib.database import log_pool_stats
 from blacklist_manager import BlacklistManager
+from fetch_filled_orders import MAX_ACTIVE_TRADING_CURRENCIES, NON_USDT_ASSET_GATE_USD, is_at_trading_capacity
 
 # Set Decimal precision to handle very small prices
 getcontext().prec = 28
 
-MAX_ACTIVE_TRADING_CURRENCIES = 3
-NON_USDT_ASSET_GATE_USD = 1.0
 YESTERDAY_GAIN_SKIP_THRESHOLD = Decimal('0.10')
+DEFAULT_TRIGGER_WORKERS = 8
+# OKX accepts at most 20 orders per batch-orders request
+BATCH_ORDER_LIMIT = 20
+BATCH_ORDER_ATTEMPTS = 3
+# Per-order sCodes worth resubmitting: rate limit / service busy / system error
+TRANSIENT_ORDER_SCODES = {'50001', '50011', '50013', '50026'}
+# clOrdId already used by a pending order: an earlier attempt was accepted
+DUPLICATE_CLIENT_ORDER_ID_SCODE = '51016'
+ORDER_NOT_FOUND_CODE = '51603'
+YESTERDAY_GAIN_SKIP_REASON = "Skipped due to yesterday gain above 10%"
 
 
+def get_yesterday_gain_ratio(yesterday_open, yesterday_close):
+    """close / open - 1 for yesterday's candle, or None when the open is unusable."""
+    yesterday_open = Decimal(str(yesterday_open))
+    if yesterday_open <= 0:
+        return None
+    return Decimal(str(yesterday_close)) / yesterday_open - Decimal('1')
+
+
+def is_yesterday_gain_too_high(gain_ratio):
+    """Strategy rule: skip buying after a day that closed more than 10% up."""
+    return gain_ratio is not None and gain_ratio > YESTERDAY_GAIN_SKIP_THRESHOLD
+
+
+def plan_buy_order(open_price, best_limit, current_price=None):
+    """Strategy rule: buy at open × best_limit%.
+
+    Returns ('limit', price) when the market is already below that price,
+    otherwise ('trigger', price).  Shared with backtest.py.
+    """
+    trigger_price = Decimal(str(open_price)) * Decimal(str(best_limit)) / Decimal('100')
+    if current_price is not None and Decimal(str(current_price)) < trigger_price:
+        return 'limit', trigger_price
+    return 'trigger', trigger_price
+
 
 def setup_logging():
     """Setup logging configuration with rotation"""
@@ -79,13 +117,15 @@ def setup_logging():
 logger = setup_logging()
 
 class OKXAlgoTrigger:
-    def __init__(self, order_size="100"):
+    def __init__(self, order_size="100", max_workers=None, okx_client=None):
         self.api_key = os.getenv('OKX_API_KEY')
         self.secret_key = os.getenv('OKX_SECRET_KEY')
         self.passphrase = os.getenv('OKX_PASSPHRASE')
         
         # Order size in USDT (for buy orders) or base currency (for sell orders)
         self.order_size = order_size
+        # Concurrent pairs per run; request pacing is left to the shared rate limiter
+        self.max_workers = max_workers or int(os.getenv('OKX_TRIGGER_WORKERS', DEFAULT_TRIGGER_WORKERS))
         
         if not all([self.api_key, self.secret_key, self.passphrase]):
             print("❌ Error: Missing OKX API credentials in environment variables")
@@ -97,8 +137,8 @@ class OKXAlgoTrigger:
         # Convert to OKX flag: true -> "1" (demo), false -> "0" (live)
         okx_flag = "1" if testnet.lower() == "true" else "0"
         
-        # Initialize OKX Client
-        self.okx_client = OKXClient()
+        # Initialize OKX Client (a long-running caller may share its own)
+        self.okx_client = okx_client or OKXClient()
         self.trade_api = self.okx_client.get_trade_api()
         self.market_api = self.okx_client.get_market_api()
         
@@ -111,13 +151,6 @@ class OKXAlgoTrigger:
         # Instrument metadata cache to enforce exchange precision rules
         self.instrument_rules_cache = {}
 
-    def _safe_float(self, value, default=0.0):
-        """Safely parse float values from API responses."""
-        try:
-            return float(value)
-        except (TypeError, ValueError):
-            return default
-
     def _get_significant_non_usdt_assets(self):
         """Return non-USDT trading account assets above the USD threshold."""
         account_api = self.okx_client.get_account_api()
@@ -126,29 +159,15 @@ class OKXAlgoTrigger:
             return None
 
         try:
-            result = account_api.get_account_balance()
-            if not result or result.get('code') != '0':
-                logger.error(f"❌ Failed to query trading account balances: {result}")
-                return None
-
-            data = result.get('data', [])
-            if not data:
+            snapshot = get_balance_snapshot(account_api)
+            if not snapshot.has_data:
                 logger.info("🔍 Trading account balance returned no data")
                 return []
 
-            details = data[0].get('details', [])
-            significant_assets = []
-
-            for detail in details:
-                ccy = (detail.get('ccy') or '').upper()
-                if not ccy or ccy == 'USDT':
-                    continue
-
-                eq_usd = self._safe_float(detail.get('eqUsd'))
-                if eq_usd > NON_USDT_ASSET_GATE_USD:
-                    significant_assets.append((ccy, eq_usd))
-
-            return significant_assets
+            return [
+                (ccy, eq_usd) for ccy, eq_usd in snapshot.non_usdt_assets()
+                if eq_usd > NON_USDT_ASSET_GATE_USD
+            ]
         except Exception as e:
             logger.error(f"❌ Error checking trading account balances: {e}")
             return None
@@ -173,6 +192,8 @@ class OKXAlgoTrigger:
 
             data = result['data']
             self.data_cache.setdefault(inst_id, {})['candlestick_data'] = data
+            # Keep the closed bars for backtests/optimizer without another request
+            get_candle_store().append_okx_rows(inst_id, data)
             return data
         except Exception as e:
             logger.warning(f"⚠️ Error getting daily candles for {inst_id}: {e}")
@@ -206,14 +227,12 @@ class OKXAlgoTrigger:
             return False
 
         try:
-            yesterday_open = Decimal(data[1][1])
-            yesterday_close = Decimal(data[1][4])
-            if yesterday_open <= 0:
+            gain_ratio = get_yesterday_gain_ratio(data[1][1], data[1][4])
+            if gain_ratio is None:
                 logger.warning(f"⚠️ {inst_id} | Invalid yesterday open; continuing without gain filter")
                 return False
 
-            gain_ratio = yesterday_close / yesterday_open - Decimal('1')
-            if gain_ratio > YESTERDAY_GAIN_SKIP_THRESHOLD:
+            if is_yesterday_gain_too_high(gain_ratio):
                 logger.warning(
                     f"🚫 {inst_id} | Skipping buy: yesterday gained "
                     f"{(gain_ratio * 100):.2f}% (> 10%)"
@@ -226,8 +245,53 @@ class OKXAlgoTrigger:
             logger.warning(f"⚠️ {inst_id} | Invalid yesterday candle; continuing without gain filter: {e}")
             return False
     
+    def prefetch_market_data(self, inst_ids):
+        """Warm data_cache for all pairs: one get_tickers call plus concurrent daily candles.
+
+        Failures are not fatal; pairs missing from the cache fall back to
+        per-pair requests in the processing loop.
+        """
+        inst_ids = list(inst_ids)
+        if not inst_ids:
+            return
+
+        wanted = set(inst_ids)
+        try:
+            result = self.market_api.get_tickers(instType='SPOT')
+            if result.get('code') == '0':
+                for ticker in result.get('data', []):
+                    inst_id = ticker.get('instId')
+                    if inst_id not in wanted:
+                        continue
+                    try:
+                        price = Decimal(ticker.get('last') or '0')
+                    except ArithmeticError:
+                        continue
+                    if price > 0:
+                        self.data_cache.setdefault(inst_id, {})['current_price'] = price
+            else:
+                logger.warning(f"⚠️ Failed to prefetch spot tickers: {result.get('msg', 'Unknown error')}")
+        except Exception as e:
+            logger.warning(f"⚠️ Error prefetching spot tickers: {e}")
+
+        max_workers = max(1, getattr(self, 'max_workers', 1))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            candles = list(executor.map(
+                lambda inst_id: self._get_daily_candles(inst_id, minimum_candles=2), inst_ids
+            ))
+
+        priced = sum(1 for inst_id in inst_ids if 'current_price' in self.data_cache.get(inst_id, {}))
+        logger.info(
+            f"📦 Prefetched market data: {priced}/{len(inst_ids)} tickers, "
+            f"{sum(1 for data in candles if data)}/{len(inst_ids)} daily candles"
+        )
+
     def get_current_price(self, inst_id):
-        """Get current price from ticker API"""
+        """Get current price from the prefetched tickers, falling back to the ticker API"""
+        cached_price = self.data_cache.get(inst_id, {}).get('current_price')
+        if cached_price is not None:
+            return cached_price
+
         try:
             ticker_result = self.market_api.get_ticker(instId=inst_id)
             if ticker_result.get('code') == '0' and ticker_result.get('data'):
@@ -283,7 +347,7 @@ class OKXAlgoTrigger:
         retry=retry_if_exception_type((Exception,))
     )
     def get_instrument_rules(self, inst_id):
-        """Get and cache instrument precision rules from OKX."""
+        """Get and cache instrument precision rules from OKX (misses are not cached)."""
         try:
             if inst_id in self.instrument_rules_cache:
                 return self.instrument_rules_cache[inst_id]
@@ -292,22 +356,18 @@ class OKXAlgoTrigger:
             api = self.okx_client.get_public_api() or self.market_api
             if not api or not hasattr(api, 'get_instruments'):
                 logger.warning("⚠️ No API with get_instruments, fallback to local precision rules")
-                self.instrument_rules_cache[inst_id] = None
                 return None
 
-            result = api.get_instruments(instType="SPOT", instId=inst_id)
-            if result.get('code') != '0' or not result.get('data'):
+            item = get_instrument_store().get(inst_id, api)
+            if not item:
                 logger.warning(f"⚠️ {inst_id} | Failed to load instrument rules, using fallback precision")
-                self.instrument_rules_cache[inst_id] = None
                 return None
 
-            item = result['data'][0]
             tick_sz = Decimal(item.get('tickSz', '0'))
             lot_sz = Decimal(item.get('lotSz', '0'))
             min_sz = Decimal(item.get('minSz', '0'))
             if tick_sz <= 0 or lot_sz <= 0:
                 logger.warning(f"⚠️ {inst_id} | Invalid tick/lot size from exchange, using fallback precision")
-                self.instrument_rules_cache[inst_id] = None
                 return None
 
             rules = {
@@ -319,7 +379,6 @@ class OKXAlgoTrigger:
             return rules
         except Exception as e:
             logger.warning(f"⚠️ {inst_id} | Failed to load/parse instrument rules ({e}), using fallback precision")
-            self.instrument_rules_cache[inst_id] = None
             return None
 
     def _normalize_order_params(self, inst_id, target_price: Decimal, token_quantity: Decimal, strategy_prefix=""):
@@ -344,74 +403,153 @@ class OKXAlgoTrigger:
         if adjusted_price <= 0 or adjusted_size <= 0:
             return None, None, f"{strategy_prefix}invalid price/size after fallback rounding"
         return adjusted_price, adjusted_size, None
-    
-    @retry(
-        stop=stop_after_attempt(5),
-        wait=wait_exponential(multiplier=1, min=6, max=30),
-        retry=retry_if_exception_type((Exception,))
-    )
-    def _place_limit_buy_order(self, inst_id, buy_price, strategy_name=""):
-        """Place limit buy order directly (no trigger). Used when current price already below buy_price.
-        Limit typically fills since price is below target; if not, cancel_pending_limits will cancel it."""
-        try:
-            strategy_prefix = f"{strategy_name} " if strategy_name else ""
-            if not self.trade_api:
-                logger.error(f"❌ {inst_id} {strategy_prefix}Trade API unavailable")
-                return False
 
-            if self.should_skip_buy_for_yesterday_gain(inst_id):
-                return False
-
-            if isinstance(buy_price, str):
-                buy_price_decimal = Decimal(buy_price)
-            else:
-                buy_price_decimal = Decimal(str(buy_price))
-
-            if buy_price_decimal <= 0:
-                logger.error(f"❌ {inst_id} {strategy_prefix}invalid buy price: {buy_price_decimal}")
-                return False
+    def _prepare_buy_order_params(self, inst_id, price, strategy_prefix="", price_label="buy", order_label="order"):
+        """Validate a buy price and return exchange-ready (price, size) strings, or None."""
+        price_decimal = Decimal(price) if isinstance(price, str) else Decimal(str(price))
+        if price_decimal <= 0:
+            logger.error(f"❌ {inst_id} {strategy_prefix}invalid {price_label} price: {price_decimal}")
+            return None
 
-            usdt_amount = Decimal(self.order_size)
-            if usdt_amount <= 0:
-                logger.error(f"❌ {inst_id} {strategy_prefix}invalid order size: {self.order_size}")
-                return False
+        # Calculate token quantity based on the order price
+        usdt_amount = Decimal(self.order_size)
+        if usdt_amount <= 0:
+            logger.error(f"❌ {inst_id} {strategy_prefix}invalid order size: {self.order_size}")
+            return None
 
-            token_quantity = usdt_amount / buy_price_decimal
-            adjusted_price, adjusted_size, normalize_error = self._normalize_order_params(
-                inst_id, buy_price_decimal, token_quantity, strategy_prefix
-            )
-            if normalize_error:
-                logger.warning(f"⚠️ {inst_id} | {normalize_error}, skip placing order")
-                return False
+        token_quantity = usdt_amount / price_decimal
+        adjusted_price, adjusted_size, normalize_error = self._normalize_order_params(
+            inst_id, price_decimal, token_quantity, strategy_prefix
+        )
+        if normalize_error:
+            logger.warning(f"⚠️ {inst_id} | {normalize_error}, skip placing {order_label}")
+            return None
 
-            adjusted_price_str = self._to_plain_decimal_str(adjusted_price)
-            adjusted_size_str = self._to_plain_decimal_str(adjusted_size)
+        return self._to_plain_decimal_str(adjusted_price), self._to_plain_decimal_str(adjusted_size)
+    
+    @staticmethod
+    def _limit_buy_client_order_id(inst_id):
+        """Stable per-pair, per-day clOrdId, used to look up what an earlier attempt placed."""
+        day = datetime.now(timezone.utc).strftime('%Y%m%d')
+        return f"buy{hashlib.sha256(f'{inst_id}:{day}'.encode()).hexdigest()[:24]}"
 
-            logger.info(f"💰 {inst_id} | {strategy_prefix}Limit buy at ${adjusted_price_str} (price already below target, no trigger)")
-            time.sleep(2.0)
-            result = self.trade_api.place_order(
-                instId=inst_id,
-                tdMode="cash",
-                side="buy",
-                ordType="limit",
-                px=adjusted_price_str,
-                sz=adjusted_size_str,
-                tgtCcy="base_ccy"
-            )
-            
+    def _get_limit_buy_state(self, inst_id, client_order_id):
+        """Return PLACED, NOT_FOUND, or UNKNOWN for a limit buy clOrdId without placing an order."""
+        try:
+            result = self.trade_api.get_order(instId=inst_id, clOrdId=client_order_id)
+            if result and result.get('code') == ORDER_NOT_FOUND_CODE:
+                return 'NOT_FOUND'
             error_msg = get_order_operation_error(result, require_data=True)
-            if not error_msg:
-                order_id = result.get('data', [{}])[0].get('ordId', 'N/A')
-                logger.info(f"✅ {inst_id} {strategy_prefix}limit buy order placed - Order ID: {order_id}")
-                return True
-            else:
-                logger.error(f"❌ {inst_id} {strategy_prefix}limit buy failed: {error_msg}")
-                return False
+            if error_msg:
+                logger.warning(f"⚠️ Could not verify limit buy {client_order_id} for {inst_id}: {error_msg}")
+                return 'UNKNOWN'
+            return 'PLACED'
         except Exception as e:
-            strategy_prefix = f"{strategy_name} " if strategy_name else ""
-            logger.error(f"❌ {inst_id} {strategy_prefix}limit buy exception: {e}")
-            raise
-    
+            logger.warning(f"⚠️ Error verifying limit buy {client_order_id} for {inst_id}: {e}")
+            return 'UNKNOWN'
+
+    def _submit_limit_buy_batch(self, batch):
+        """Send one batch-orders request; request-level failures raise.
+
+        Returns the per-order results in request order.
+        """
+        batch_inst_ids = [order['instId'] for order in batch]
+        result = self.trade_api.place_multiple_orders(batch)
+        # code 1: all orders failed, 2: some failed; both carry per-order results
+        if not result or result.get('code') not in ('0', '1', '2'):
+            error_msg = result.get('msg', 'unknown API error') if result else 'empty response'
+            raise RuntimeError(f"Batch limit buy failed for {batch_inst_ids}: {error_msg}")
+
+        data = result.get('data')
+        if not isinstance(data, list) or len(data) != len(batch):
+            raise RuntimeError(f"Batch limit buy returned {len(data or [])} results for {len(batch)} orders")
+        return data
+
+    def _place_limit_buy_orders_batch(self, orders):
+        """Place direct limit buys via batch-orders, up to BATCH_ORDER_LIMIT per request.
+
+        ``orders`` is a list of (inst_id, buy_price); returns {inst_id: (inst_id, reason, success)}.
+        Orders rejected with a transient sCode are resubmitted.  A failed
+        request is not retried blindly: it may have reached OKX, and these
+        buys usually fill at once, so only orders whose clOrdId OKX verifiably
+        does not know are sent again.
+        """
+        results = {inst_id: (inst_id, "Failed to place limit order", False) for inst_id, _ in orders}
+        if not self.trade_api:
+            logger.error("❌ Trade API unavailable for batch limit buys")
+            return results
+
+        prepared = []
+        for inst_id, buy_price in orders:
+            if self.should_skip_buy_for_yesterday_gain(inst_id):
+                results[inst_id] = (inst_id, YESTERDAY_GAIN_SKIP_REASON, False)
+                continue
+            try:
+                order_params = self._prepare_buy_order_params(inst_id, buy_price)
+            except Exception as e:
+                logger.error(f"❌ {inst_id} limit buy exception: {e}")
+                continue
+            if order_params is None:
+                continue
+            adjusted_price_str, adjusted_size_str = order_params
+            logger.info(f"💰 {inst_id} | Limit buy at ${adjusted_price_str} (price already below target, no trigger)")
+            prepared.append({
+                'instId': inst_id,
+                'tdMode': 'cash',
+                'side': 'buy',
+                'ordType': 'limit',
+                'px': adjusted_price_str,
+                'sz': adjusted_size_str,
+                'tgtCcy': 'base_ccy',
+                'clOrdId': self._limit_buy_client_order_id(inst_id),
+            })
+
+        for start in range(0, len(prepared), BATCH_ORDER_LIMIT):
+            pending = prepared[start:start + BATCH_ORDER_LIMIT]
+            for attempt in range(1, BATCH_ORDER_ATTEMPTS + 1):
+                retry_orders = []
+                try:
+                    data = self._submit_limit_buy_batch(pending)
+                except Exception as e:
+                    logger.error(f"❌ {e}")
+                    for order in pending:
+                        inst_id = order['instId']
+                        state = self._get_limit_buy_state(inst_id, order['clOrdId'])
+                        if state == 'PLACED':
+                            logger.info(f"✅ {inst_id} limit buy was placed despite the failed request ({order['clOrdId']})")
+                            results[inst_id] = (inst_id, None, True)
+                        elif state == 'NOT_FOUND' and attempt < BATCH_ORDER_ATTEMPTS:
+                            retry_orders.append(order)
+                        else:
+                            results[inst_id] = (inst_id, f"Failed to place limit order: {e}", False)
+                    data = []
+
+                # OKX returns per-order results in request order
+                for order, item in zip(pending, data):
+                    inst_id = order['instId']
+                    s_code = str(item.get('sCode', ''))
+                    if s_code == DUPLICATE_CLIENT_ORDER_ID_SCODE:
+                        logger.info(f"✅ {inst_id} limit buy already placed by an earlier attempt ({order['clOrdId']})")
+                        results[inst_id] = (inst_id, None, True)
+                        continue
+                    error_msg = get_order_operation_error({'code': '0', 'data': [item]}, require_data=True)
+                    if not error_msg:
+                        logger.info(f"✅ {inst_id} limit buy order placed - Order ID: {item.get('ordId', 'N/A')}")
+                        results[inst_id] = (inst_id, None, True)
+                    elif s_code in TRANSIENT_ORDER_SCODES and attempt < BATCH_ORDER_ATTEMPTS:
+                        logger.warning(f"⚠️ {inst_id} limit buy transient failure, retrying: {error_msg}")
+                        retry_orders.append(order)
+                    else:
+                        logger.error(f"❌ {inst_id} limit buy failed: {error_msg}")
+                        results[inst_id] = (inst_id, f"Failed to place limit order: {error_msg}", False)
+
+                if not retry_orders:
+                    break
+                pending = retry_orders
+                time.sleep(2 ** attempt)
+
+        return results
+
     @retry(
         stop=stop_after_attempt(5),
         wait=wait_exponential(multiplier=1, min=6, max=30),
@@ -428,39 +566,17 @@ class OKXAlgoTrigger:
             if self.should_skip_buy_for_yesterday_gain(inst_id):
                 return False
 
-            # Convert trigger_price to Decimal
-            if isinstance(trigger_price, str):
-                trigger_price_decimal = Decimal(trigger_price)
-            else:
-                trigger_price_decimal = Decimal(str(trigger_price))
-
-            if trigger_price_decimal <= 0:
-                logger.error(f"❌ {inst_id} {strategy_prefix}invalid trigger price: {trigger_price_decimal}")
-                return False
-            
-            # Calculate token quantity based on trigger price
-            usdt_amount = Decimal(self.order_size)
-            if usdt_amount <= 0:
-                logger.error(f"❌ {inst_id} {strategy_prefix}invalid order size: {self.order_size}")
-                return False
-
-            token_quantity = usdt_amount / trigger_price_decimal
-            adjusted_price, adjusted_size, normalize_error = self._normalize_order_params(
-                inst_id, trigger_price_decimal, token_quantity, strategy_prefix
+            order_params = self._prepare_buy_order_params(
+                inst_id, trigger_price, strategy_prefix, price_label="trigger", order_label="trigger"
             )
-            if normalize_error:
-                logger.warning(f"⚠️ {inst_id} | {normalize_error}, skip placing trigger")
+            if order_params is None:
                 return False
-
-            adjusted_price_str = self._to_plain_decimal_str(adjusted_price)
-            adjusted_size_str = self._to_plain_decimal_str(adjusted_size)
+            adjusted_price_str, adjusted_size_str = order_params
 
             logger.info(f"🎯 {inst_id} | {strategy_prefix}Trigger: ${adjusted_price_str}")
             logger.info(f"📊 {inst_id} | Size: {adjusted_size_str} tokens")
             
-            # Small delay to avoid connection overload / "Server disconnected"
-            time.sleep(2.0)
-            # Create trigger order
+            # Create trigger order (paced by the shared OKX rate limiter)
             result = self.trade_api.place_algo_order(
                 instId=inst_id,
                 tdMode="cash",
@@ -511,12 +627,26 @@ class OKXAlgoTrigger:
             logger.debug(f"Traceback: {traceback.format_exc()}")
             raise  # Re-raise for retry mechanism
     
-    def _process_single_limit_pair(self, inst_id, config, blacklisted_cryptos):
-        """Process a single crypto pair for limits strategy (for parallel processing)"""
+    def _execute_trigger_order(self, inst_id, price):
+        """Place one planned trigger order and return the pair result tuple."""
+        try:
+            if self._create_trigger_order_internal(inst_id, price, ""):
+                return (inst_id, None, True)
+            return (inst_id, "Failed to create order", False)
+        except Exception as e:
+            logger.error(f"❌ Error processing {inst_id}: {e}")
+            return (inst_id, str(e), False)
+
+    def _plan_single_limit_pair(self, inst_id, config, blacklisted_cryptos):
+        """Decide how to buy a pair without placing anything.
+
+        Returns (result, None) when the pair is finished (skipped or failed),
+        or (None, (order_type, price)) where order_type is 'limit' or 'trigger'.
+        """
         best_limit = config.get('best_limit')
         
         if best_limit is None:
-            return (inst_id, "no best_limit found", False)
+            return (inst_id, "no best_limit found", False), None
         
         # Extract base currency from inst_id (e.g., "BTC-USDT" -> "BTC")
         base_currency = inst_id.split('-')[0] if '-' in inst_id else inst_id
@@ -524,50 +654,42 @@ class OKXAlgoTrigger:
         # Check if cryptocurrency is blacklisted
         if base_currency in blacklisted_cryptos:
             reason = self.blacklist_manager.get_blacklist_reason(base_currency)
-            return (inst_id, f"Blacklisted: {reason}", False)
+            return (inst_id, f"Blacklisted: {reason}", False), None
         
         logger.info(f"\n🔄 Processing {inst_id}...")
         
         try:
             if self.should_skip_buy_for_yesterday_gain(inst_id):
-                return (inst_id, "Skipped due to yesterday gain above 10%", False)
+                return (inst_id, YESTERDAY_GAIN_SKIP_REASON, False), None
 
             # Get today's opening price.
             open_price = self.get_crypto_data(inst_id)
             
             if open_price is None:
                 logger.warning(f"⚠️  Skipping {inst_id}: could not get open price")
-                return (inst_id, "Failed to get open price", False)
-            
-            # Calculate trigger price: open_price × best_limit / 100
-            trigger_price = open_price * Decimal(str(best_limit)) / Decimal('100')
+                return (inst_id, "Failed to get open price", False), None
             
-            # If current price already below trigger_price, place limit buy directly (no trigger)
+            # Trigger price: open_price × best_limit / 100.  If the current price is
+            # already below it, place a limit buy directly (no trigger)
             current_price = self.get_current_price(inst_id)
-            if current_price is not None and current_price < trigger_price:
+            order_type, trigger_price = plan_buy_order(open_price, best_limit, current_price)
+            if order_type == 'limit':
                 logger.info(f"📊 {inst_id} | Current price ${current_price} < trigger ${trigger_price}, placing limit buy directly (no trigger)")
-                if self._place_limit_buy_order(inst_id, trigger_price, ""):
-                    return (inst_id, None, True)
-                else:
-                    return (inst_id, "Failed to place limit order", False)
+                return None, ('limit', trigger_price)
             
             logger.info(f"📊 {inst_id} | Open: ${open_price} | Limit: {best_limit}% | Trigger: ${trigger_price}")
-            
-            if self._create_trigger_order_internal(inst_id, trigger_price, ""):
-                return (inst_id, None, True)
-            else:
-                return (inst_id, "Failed to create order", False)
+            return None, ('trigger', trigger_price)
             
         except Exception as e:
             logger.error(f"❌ Error processing {inst_id}: {e}")
-            return (inst_id, str(e), False)
+            return (inst_id, str(e), False), None
 
     @staticmethod
     def _is_expected_skip_reason(reason):
         """Return whether a pair was intentionally excluded by strategy rules."""
         return bool(reason) and (
             reason.startswith("Blacklisted:")
-            or reason == "Skipped due to yesterday gain above 10%"
+            or reason == YESTERDAY_GAIN_SKIP_REASON
         )
 
     def process_limits_from_database(self):
@@ -577,6 +699,7 @@ class OKXAlgoTrigger:
             from config_manager import ConfigManager
             config_manager = ConfigManager(logger)
             limits_data = config_manager.load_full_config()
+            config_manager.close()
             
             if not limits_data:
                 logger.error("❌ No limits configuration found in database")
@@ -603,7 +726,7 @@ class OKXAlgoTrigger:
                     f"📌 Active OKX holdings above ${NON_USDT_ASSET_GATE_USD}: {assets_text}"
                 )
 
-            if active_count >= MAX_ACTIVE_TRADING_CURRENCIES:
+            if is_at_trading_capacity(active_count):
                 logger.warning(
                     f"⚠️  Active trading instruments already at limit (>= {MAX_ACTIVE_TRADING_CURRENCIES}); skip creating new triggers"
                 )
@@ -619,20 +742,30 @@ class OKXAlgoTrigger:
             else:
                 logger.info("✅ No blacklisted cryptocurrencies found")
             
+            max_workers = max(1, getattr(self, 'max_workers', 1))
+            self.prefetch_market_data(
+                inst_id for inst_id in crypto_configs
+                if inst_id.split('-')[0] not in blacklisted_cryptos
+            )
+
             logger.info("=" * 60)
-            logger.info("🚀 Processing with sequential execution (avoids Server disconnected)")
+            logger.info(f"🚀 Processing with {max_workers} concurrent worker(s)")
             logger.info("=" * 60)
             
             success_count = 0
             total_count = len(crypto_configs)
             failed_pairs = []
             skipped_pairs = []
+            results = {}
+            limit_orders = []
+            trigger_orders = []
             
-            # Sequential (max_workers=1) to avoid connection overload / "Server disconnected"
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                # Submit all tasks
+            # Workers share one rate limiter and the SDK's pooled HTTP clients, so
+            # requests for different pairs overlap without exceeding OKX limits
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Plan every pair first; placement is grouped below
                 future_to_pair = {
-                    executor.submit(self._process_single_limit_pair, inst_id, config, blacklisted_cryptos): inst_id
+                    executor.submit(self._plan_single_limit_pair, inst_id, config, blacklisted_cryptos): inst_id
                     for inst_id, config in crypto_configs.items()
                 }
                 
@@ -640,17 +773,44 @@ class OKXAlgoTrigger:
                 for future in as_completed(future_to_pair):
                     inst_id = future_to_pair[future]
                     try:
-                        result_inst_id, reason, success = future.result()
-                        if success:
-                            success_count += 1
-                        else:
-                            if self._is_expected_skip_reason(reason):
-                                skipped_pairs.append((result_inst_id, reason))
-                            else:
-                                failed_pairs.append((result_inst_id, reason))
+                        result, order = future.result()
                     except Exception as e:
                         logger.error(f"❌ Exception processing {inst_id}: {e}")
-                        failed_pairs.append((inst_id, str(e)))
+                        results[inst_id] = (inst_id, str(e), False)
+                        continue
+                    if result is not None:
+                        results[inst_id] = result
+                    elif order[0] == 'limit':
+                        limit_orders.append((inst_id, order[1]))
+                    else:
+                        trigger_orders.append((inst_id, order[1]))
+
+                # Direct limit buys go out through batch-orders; OKX has no batch
+                # endpoint for algo orders, so triggers are placed concurrently
+                trigger_futures = {
+                    executor.submit(self._execute_trigger_order, inst_id, price): inst_id
+                    for inst_id, price in trigger_orders
+                }
+                if limit_orders:
+                    logger.info(f"📦 Placing {len(limit_orders)} direct limit buy(s) via batch orders")
+                    results.update(self._place_limit_buy_orders_batch(limit_orders))
+                for future in as_completed(trigger_futures):
+                    inst_id = trigger_futures[future]
+                    try:
+                        results[inst_id] = future.result()
+                    except Exception as e:
+                        logger.error(f"❌ Exception processing {inst_id}: {e}")
+                        results[inst_id] = (inst_id, str(e), False)
+            
+            # Summarize in configuration order so output is stable across runs
+            for inst_id in crypto_configs:
+                result_inst_id, reason, success = results[inst_id]
+                if success:
+                    success_count += 1
+                elif self._is_expected_skip_reason(reason):
+                    skipped_pairs.append((result_inst_id, reason))
+                else:
+                    failed_pairs.append((result_inst_id, reason))
             
             logger.info("\n" + "=" * 60)
             logger.info(f"📊 Summary: {success_count}/{total_count} orders created successfully")
@@ -685,6 +845,8 @@ def main():
         okx_client = OKXAlgoTrigger(order_size=order_size)
         
         limits_success = okx_client.process_limits_from_database()
+        get_rate_limiter().log_stats(logger)
+        log_pool_stats(logger)
 
         if not limits_success:
             logger.error("❌ Script completed with failures")
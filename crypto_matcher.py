@@ -5,9 +5,75 @@ Responsible for checking if announcements affect configured cryptocurrencies
 """
 
 import logging
-from typing import Set, Tuple, Optional
+from collections import deque
+from typing import Dict, FrozenSet, List, Set, Tuple, Optional
 from config_manager import ConfigManager
 
+# An alias only counts when it is not glued to other letters or digits
+_WORD_CHARS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789')
+# Characters that stay non-ASCII after str.upper() but still equal a letter
+# case-insensitively (dotted capital I, Kelvin sign)
+_CASE_FOLD = str.maketrans({'\u0130': 'I', '\u212a': 'K'})
+
+
+class _AliasAutomaton:
+    """Aho-Corasick automaton over every alias, built once per configuration.
+
+    ``search`` walks the text a single time and reports the cryptos whose
+    aliases occur as complete words, however many aliases are configured.
+    """
+
+    def __init__(self, alias_mapping: Dict[str, Set[str]]):
+        owners: Dict[str, Set[str]] = {}
+        for crypto, aliases in alias_mapping.items():
+            for alias in aliases:
+                owners.setdefault(alias, set()).add(crypto)
+
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # Per state: (alias length, cryptos) for every alias ending here
+        self.output: List[List[Tuple[int, FrozenSet[str]]]] = [[]]
+        for alias, cryptos in owners.items():
+            state = 0
+            for char in alias:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append((len(alias), frozenset(cryptos)))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def search(self, text: str) -> Set[str]:
+        goto, fail, output = self.goto, self.fail, self.output
+        found: Set[str] = set()
+        state = 0
+        last = len(text) - 1
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            # Every alias ending here shares the right boundary
+            if output[state] and (index == last or text[index + 1] not in _WORD_CHARS):
+                for length, cryptos in output[state]:
+                    start = index - length + 1
+                    if start == 0 or text[start - 1] not in _WORD_CHARS:
+                        found |= cryptos
+        return found
+
 
 class CryptoMatcher:
     """Cryptocurrency Matcher"""
@@ -33,22 +99,6 @@ class CryptoMatcher:
         # Use the new alias-based matching
         return self._find_crypto_aliases(announcement_text)
     
-    def _is_exact_match(self, crypto: str, text: str) -> bool:
-        """Check if cryptocurrency appears as a complete word in text with improved regex"""
-        import re
-        
-        # Ensure both crypto and text are uppercase for case-insensitive matching
-        crypto_upper = crypto.upper()
-        text_upper = text.upper()
-        
-        # Create a more precise regex pattern
-        # (?<![A-Z0-9]) ensures the crypto is not preceded by alphanumeric characters
-        # (?![A-Z0-9]) ensures the crypto is not followed by alphanumeric characters
-        # re.I flag for case-insensitive matching (though we already converted to uppercase)
-        pattern = re.compile(rf'(?<![A-Z0-9]){re.escape(crypto_upper)}(?![A-Z0-9])', re.I)
-        
-        return bool(pattern.search(text_upper))
-    
     def _create_alias_mapping(self):
         """Create alias mapping for common trading pair formats"""
         self.alias_mapping = {}
@@ -68,19 +118,13 @@ class CryptoMatcher:
                 aliases.add(f"{crypto_upper}{quote}")
             
             self.alias_mapping[crypto_upper] = aliases
+        
+        # Match all aliases at once instead of one regex per alias
+        self._alias_automaton = _AliasAutomaton(self.alias_mapping)
     
     def _find_crypto_aliases(self, text: str) -> Set[str]:
-        """Find all crypto aliases that appear in the text"""
-        found_cryptos = set()
-        text_upper = text.upper()
-        
-        for crypto, aliases in self.alias_mapping.items():
-            for alias in aliases:
-                if self._is_exact_match(alias, text_upper):
-                    found_cryptos.add(crypto)
-                    break  # Found this crypto, no need to check other aliases
-        
-        return found_cryptos
+        """Find all configured cryptos with an alias appearing as a complete word in the text"""
+        return self._alias_automaton.search(text.upper().translate(_CASE_FOLD))
     
     def check_announcement_impact(self, announcement: dict) -> Tuple[bool, Set[str]]:
         """Check if announcement affects configured cryptocurrencies"""
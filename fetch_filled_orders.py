@@ -11,11 +11,12 @@ import json
 import logging
 import logging.handlers
 import traceback
+from collections import Counter
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal, ROUND_HALF_UP, getcontext
 # import sqlite3  # Migrated to PostgreSQL
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 
 # Set Decimal precision
 getcontext().prec = 28
@@ -49,7 +50,9 @@ except ImportError:
         pass
     load_dotenv()
 
-from okx_client import OKXClient, get_order_operation_error
+from okx_client import OKXClient, get_order_operation_error, get_balance_snapshot, invalidate_balance_snapshot
+from utils_rate_limit import get_rate_limiter
+from lib.database import log_pool_stats, notify, FILLS_CHANNEL, SOLD_CHANNEL
 
 # Configure logging with rotation
 def setup_logging():
@@ -93,9 +96,26 @@ logger = setup_logging()
 
 MAX_ACTIVE_TRADING_CURRENCIES = 3
 NON_USDT_ASSET_GATE_USD = 1.0
+# Lots are sold this long after the buy fill
+SELL_DELAY_MS = 24 * 60 * 60 * 1000
+
+# get_fills pagination (max page size) and coverage; older fills need get_fills_history
+FILLS_PAGE_LIMIT = 100
+FILLS_RECENT_WINDOW_MS = 3 * 24 * 60 * 60 * 1000
+# Switch to the history endpoint a little early so no fill falls off the 3-day edge mid-walk
+FILLS_HISTORY_MARGIN_MS = 60 * 60 * 1000
+# Lots filled this close to (or after) a balance request may not show in it yet
+MANUAL_SELL_FILL_MARGIN_MS = 60 * 1000
+FILLS_CURSOR_NAME = 'okx_spot_fills'
+
+
+def is_at_trading_capacity(active_count):
+    """Strategy rule: stop buying once this many instruments are held."""
+    return active_count >= MAX_ACTIVE_TRADING_CURRENCIES
+
 
 class OKXFilledOrdersFetcher:
-    def __init__(self):
+    def __init__(self, okx_client=None):
         """Initialize OKX API connection and defer database connection until needed"""
         try:
             self.api_key = os.getenv('OKX_API_KEY')
@@ -118,8 +138,8 @@ class OKXFilledOrdersFetcher:
             # Set flag for demo/live trading
             self.okx_flag = "1" if self.testnet else "0"
             
-            # Initialize OKX Client
-            self.okx_client = OKXClient(logger)
+            # Initialize OKX Client (a long-running caller may share its own)
+            self.okx_client = okx_client or OKXClient(logger)
             self.trade_api = self.okx_client.get_trade_api()
 
             self.conn = None
@@ -139,9 +159,9 @@ class OKXFilledOrdersFetcher:
         if self.database_initialized:
             return
 
-        from lib.database import get_database_connection
+        from lib.database import acquire_connection
 
-        self.conn = get_database_connection()
+        self.conn = acquire_connection()
         self.cursor = self.conn.cursor()
         self.database_initialized = True
         logger.info("✅ Connected to PostgreSQL database")
@@ -168,31 +188,19 @@ class OKXFilledOrdersFetcher:
             raise RuntimeError("Account API unavailable; cannot verify trigger protection")
 
         try:
-            result = account_api.get_account_balance()
-            if not result or result.get('code') != '0':
-                raise RuntimeError(f"Unable to query OKX balances: {result}")
-
-            data = result.get('data', [])
-            if not data or not isinstance(data[0].get('details'), list):
+            snapshot = get_balance_snapshot(account_api)
+            if not snapshot.has_data:
                 raise RuntimeError("OKX balance response contained no valid account details")
-            details = data[0]['details']
-            active_assets = []
-            for detail in details:
-                ccy = (detail.get('ccy') or '').upper()
-                if not ccy or ccy == 'USDT':
-                    continue
-                try:
-                    eq_usd = float(detail.get('eqUsd') or 0)
-                except (TypeError, ValueError):
-                    eq_usd = 0.0
-                if eq_usd > NON_USDT_ASSET_GATE_USD:
-                    active_assets.append((ccy, eq_usd))
+            active_assets = [
+                (ccy, eq_usd) for ccy, eq_usd in snapshot.non_usdt_assets()
+                if eq_usd > NON_USDT_ASSET_GATE_USD
+            ]
 
             active_count = len(active_assets)
             logger.info(
                 f"📊 Account-only trigger protection: {active_count}/{MAX_ACTIVE_TRADING_CURRENCIES} active positions"
             )
-            if active_count >= MAX_ACTIVE_TRADING_CURRENCIES:
+            if is_at_trading_capacity(active_count):
                 assets_text = ", ".join(f"{ccy}:${eq_usd:.4f}" for ccy, eq_usd in active_assets)
                 logger.warning(
                     f"⚠️ {active_count} active OKX positions (>= {MAX_ACTIVE_TRADING_CURRENCIES}); "
@@ -220,9 +228,8 @@ class OKXFilledOrdersFetcher:
         try:
             self.ensure_database_initialized()
             self.cursor.execute('''
-                SELECT MAX(CAST(ts AS BIGINT)) as last_ts
-                FROM filled_orders 
-                WHERE ts IS NOT NULL AND ts != ''
+                SELECT MAX(ts) as last_ts
+                FROM filled_orders
             ''')
             result = self.cursor.fetchone()
             if result and result[0]:
@@ -232,6 +239,95 @@ class OKXFilledOrdersFetcher:
             logger.warning(f"⚠️ Failed to get last trade timestamp: {e}")
             return None
 
+    def ensure_cursor_table(self):
+        """Create the ingestion cursor table on first use"""
+        if getattr(self, 'cursor_table_ready', False):
+            return
+        self.ensure_database_initialized()
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ingestion_cursors (
+                name VARCHAR(50) PRIMARY KEY,
+                bill_id BIGINT NOT NULL,
+                ts BIGINT NOT NULL,
+                updated_at TIMESTAMPTZ DEFAULT NOW()
+            )
+        ''')
+        self.conn.commit()
+        self.cursor_table_ready = True
+
+    def get_fill_cursor(self):
+        """Return (bill_id, ts) of the newest ingested fill, or None before the first cursored run"""
+        self.ensure_cursor_table()
+        self.cursor.execute(
+            'SELECT bill_id, ts FROM ingestion_cursors WHERE name = %s', (FILLS_CURSOR_NAME,)
+        )
+        row = self.cursor.fetchone()
+        return (int(row[0]), int(row[1])) if row else None
+
+    def save_fill_cursor(self, bill_id, ts):
+        """Advance the cursor; never moves it backwards if runs overlap"""
+        self.ensure_cursor_table()
+        self.cursor.execute('''
+            INSERT INTO ingestion_cursors (name, bill_id, ts, updated_at)
+            VALUES (%s, %s, %s, NOW())
+            ON CONFLICT (name) DO UPDATE SET
+                bill_id = GREATEST(ingestion_cursors.bill_id, EXCLUDED.bill_id),
+                ts = GREATEST(ingestion_cursors.ts, EXCLUDED.ts),
+                updated_at = NOW()
+        ''', (FILLS_CURSOR_NAME, bill_id, ts))
+        self.conn.commit()
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type((Exception,))
+    )
+    def get_fills_page(self, after=None, begin_ts=None, history=False, limit=FILLS_PAGE_LIMIT):
+        """Get one page of SPOT fills (all sides, newest first) older than billId ``after``"""
+        params = {'instType': 'SPOT', 'limit': str(limit)}
+        if after:
+            params['after'] = str(after)
+        if begin_ts:
+            params['begin'] = str(begin_ts)
+
+        fetch = self.trade_api.get_fills_history if history else self.trade_api.get_fills
+        result = fetch(**params)
+        if not result:
+            raise RuntimeError("Empty response from OKX filled-trades API")
+        if result.get('code') != '0':
+            error_msg = result.get('msg', 'Unknown error')
+            logger.error(f"❌ API Error getting filled orders page: {error_msg}")
+            raise RuntimeError(f"OKX filled-trades API error: {error_msg}")
+        return result.get('data', [])
+
+    def iter_new_fill_pages(self, cursor_bill_id=None, begin_ts=None):
+        """Walk fills newest -> oldest by billId and yield each page of fills newer than the cursor.
+
+        Without a billId cursor (first run) fills at or after ``begin_ts`` are
+        yielded instead.  Stops at the first fill already covered, so each run
+        costs O(new fills) requests.
+        """
+        now_ms = int(time.time() * 1000)
+        history = bool(begin_ts) and begin_ts < now_ms - FILLS_RECENT_WINDOW_MS + FILLS_HISTORY_MARGIN_MS
+        if history:
+            logger.info("🗄️  Cursor is older than the get_fills window; paging get_fills_history")
+
+        after = None
+        while True:
+            page = self.get_fills_page(after=after, begin_ts=begin_ts, history=history)
+            if cursor_bill_id is not None:
+                new_fills = [fill for fill in page if int(fill.get('billId') or 0) > cursor_bill_id]
+            else:
+                new_fills = [fill for fill in page if not begin_ts or int(fill.get('ts') or 0) >= begin_ts]
+            if new_fills:
+                yield new_fills
+            # A short page is the end of the range; a filtered page reached the cursor
+            if len(page) < FILLS_PAGE_LIMIT or len(new_fills) < len(page):
+                return
+            after = page[-1].get('billId')
+            if not after:
+                return
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
@@ -300,17 +396,18 @@ class OKXFilledOrdersFetcher:
             fill_sz = trade.get('fillSz', '')
             side = trade.get('side', '')
             
-            # Use ts field from trade data
-            ts = trade.get('ts', '')
-            
-            # 每笔成交独立计时：买入成交后 24 小时触发卖出。
-            # 使用 OKX 的毫秒时间戳，避免时区和自然日边界影响。
+            # ts and sell_time are BIGINT columns (see migrate_filled_orders.py)
+            ts = None
             sell_time = None
-            if ts:
+            raw_ts = trade.get('ts', '')
+            if raw_ts:
                 try:
-                    sell_time = str(int(ts) + 24 * 60 * 60 * 1000)
+                    ts = int(raw_ts)
+                    # 每笔成交独立计时：买入成交后 24 小时触发卖出。
+                    # 使用 OKX 的毫秒时间戳，避免时区和自然日边界影响。
+                    sell_time = ts + SELL_DELAY_MS
                 except (ValueError, TypeError) as e:
-                    logger.warning(f"⚠️  Could not calculate sell time for order {ord_id}: {e}")
+                    logger.warning(f"⚠️  Could not parse timestamp for order {ord_id}: {e}")
             
             # Validate required fields
             if not all([inst_id, trade_id, fill_px, fill_sz, side]):
@@ -337,40 +434,52 @@ class OKXFilledOrdersFetcher:
         try:
             self.ensure_database_initialized()
             # Prepare all trade data
-            trade_data_list = []
             valid_trades = []
             
+            # One row per tradeId: a single multi-row upsert cannot touch a row twice
+            rows_by_trade_id = {}
             for trade in trades:
                 trade_data = self.prepare_trade_data(trade)
                 if trade_data:
-                    trade_data_list.append(trade_data)
+                    rows_by_trade_id[trade_data[2]] = trade_data
                     valid_trades.append(trade)
+            trade_data_list = list(rows_by_trade_id.values())
             
             if not trade_data_list:
                 logger.warning("⚠️  No valid trades to save")
                 return 0, len(trades)
             
-            # Batch insert using executemany
-            self.cursor.executemany('''
+            # Single multi-row INSERT per page
+            execute_values(self.cursor, '''
                 INSERT INTO filled_orders 
                 (instId, ordId, tradeId, billId, fillPx, fillSz, side, ts, subType, execType, fee, feeCcy, feeRate, fillTime, posSide, clOrdId, tag, sell_time)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                VALUES %s
                 ON CONFLICT (tradeId) DO UPDATE SET
                     fillPx = EXCLUDED.fillPx,
                     fillSz = EXCLUDED.fillSz,
                     fee = EXCLUDED.fee,
                     feeCcy = EXCLUDED.feeCcy,
-                    feeRate = EXCLUDED.feeRate,
+                    -- WebSocket pushes (fill_stream.py) carry no billId/subType/feeRate
+                    billId = COALESCE(NULLIF(EXCLUDED.billId, ''), filled_orders.billId),
+                    subType = COALESCE(NULLIF(EXCLUDED.subType, ''), filled_orders.subType),
+                    feeRate = COALESCE(NULLIF(EXCLUDED.feeRate, ''), filled_orders.feeRate),
                     fillTime = EXCLUDED.fillTime,
                     execType = EXCLUDED.execType
                     -- sell_time and sold_status are preserved (not updated)
-            ''', trade_data_list)
+            ''', trade_data_list, page_size=len(trade_data_list))
+
+            # Wake LISTENing sell/protection workers when the commit lands
+            buy_instruments = sorted({row[0] for row in trade_data_list if row[6] == 'buy'})
+            if buy_instruments:
+                notify(self.cursor, FILLS_CHANNEL, {'instIds': buy_instruments})
             
             # Single commit for all trades
             self.conn.commit()
+            # New fills change balances; nothing may reconcile them against an older snapshot
+            invalidate_balance_snapshot()
             
             # Log successful trades
-            successful_count = len(trade_data_list)
+            successful_count = len(valid_trades)
             for trade in valid_trades:
                 inst_id = trade.get('instId', '')
                 trade_id = trade.get('tradeId', '')
@@ -397,38 +506,60 @@ class OKXFilledOrdersFetcher:
 
 
     def fetch_and_save_filled_trades(self, minutes=None, run_protection_check_on_empty=False):
-        """Fetch filled trades using incremental approach based on last trade timestamp"""
+        """Ingest every fill newer than the billId cursor, saving buy fills page by page"""
         try:
             self.ensure_database_initialized()
-            # Get the timestamp of the last trade from database
-            last_trade_ts = self.get_last_trade_timestamp()
-            
-            if last_trade_ts:
-                # Start from the next microsecond after the last trade
-                begin_ts = last_trade_ts + 1
-                logger.info(f"🧭 Incremental fetch: from {begin_ts} (last trade + 1μs)")
+            cursor_bill_id = None
+            fill_cursor = self.get_fill_cursor()
+
+            if fill_cursor:
+                cursor_bill_id, begin_ts = fill_cursor
+                logger.info(f"🧭 Incremental fetch: fills after billId {cursor_bill_id} (ts {begin_ts})")
             else:
-                # First run: get trades from the last specified minutes
-                end_time = datetime.utcnow()
-                begin_time = end_time - timedelta(minutes=minutes or 15)
-                begin_ts = int(begin_time.timestamp() * 1000)
-                logger.info(f"🧭 Initial fetch: last {minutes or 15} minutes from {begin_ts}")
-            
-            # Get filled trades
-            trades = self.get_filled_trades(begin_ts=begin_ts)
-            
-            if not trades:
+                # Bootstrap the cursor from the newest stored fill
+                last_trade_ts = self.get_last_trade_timestamp()
+                if last_trade_ts:
+                    begin_ts = last_trade_ts + 1
+                    logger.info(f"🧭 Bootstrap fetch: from {begin_ts} (last trade + 1ms)")
+                else:
+                    # First run: get trades from the last specified minutes
+                    end_time = datetime.utcnow()
+                    begin_time = end_time - timedelta(minutes=minutes or 15)
+                    begin_ts = int(begin_time.timestamp() * 1000)
+                    logger.info(f"🧭 Initial fetch: last {minutes or 15} minutes from {begin_ts}")
+
+            newest_fill = None
+            total_buys = successful_saves = failed_saves = pages = 0
+            for page in self.iter_new_fill_pages(cursor_bill_id=cursor_bill_id, begin_ts=begin_ts):
+                pages += 1
+                page_newest = max(page, key=lambda fill: int(fill.get('billId') or 0))
+                if newest_fill is None or int(page_newest['billId']) > int(newest_fill['billId']):
+                    newest_fill = page_newest
+
+                # Only buy fills are tracked (SDK doesn't support a side filter)
+                buy_trades = [trade for trade in page if trade.get('side') == 'buy']
+                if buy_trades:
+                    total_buys += len(buy_trades)
+                    saved, failed = self.save_trades_batch(buy_trades)
+                    successful_saves += saved
+                    failed_saves += failed
+
+            if newest_fill and newest_fill.get('billId'):
+                if failed_saves:
+                    # Leave the cursor so the next run re-reads the range (upserts are idempotent)
+                    logger.warning("⚠️  Not advancing fill cursor: some trades failed to save")
+                else:
+                    self.save_fill_cursor(int(newest_fill['billId']), int(newest_fill.get('ts') or begin_ts))
+
+            if not total_buys:
                 logger.info("🎯 No new filled trades found")
                 if run_protection_check_on_empty:
                     logger.info("🛡️ Running trigger protection check despite empty fetch")
                     self.check_and_cancel_triggers_if_needed()
                 return
-            
-            # Save trades to database using batch insert (optimized)
-            successful_saves, failed_saves = self.save_trades_batch(trades)
-            
+
             # Summary
-            logger.info(f"📊 Summary: {successful_saves}/{len(trades)} trades saved")
+            logger.info(f"📊 Summary: {successful_saves}/{total_buys} trades saved from {pages} page(s)")
             if failed_saves > 0:
                 logger.warning(f"⚠️  Failed: {failed_saves}")
             
@@ -447,12 +578,18 @@ class OKXFilledOrdersFetcher:
 
 
     def auto_mark_manual_sells(self):
-        """Mark a manually closed instrument only after an authoritative dust check.
+        """Mark manually closed instruments only after an authoritative dust check.
+
+        One balance snapshot covers every unsold instrument and all settled
+        instruments are marked with a single UPDATE, so the cost does not grow
+        with the number of open positions.  Returns the number of lots marked.
 
         Available balance alone is not evidence of a sale: it can be zero while
         a balance is frozen by an open order.  A position is considered closed
         only when its *total* USD value is below the same configured minimum
-        used by auto-sell and it has no frozen balance.
+        used by auto-sell and it has no frozen balance.  The snapshot is always
+        fetched fresh, and lots that filled shortly before (or after) it was
+        requested are left for the next run, since the balance may not show them.
         """
         try:
             self.ensure_database_initialized()
@@ -467,7 +604,7 @@ class OKXFilledOrdersFetcher:
             unsold_instruments = [row[0] for row in self.cursor.fetchall()]
             
             if not unsold_instruments:
-                return
+                return 0
             
             logger.info(f"🔍 Checking balances for {len(unsold_instruments)} instruments with unsold orders")
             try:
@@ -478,79 +615,67 @@ class OKXFilledOrdersFetcher:
                 logger.warning(f"⚠️ Invalid OKX_MIN_USD_VALUE; using $0.01 for manual-sell reconciliation: {e}")
                 dust_threshold_usd = 0.01
             
-            marked_count = 0
-            
-            # 检查每个币种的余额
-            for inst_id in unsold_instruments:
-                try:
-                    base_ccy = inst_id.split('-')[0].upper()
-                    
-                    # 获取账户余额
-                    account_api = self.okx_client.get_account_api()
-                    if not account_api:
-                        continue
-                    
-                    result = account_api.get_account_balance(ccy=base_ccy)
-                    
-                    if not result or result.get('code') != '0':
-                        continue
-                    
-                    data = result.get('data', [])
-                    if not data:
-                        continue
-                    
-                    details = data[0].get('details', [])
-                    total_usd = 0.0
-                    frozen_balance = 0.0
-                    currency_found = False
-                    
-                    for detail in details:
-                        if detail.get('ccy', '').upper() == base_ccy:
-                            currency_found = True
-                            total_usd = float(detail.get('eqUsd') or 0)
-                            frozen_balance = max(
-                                float(detail.get('frozenBal') or 0),
-                                float(detail.get('ordFrozen') or 0),
-                            )
-                            break
-                    
-                    # A missing currency row is an authoritative zero balance.
-                    # Never mark a frozen position as sold.
-                    if (not currency_found or total_usd < dust_threshold_usd) and frozen_balance <= 0:
-                        logger.info(
-                            f"💰 {inst_id}: total value=${total_usd:.6f}, frozen={frozen_balance}; "
-                            "marking settled lots as SOLD"
-                        )
-                        
-                        # 标记该币种的所有订单为已卖出
-                        self.cursor.execute('''
-                            UPDATE filled_orders 
-                            SET sold_status = 'SOLD'
-                            WHERE side = 'buy' 
-                            AND instId = %s
-                            AND sold_status IS NULL
-                        ''', (inst_id,))
-                        
-                        self.conn.commit()
-                        affected = self.cursor.rowcount
-                        
-                        if affected > 0:
-                            marked_count += affected
-                            logger.info(f"✅ Marked {affected} {inst_id} orders as SOLD (manual sell detected)")
-                    
-                    # Rate limiting
-                    time.sleep(0.1)
-                    
-                except Exception as e:
-                    logger.warning(f"⚠️ Error checking balance for {inst_id}: {e}")
-                    continue
+            # 一次获取全部账户余额，所有币种共享
+            account_api = self.okx_client.get_account_api()
+            if not account_api:
+                return 0
+            try:
+                snapshot = get_balance_snapshot(account_api, max_age=0)
+            except Exception as e:
+                logger.warning(f"⚠️ Cannot reconcile manual sells without account balances: {e}")
+                return 0
+            if not snapshot.has_data:
+                return 0
+            
+            # A missing currency row is an authoritative zero balance.
+            # Never mark a frozen position as sold.
+            settled_instruments = [
+                inst_id for inst_id in unsold_instruments
+                if snapshot.eq_usd(inst_id.split('-')[0]) < dust_threshold_usd
+                and snapshot.frozen(inst_id.split('-')[0]) <= 0
+            ]
+            if not settled_instruments:
+                return 0
+            
+            for inst_id in settled_instruments:
+                base_ccy = inst_id.split('-')[0]
+                logger.info(
+                    f"💰 {inst_id}: total value=${snapshot.eq_usd(base_ccy):.6f}, frozen=0; "
+                    "marking settled lots as SOLD"
+                )
             
+            # 一条 UPDATE 标记全部已清仓币种的订单为已卖出
+            try:
+                self.cursor.execute('''
+                    UPDATE filled_orders 
+                    SET sold_status = 'SOLD'
+                    WHERE side = 'buy' 
+                    AND instId = ANY(%s)
+                    AND sold_status IS NULL
+                    AND ts < %s
+                    RETURNING instId
+                ''', (settled_instruments, snapshot.requested_at_ms - MANUAL_SELL_FILL_MARGIN_MS))
+                marked_rows = self.cursor.fetchall()
+                if marked_rows:
+                    notify(self.cursor, SOLD_CHANNEL, {'instIds': sorted({row[0] for row in marked_rows})})
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            
+            marked_by_inst = Counter(row[0] for row in marked_rows)
+            for inst_id, affected in sorted(marked_by_inst.items()):
+                logger.info(f"✅ Marked {affected} {inst_id} orders as SOLD (manual sell detected)")
+            
+            marked_count = len(marked_rows)
             if marked_count > 0:
                 logger.info(f"📊 Auto-marked {marked_count} manually sold orders")
+            return marked_count
             
         except Exception as e:
             logger.error(f"❌ Error in auto_mark_manual_sells: {e}")
             logger.debug(f"Traceback: {traceback.format_exc()}")
+            return 0
 
     def count_active_trading_currencies(self):
         """Count active trading instruments (not sold yet), deduplicated by instId."""
@@ -605,8 +730,6 @@ class OKXFilledOrdersFetcher:
                     after = orders[-1].get('algoId')
                     if not after:
                         break
-                    
-                    time.sleep(0.1)
                 else:
                     error_msg = result.get('msg', 'Unknown error')
                     raise RuntimeError(f"Failed to get pending orders: {error_msg}")
@@ -700,9 +823,6 @@ class OKXFilledOrdersFetcher:
                             for order in batch
                         )
 
-                    if batch_num < total_batches:
-                        time.sleep(0.2)
-
                 logger.info(f"🔍 Verifying cancellation results (attempt {attempt})...")
                 time.sleep(2)
 
@@ -740,11 +860,16 @@ class OKXFilledOrdersFetcher:
             active_count = self.count_active_trading_currencies()
             logger.info(f"📊 Currently {active_count} active trading orders")
             
-            if active_count >= 3:
-                logger.warning(f"⚠️  {active_count} active trading orders (>= 3), cancelling all trigger orders...")
+            if is_at_trading_capacity(active_count):
+                logger.warning(
+                    f"⚠️  {active_count} active trading orders (>= {MAX_ACTIVE_TRADING_CURRENCIES}), "
+                    f"cancelling all trigger orders..."
+                )
                 self.cancel_all_trigger_orders()
             else:
-                logger.info(f"✅ {active_count} active trading orders (< 3), no action needed")
+                logger.info(
+                    f"✅ {active_count} active trading orders (< {MAX_ACTIVE_TRADING_CURRENCIES}), no action needed"
+                )
         except Exception as e:
             logger.error(f"❌ Error checking trading orders: {e}")
             logger.debug(f"Traceback: {traceback.format_exc()}")
@@ -752,11 +877,39 @@ class OKXFilledOrdersFetcher:
 
 
     def close(self):
-        """Close database connection"""
+        """Return the database connection to the shared pool"""
         if getattr(self, 'conn', None):
-            self.conn.close()
+            from lib.database import release_connection
+            release_connection(self.conn)
+            self.conn = None
+            self.cursor = None
+            self.database_initialized = False
             logger.info("🗄️  Database connection closed")
 
+def run_fetch_cycle(fetcher, minutes=5, precheck_hours=0.25, force_db=False):
+    """Run one fetch: OKX pre-check, then the DB-backed flow only when needed.
+
+    Shared by main() and trading_daemon.py, which reuses one fetcher across ticks.
+    """
+    should_run_db_flow = force_db
+    if force_db:
+        logger.info("🛡️ Force DB fetch enabled, bypassing OKX pre-check")
+    else:
+        precheck_result = fetcher.has_recent_buy_fills(hours=precheck_hours)
+        if precheck_result is False:
+            logger.info("💤 No recent OKX buy fills detected; running account-only trigger protection")
+            if not fetcher.check_and_cancel_triggers_by_account_balance():
+                raise RuntimeError("Account-only trigger protection did not complete")
+        else:
+            should_run_db_flow = True
+
+    if should_run_db_flow:
+        # Fetch and save filled trades
+        fetcher.fetch_and_save_filled_trades(
+            minutes=minutes,
+            run_protection_check_on_empty=True,
+        )
+
 def main():
     """Main function"""
     start_time = datetime.now()
@@ -780,25 +933,7 @@ def main():
     try:
         # Initialize fetcher
         fetcher = OKXFilledOrdersFetcher()
-
-        should_run_db_flow = args.force_db
-        if args.force_db:
-            logger.info("🛡️ Force DB fetch enabled, bypassing OKX pre-check")
-        else:
-            precheck_result = fetcher.has_recent_buy_fills(hours=args.precheck_hours)
-            if precheck_result is False:
-                logger.info("💤 No recent OKX buy fills detected; running account-only trigger protection")
-                if not fetcher.check_and_cancel_triggers_by_account_balance():
-                    raise RuntimeError("Account-only trigger protection did not complete")
-            else:
-                should_run_db_flow = True
-
-        if should_run_db_flow:
-            # Fetch and save filled trades
-            fetcher.fetch_and_save_filled_trades(
-                minutes=args.minutes,
-                run_protection_check_on_empty=True,
-            )
+        run_fetch_cycle(fetcher, minutes=args.minutes, precheck_hours=args.precheck_hours, force_db=args.force_db)
         
         logger.info("✅ Process completed")
         
@@ -817,6 +952,8 @@ def main():
         if fetcher:
             fetcher.close()
         
+        get_rate_limiter().log_stats(logger)
+        log_pool_stats(logger)
         end_time = datetime.now()
         duration = end_time - start_time
         logger.info(f"⏱️  Duration: {duration}")
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+OKX Fill Stream
+Subscribes to the private ``orders`` WebSocket channel and upserts every buy
+fill into filled_orders as soon as OKX pushes it, then runs the 3-position
+trigger protection.  After each (re)connect the REST incremental fetch
+backfills anything missed while disconnected, so the 5-minute polling job
+becomes a safety net rather than the primary fill source.
+"""
+
+import os
+import sys
+import json
+import time
+import hmac
+import base64
+import hashlib
+import signal
+import threading
+import traceback
+from decimal import Decimal, InvalidOperation
+
+# Load environment variables first
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+from fetch_filled_orders import OKXFilledOrdersFetcher, logger
+from utils_websocket import WebSocketConnection, WebSocketError
+
+OKX_PRIVATE_WS_URL = 'wss://ws.okx.com:8443/ws/v5/private'
+OKX_DEMO_PRIVATE_WS_URL = 'wss://wspap.okx.com:8443/ws/v5/private'
+
+# OKX drops idle connections after 30s; send a text 'ping' well before that
+PING_INTERVAL_SECONDS = 25
+RECONNECT_MIN_DELAY_SECONDS = 1
+RECONNECT_MAX_DELAY_SECONDS = 30
+
+
+def order_push_to_fill(order):
+    """Map an ``orders`` channel push to the get_fills row shape, or None if it is not a buy fill.
+
+    Each push carries the latest fill of the order (tradeId, fillPx, fillSz,
+    fillTime, fillFee); pushes for state changes without a new fill have an
+    empty tradeId or zero fillSz.
+    """
+    if order.get('side') != 'buy' or not order.get('tradeId'):
+        return None
+    try:
+        if Decimal(str(order.get('fillSz') or '0')) <= 0:
+            return None
+    except InvalidOperation:
+        return None
+    return {
+        'instId': order.get('instId', ''),
+        'ordId': order.get('ordId', ''),
+        'tradeId': order.get('tradeId', ''),
+        'billId': '',  # not pushed on this channel; filled in by the next REST upsert
+        'fillPx': order.get('fillPx', ''),
+        'fillSz': order.get('fillSz', ''),
+        'side': order.get('side', ''),
+        'ts': order.get('fillTime', ''),
+        'subType': '',
+        'execType': order.get('execType', ''),
+        'fee': order.get('fillFee', ''),
+        'feeCcy': order.get('fillFeeCcy', ''),
+        'feeRate': '',
+        'fillTime': order.get('fillTime', ''),
+        'posSide': order.get('posSide', ''),
+        'clOrdId': order.get('clOrdId', ''),
+        'tag': order.get('tag', ''),
+    }
+
+
+class OKXFillStream:
+    """Private WebSocket subscriber that persists fills in real time"""
+
+    def __init__(self, fetcher=None, url=None, ping_interval=PING_INTERVAL_SECONDS,
+                 protection_lock=None, run_protection=True):
+        self.api_key = os.getenv('OKX_API_KEY')
+        self.secret_key = os.getenv('OKX_SECRET_KEY')
+        self.passphrase = os.getenv('OKX_PASSPHRASE')
+        self.testnet = os.getenv('OKX_TESTNET', 'false').lower() == 'true'
+
+        if not all([self.api_key, self.secret_key, self.passphrase]):
+            raise ValueError("Missing required environment variables: OKX_API_KEY, OKX_SECRET_KEY, OKX_PASSPHRASE")
+
+        self.url = url or os.getenv('OKX_WS_PRIVATE_URL') or (
+            OKX_DEMO_PRIVATE_WS_URL if self.testnet else OKX_PRIVATE_WS_URL
+        )
+        self.fetcher = fetcher or OKXFilledOrdersFetcher()
+        self.ping_interval = ping_interval
+        # Shared with trading_daemon.py jobs that cancel the same trigger orders
+        self.protection_lock = protection_lock or threading.Lock()
+        # False when another consumer (the daemon's NOTIFY listener) protects after every fill
+        self.run_protection = run_protection
+        self.ws = None
+        self.stop_event = threading.Event()
+        self.stats = {'connects': 0, 'fills': 0, 'backfills': 0, 'errors': 0}
+
+    def _login_args(self):
+        timestamp = str(int(time.time()))
+        message = f"{timestamp}GET/users/self/verify"
+        sign = base64.b64encode(
+            hmac.new(self.secret_key.encode('utf-8'), message.encode('utf-8'), hashlib.sha256).digest()
+        ).decode('utf-8')
+        return {'apiKey': self.api_key, 'passphrase': self.passphrase, 'timestamp': timestamp, 'sign': sign}
+
+    def _send_json(self, payload):
+        self.ws.send_text(json.dumps(payload))
+
+    def _wait_for_event(self, event, timeout=10):
+        """Read until the ``event`` acknowledgement arrives; fail on an error event"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            message = self.ws.recv(timeout=max(0.1, deadline - time.monotonic()))
+            if message is None or message == 'pong':
+                continue
+            payload = json.loads(message)
+            if payload.get('event') == 'error':
+                raise WebSocketError(f"OKX {event} failed: {payload.get('code')} {payload.get('msg')}")
+            if payload.get('event') == event:
+                return payload
+            # Data can race ahead of the subscribe ack
+            self.handle_message(message)
+        raise WebSocketError(f"Timed out waiting for OKX {event} response")
+
+    def connect(self):
+        """Open the socket, log in and subscribe to SPOT order updates"""
+        self.ws = WebSocketConnection(self.url).connect()
+        self._send_json({'op': 'login', 'args': [self._login_args()]})
+        login = self._wait_for_event('login')
+        if login.get('code', '0') != '0':
+            raise WebSocketError(f"OKX login failed: {login.get('msg')}")
+        self._send_json({'op': 'subscribe', 'args': [{'channel': 'orders', 'instType': 'SPOT'}]})
+        self._wait_for_event('subscribe')
+        self.stats['connects'] += 1
+        logger.info(f"🔌 Subscribed to OKX orders channel ({self.url})")
+
+    def backfill(self):
+        """Catch up over REST from the last stored fill (idempotent upserts)"""
+        self.stats['backfills'] += 1
+        logger.info("🧭 Backfilling fills missed while disconnected")
+        try:
+            # The incremental fetch ends with a protection pass
+            with self.protection_lock:
+                self.fetcher.fetch_and_save_filled_trades()
+        except Exception as e:
+            # Keep streaming; the scheduled fetch_filled_orders run retries the gap
+            logger.error(f"❌ REST backfill failed: {e}")
+
+    def handle_fills(self, fills):
+        successful, _failed = self.fetcher.save_trades_batch(fills)
+        if successful:
+            self.stats['fills'] += successful
+            if self.run_protection:
+                with self.protection_lock:
+                    self.fetcher.check_and_cancel_triggers_if_needed()
+        return successful
+
+    def handle_message(self, message):
+        """Process one text message; returns the number of fills saved"""
+        if message == 'pong':
+            return 0
+        payload = json.loads(message)
+        if payload.get('event') == 'error':
+            logger.error(f"❌ OKX WebSocket error: {payload.get('code')} {payload.get('msg')}")
+            return 0
+        if payload.get('arg', {}).get('channel') != 'orders':
+            return 0
+        fills = [fill for fill in map(order_push_to_fill, payload.get('data') or []) if fill]
+        if not fills:
+            return 0
+        logger.info(f"⚡ {len(fills)} buy fill(s) pushed: {', '.join(f['instId'] for f in fills)}")
+        return self.handle_fills(fills)
+
+    def run_connection(self):
+        """Serve one connection until it drops or the stream is stopped"""
+        self.connect()
+        # Subscribe first, then backfill, so no fill falls between the two
+        self.backfill()
+        last_sent = last_received = time.monotonic()
+        while not self.stop_event.is_set():
+            message = self.ws.recv(timeout=1.0)
+            now = time.monotonic()
+            if message is not None:
+                last_received = now
+                self.handle_message(message)
+            if now - last_received > 2 * self.ping_interval:
+                raise WebSocketError("No data or pong from OKX; reconnecting")
+            if now - last_sent >= self.ping_interval:
+                self.ws.send_text('ping')
+                last_sent = now
+
+    def run(self):
+        """Run until stopped, reconnecting with exponential backoff"""
+        delay = RECONNECT_MIN_DELAY_SECONDS
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.run_connection()
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.warning(f"⚠️ Fill stream disconnected: {e}")
+                logger.debug(f"Traceback: {traceback.format_exc()}")
+            finally:
+                if self.ws:
+                    self.ws.close()
+                    self.ws = None
+                # Drop the DB connection too; a fresh one is borrowed on reconnect
+                self.fetcher.close()
+            if self.stop_event.is_set():
+                break
+            # Reset backoff after a connection that stayed up for a while
+            if time.monotonic() - started > RECONNECT_MAX_DELAY_SECONDS:
+                delay = RECONNECT_MIN_DELAY_SECONDS
+            logger.info(f"🔄 Reconnecting fill stream in {delay}s")
+            self.stop_event.wait(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY_SECONDS)
+        logger.info(f"⏹️  Fill stream stopped: {self.stats}")
+
+    def stop(self, *_args):
+        self.stop_event.set()
+
+
+def main():
+    """Main function"""
+    try:
+        stream = OKXFillStream()
+    except ValueError as e:
+        logger.error(f"❌ Configuration error: {e}")
+        sys.exit(1)
+    signal.signal(signal.SIGTERM, stream.stop)
+    try:
+        stream.run()
+    except KeyboardInterrupt:
+        logger.info("⏹️  Fill stream interrupted by user")
+        stream.stop()
+
+if __name__ == "__main__":
+    main()
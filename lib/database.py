@@ -1,14 +1,39 @@
 #!/usr/bin/env python3
 """
 Database Configuration - PostgreSQL only
+All scripts share one process-wide connection pool so repeated lookups do not
+pay a new TLS handshake against the remote database each time.
 """
 
 import os
-import psycopg2
+import json
+import time
+import select
+import logging
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
-def get_database_connection():
-    """Get PostgreSQL database connection"""
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+DEFAULT_POOL_MIN = 1
+DEFAULT_POOL_MAX = 5
+# Long-lived holders (daemon workers, listeners) must not block short jobs forever
+DEFAULT_POOL_ACQUIRE_TIMEOUT_SECONDS = 30.0
+# Connections idle longer than this are pinged before reuse; the server or a
+# proxy may have dropped them without the client noticing (conn.closed stays 0)
+POOL_PING_AFTER_IDLE_SECONDS = 30.0
+
+# LISTEN/NOTIFY channels between fill ingestion and the sell/protection workers
+FILLS_CHANNEL = 'filled_orders_new_fills'
+SOLD_CHANNEL = 'filled_orders_sold'
+NOTIFY_CHANNELS = (FILLS_CHANNEL, SOLD_CHANNEL)
+
+
+def get_database_url():
+    """Return DATABASE_URL after loading .env files and validating the scheme"""
     # Ensure environment variables are loaded
     try:
         from dotenv import load_dotenv
@@ -24,15 +49,283 @@ def get_database_connection():
     if not db_url:
         raise ValueError("DATABASE_URL environment variable is required")
     
-    if not db_url.startswith('postgresql://'):
+    if not db_url.startswith(('postgresql://', 'postgres://')):
         raise ValueError("DATABASE_URL must be a PostgreSQL connection string")
     
+    return db_url
+
+
+def get_database_connection():
+    """Get a dedicated (unpooled) PostgreSQL database connection"""
+    db_url = get_database_url()
     try:
         return psycopg2.connect(db_url)
     except Exception as e:
         print(f"❌ PostgreSQL connection failed: {e}")
         raise
 
+
+class _CountingConnectionPool(ThreadedConnectionPool):
+    """ThreadedConnectionPool that counts physical connections it opens"""
+
+    def __init__(self, *args, **kwargs):
+        self.connects = 0
+        super().__init__(*args, **kwargs)
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        self.connects += 1
+        return conn
+
+
+class DatabasePool:
+    """Process-wide PostgreSQL connection pool with usage statistics.
+
+    psycopg2 pools raise when exhausted, so a semaphore sized to ``maxconn``
+    makes callers wait for a free connection instead, and that wait is
+    recorded in the stats.  The wait is bounded by ``acquire_timeout``, after
+    which ``PoolError`` is raised.
+    """
+
+    def __init__(self, dsn, minconn=DEFAULT_POOL_MIN, maxconn=DEFAULT_POOL_MAX,
+                 acquire_timeout=DEFAULT_POOL_ACQUIRE_TIMEOUT_SECONDS):
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self._pool = _CountingConnectionPool(minconn, maxconn, dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._released_at = {}  # id(conn) -> monotonic time it went back to the pool
+        self._stats = {'acquisitions': 0, 'wait_seconds': 0.0, 'discarded': 0}
+
+    def _is_alive(self, conn):
+        """Cheap liveness check; only connections idle for a while pay a SELECT 1"""
+        if conn.closed:
+            return False
+        with self._lock:
+            released_at = self._released_at.pop(id(conn), None)
+        if released_at is None or time.monotonic() - released_at < POOL_PING_AFTER_IDLE_SECONDS:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self, timeout=None):
+        """Borrow a connection, waiting up to ``timeout`` (default ``acquire_timeout``) if all are in use"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolError(f"Timed out after {timeout:.0f}s waiting for a pooled database connection "
+                            f"(all {self.maxconn} in use)")
+        waited = time.monotonic() - started
+        try:
+            # Replace connections the server dropped while they sat idle; at
+            # worst every pooled one is dead and the last getconn opens a new one
+            for _attempt in range(self.maxconn + 1):
+                conn = self._pool.getconn()
+                if self._is_alive(conn):
+                    break
+                self._pool.putconn(conn, close=True)
+                with self._lock:
+                    self._stats['discarded'] += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['acquisitions'] += 1
+            self._stats['wait_seconds'] += waited
+        return conn
+
+    def release(self, conn, close=False):
+        """Return a connection, rolling back any transaction left open"""
+        try:
+            if not close and not conn.closed:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+        except psycopg2.Error:
+            close = True
+        try:
+            close = close or bool(conn.closed)
+            with self._lock:
+                if close:
+                    self._stats['discarded'] += 1
+                    self._released_at.pop(id(conn), None)
+                else:
+                    self._released_at[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection"""
+        conn = self.acquire()
+        close = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Broken connections must not go back into the pool
+            close = True
+            raise
+        finally:
+            self.release(conn, close=close)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['connects'] = self._pool.connects
+        stats['maxconn'] = self.maxconn
+        return stats
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+# Global pool instance
+_database_pool = None
+_database_pool_lock = threading.Lock()
+
+
+def get_database_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    global _database_pool
+    if _database_pool is None:
+        with _database_pool_lock:
+            if _database_pool is None:
+                maxconn = int(os.getenv('DATABASE_POOL_MAX', DEFAULT_POOL_MAX))
+                acquire_timeout = float(os.getenv('DATABASE_POOL_TIMEOUT', DEFAULT_POOL_ACQUIRE_TIMEOUT_SECONDS))
+                _database_pool = DatabasePool(get_database_url(), DEFAULT_POOL_MIN, max(1, maxconn), acquire_timeout)
+    return _database_pool
+
+
+@contextmanager
+def pooled_connection():
+    """Borrow a pooled connection for the duration of a ``with`` block"""
+    with get_database_pool().connection() as conn:
+        yield conn
+
+
+def acquire_connection():
+    """Borrow a pooled connection for a long-lived owner; pair with release_connection"""
+    return get_database_pool().acquire()
+
+
+def release_connection(conn, close=False):
+    """Return a connection obtained from acquire_connection"""
+    if conn is not None and _database_pool is not None:
+        _database_pool.release(conn, close=close)
+
+
+def get_pool_stats():
+    """Return pool statistics, or None if no connection has been requested yet"""
+    if _database_pool is None:
+        return None
+    return _database_pool.stats()
+
+
+def log_pool_stats(logger=None):
+    """Log pool acquisitions, wait time and physical connects"""
+    stats = get_pool_stats()
+    if not stats:
+        return
+    (logger or logging.getLogger(__name__)).info(
+        f"🗄️  DB pool: {stats['acquisitions']} acquisitions, {stats['connects']} connects, "
+        f"{stats['wait_seconds']:.2f}s waiting (max {stats['maxconn']} connections)"
+    )
+
+
+def close_database_pool():
+    """Close every pooled connection (call once at process exit)"""
+    global _database_pool
+    with _database_pool_lock:
+        if _database_pool is not None:
+            _database_pool.closeall()
+            _database_pool = None
+
+def notify(cursor, channel, payload=None):
+    """Queue a NOTIFY on ``cursor``'s transaction; it is delivered only if that transaction commits"""
+    cursor.execute('SELECT pg_notify(%s, %s)', (channel, json.dumps(payload or {})))
+
+
+class NotificationListener:
+    """Dedicated LISTEN connection that hands NOTIFY payloads to a callback.
+
+    LISTEN needs a session-level connection, so this uses its own unpooled
+    connection (``DATABASE_LISTEN_URL`` if set, e.g. a direct endpoint when
+    DATABASE_URL goes through a transaction-mode pooler).  Waiting is a
+    select() on the socket: no queries are issued while idle.
+    """
+
+    def __init__(self, channels=NOTIFY_CHANNELS, dsn=None, logger=None):
+        self.channels = tuple(channels)
+        self.dsn = dsn or os.getenv('DATABASE_LISTEN_URL')
+        self.logger = logger or logging.getLogger(__name__)
+        self.conn = None
+        self.stop_event = threading.Event()
+
+    def connect(self):
+        self.conn = psycopg2.connect(self.dsn) if self.dsn else get_database_connection()
+        self.conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with self.conn.cursor() as cursor:
+            for channel in self.channels:
+                cursor.execute(f'LISTEN {channel}')
+        self.logger.info(f"👂 Listening for database notifications on {', '.join(self.channels)}")
+
+    def poll(self, timeout=1.0):
+        """Wait up to ``timeout`` seconds; return ``[(channel, payload_dict), ...]`` received"""
+        if self.conn is None:
+            self.connect()
+        readable, _, _ = select.select([self.conn], [], [], timeout)
+        if not readable:
+            return []
+        self.conn.poll()
+        notifications = []
+        while self.conn.notifies:
+            notification = self.conn.notifies.pop(0)
+            try:
+                payload = json.loads(notification.payload) if notification.payload else {}
+            except ValueError:
+                payload = {}
+            notifications.append((notification.channel, payload))
+        return notifications
+
+    def run(self, callback, on_connect=None, reconnect_delay=5):
+        """Deliver notifications to ``callback(notifications)`` until stop().
+
+        ``on_connect`` runs after every (re)connect, so consumers can catch up
+        on anything committed while no one was listening.
+        """
+        while not self.stop_event.is_set():
+            try:
+                if self.conn is None:
+                    self.connect()
+                    if on_connect:
+                        on_connect()
+                notifications = self.poll(timeout=1.0)
+                if notifications:
+                    callback(notifications)
+            except Exception as e:
+                self.logger.warning(f"⚠️ Notification listener error: {e}; reconnecting in {reconnect_delay}s")
+                self.close()
+                self.stop_event.wait(reconnect_delay)
+        self.close()
+
+    def stop(self, *_args):
+        self.stop_event.set()
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+
 class Database:
     def __init__(self):
         """Initialize database connection"""
@@ -42,7 +335,7 @@ class Database:
     def connect(self):
         """Connect to PostgreSQL database"""
         try:
-            self.conn = get_database_connection()
+            self.conn = acquire_connection()
             self.cursor = self.conn.cursor()
             print("✅ Connected to PostgreSQL database")
             return True
@@ -54,7 +347,9 @@ class Database:
     def disconnect(self):
         """Disconnect from database"""
         if self.conn:
-            self.conn.close()
+            release_connection(self.conn)
+            self.conn = None
+            self.cursor = None
             print("✅ Database connection closed")
     
     def create_tables(self):
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Limits Optimizer Script
+Grid-searches the daily-open limit coefficient for every instrument and saves
+the result with Database.save_limits_config (the same shape as limits.json).
+Pairs that do not qualify, or are not part of the run, keep their previous
+settings.
+
+Daily candles come from the local candle store (utils_candles.py), which
+only downloads bars it does not hold yet.
+
+Strategy simulated per day: a buy limit at open × limit%, filled if the day's
+low reaches it, sold at the open ``duration`` days later, minus buy/sell fees.
+All instruments and all limit coefficients are evaluated together as NumPy
+arrays, so hundreds of pairs finish in seconds.
+
+    python limits_optimizer.py                      # re-optimize configured pairs
+    python limits_optimizer.py --inst-ids BTC-USDT,ETH-USDT --output limits.json --dry-run
+"""
+
+import sys
+import json
+import time
+import logging
+import argparse
+import warnings
+from datetime import datetime, timezone
+
+# Load environment variables
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+import numpy as np
+
+STRATEGY_NAME = 'daily_open_limit_grid'
+STRATEGY_TYPE = 'daily_open_limit'
+
+# Defaults when limits_config holds no previous run
+DEFAULT_DURATION = 1
+DEFAULT_LIMIT_RANGE = (60, 99)
+DEFAULT_MIN_TRADES = 5
+DEFAULT_MIN_AVG_EARN = 0.01
+DEFAULT_BUY_FEE = 0.001
+DEFAULT_SELL_FEE = 0.001
+DEFAULT_HISTORY_DAYS = 365
+
+# Candle columns kept by the optimizer
+OPEN, HIGH, LOW, CLOSE = range(4)
+
+# Bound the (instruments × days × limits) working set
+INSTRUMENT_CHUNK_SIZE = 64
+
+
+def setup_logging():
+    """Setup logging configuration"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    return logging.getLogger(__name__)
+
+
+def load_daily_candles(store, inst_id, days=DEFAULT_HISTORY_DAYS, market_api=None):
+    """[days, OHLC] array from the local candle store, syncing only missing bars first"""
+    if market_api is not None:
+        store.sync(inst_id, market_api, max_days=days)
+    records = store.read_array(inst_id, limit=days)
+    return np.column_stack([records['open'], records['high'], records['low'], records['close']])
+
+
+def _pad_candles(candle_arrays):
+    """Stack per-instrument [days, OHLC] arrays into [instruments, max_days, OHLC], NaN-padded at the start"""
+    max_days = max((len(candles) for candles in candle_arrays), default=0)
+    stacked = np.full((len(candle_arrays), max_days, 4), np.nan)
+    for index, candles in enumerate(candle_arrays):
+        if len(candles):
+            # Right-align so the most recent day shares an index across instruments
+            stacked[index, max_days - len(candles):] = candles
+    return stacked
+
+
+def evaluate_limits(candles, limits, duration=DEFAULT_DURATION,
+                    buy_fee=DEFAULT_BUY_FEE, sell_fee=DEFAULT_SELL_FEE):
+    """Simulate every limit for every instrument at once.
+
+    ``candles`` is [instruments, days, OHLC] (NaN where an instrument has no
+    data), ``limits`` the coefficients in percent.  Returns a dict of
+    [instruments, limits] arrays: trade_count, win_rate, median_earn,
+    avg_return_per_trade, max_returns (compounded) and trades_per_month.
+    """
+    limits = np.asarray(limits, dtype=float)
+    opens = candles[:, :, OPEN]
+    lows = candles[:, :, LOW]
+
+    # Buy on day d, sell at the open of day d + duration
+    entry_open = opens[:, :-duration, None]
+    entry_low = lows[:, :-duration, None]
+    exit_open = opens[:, duration:, None]
+
+    buy_price = entry_open * limits[None, None, :] / 100.0
+    with np.errstate(invalid='ignore'):
+        filled = (entry_low <= buy_price) & np.isfinite(exit_open) & (buy_price > 0)
+        gross = (exit_open * (1.0 - sell_fee)) / (buy_price * (1.0 + buy_fee))
+    returns = np.where(filled, gross, np.nan)
+    earns = returns - 1.0
+
+    trade_count = filled.sum(axis=1)
+    safe_count = np.maximum(trade_count, 1)
+    with warnings.catch_warnings():
+        # Limits that never fill leave all-NaN slices
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        median_earn = np.nanmedian(earns, axis=1)
+    log_total = np.where(filled, np.log(np.where(filled, gross, 1.0)), 0.0).sum(axis=1)
+
+    days_with_data = np.isfinite(opens).sum(axis=1)[:, None]
+    months = np.maximum(days_with_data, 1) / 30.0
+    return {
+        'trade_count': trade_count,
+        'win_rate': np.where(filled, gross > 1.0, False).sum(axis=1) / safe_count,
+        'median_earn': np.where(trade_count > 0, median_earn, 0.0),
+        'avg_return_per_trade': np.where(filled, earns, 0.0).sum(axis=1) / safe_count,
+        'max_returns': np.exp(log_total),
+        'trades_per_month': trade_count / months,
+    }
+
+
+def select_best_limits(inst_ids, metrics, limits, min_trades=DEFAULT_MIN_TRADES,
+                       min_avg_earn=DEFAULT_MIN_AVG_EARN, duration=DEFAULT_DURATION):
+    """Pick the limit with the highest compounded return that meets the trade filters.
+
+    Returns ``{inst_id: crypto_config}`` in limits.json shape; instruments with
+    no eligible limit are left out.
+    """
+    eligible = (metrics['trade_count'] >= min_trades) & (metrics['avg_return_per_trade'] >= min_avg_earn)
+    score = np.where(eligible, metrics['max_returns'], -np.inf)
+    best = score.argmax(axis=1)
+
+    configs = {}
+    for row, inst_id in enumerate(inst_ids):
+        column = best[row]
+        if not eligible[row, column]:
+            continue
+        configs[inst_id] = {
+            'best_limit': int(limits[column]),
+            'best_duration': int(duration),
+            'max_returns': round(float(metrics['max_returns'][row, column]), 6),
+            'trade_count': int(metrics['trade_count'][row, column]),
+            'trades_per_month': round(float(metrics['trades_per_month'][row, column]), 4),
+            'win_rate': round(float(metrics['win_rate'][row, column]), 4),
+            'median_earn': round(float(metrics['median_earn'][row, column]), 6),
+            'avg_return_per_trade': round(float(metrics['avg_return_per_trade'][row, column]), 6),
+        }
+    return configs
+
+
+def optimize_limits(candles_by_inst, duration=DEFAULT_DURATION, limit_range=DEFAULT_LIMIT_RANGE,
+                    min_trades=DEFAULT_MIN_TRADES, min_avg_earn=DEFAULT_MIN_AVG_EARN,
+                    buy_fee=DEFAULT_BUY_FEE, sell_fee=DEFAULT_SELL_FEE,
+                    chunk_size=INSTRUMENT_CHUNK_SIZE):
+    """Run the grid search over ``{inst_id: [days, OHLC] array}`` and return a limits.json document"""
+    limits = np.arange(int(limit_range[0]), int(limit_range[1]) + 1)
+    inst_ids = [inst_id for inst_id, candles in sorted(candles_by_inst.items()) if len(candles) > duration]
+
+    crypto_configs = {}
+    for start in range(0, len(inst_ids), chunk_size):
+        chunk = inst_ids[start:start + chunk_size]
+        metrics = evaluate_limits(
+            _pad_candles([candles_by_inst[inst_id] for inst_id in chunk]),
+            limits, duration=duration, buy_fee=buy_fee, sell_fee=sell_fee,
+        )
+        crypto_configs.update(select_best_limits(
+            chunk, metrics, limits, min_trades=min_trades, min_avg_earn=min_avg_earn, duration=duration,
+        ))
+
+    return {
+        'generated_at': datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+        'strategy_name': STRATEGY_NAME,
+        'description': (
+            f"Buy at daily open x limit%, sell at the open {duration} day(s) later; "
+            f"limits {limits[0]}-{limits[-1]} over {len(inst_ids)} pairs"
+        ),
+        'strategy_type': STRATEGY_TYPE,
+        'duration': int(duration),
+        'strategy_params': {
+            'limit_range': [int(limits[0]), int(limits[-1])],
+            'min_trades': int(min_trades),
+            'min_avg_earn': float(min_avg_earn),
+            'buy_fee': float(buy_fee),
+            'sell_fee': float(sell_fee),
+        },
+        'crypto_configs': crypto_configs,
+    }
+
+
+def merge_crypto_configs(config, previous_configs):
+    """Lay ``config``'s pairs over the previous ``crypto_configs``.
+
+    save_limits_config replaces crypto_limits wholesale, so pairs that were
+    not in this run or did not qualify keep their previous settings.
+    """
+    merged = dict(previous_configs or {})
+    merged.update(config['crypto_configs'])
+    return dict(config, crypto_configs={inst_id: merged[inst_id] for inst_id in sorted(merged)})
+
+
+def main():
+    """Main function to optimize limits and update the database"""
+    parser = argparse.ArgumentParser(description='Grid-search best_limit per instrument from daily candles')
+    parser.add_argument('--inst-ids', type=str, default=None,
+                        help='Comma-separated instruments (default: pairs already in crypto_limits)')
+    parser.add_argument('--days', type=int, default=DEFAULT_HISTORY_DAYS, help='Daily candles of history per pair')
+    parser.add_argument('--duration', type=int, default=None, help='Holding period in days')
+    parser.add_argument('--limit-min', type=int, default=None, help='Lowest limit coefficient (percent of open)')
+    parser.add_argument('--limit-max', type=int, default=None, help='Highest limit coefficient (percent of open)')
+    parser.add_argument('--min-trades', type=int, default=None, help='Minimum simulated trades for a limit to qualify')
+    parser.add_argument('--min-avg-earn', type=float, default=None, help='Minimum average return per trade (0.01 = 1%%)')
+    parser.add_argument('--output', type=str, default=None, help='Also write the result to this limits.json path')
+    parser.add_argument('--dry-run', action='store_true', help='Do not write to the database')
+    args = parser.parse_args()
+
+    logger = setup_logging()
+    db = None
+    try:
+        logger.info("🚀 Starting limits optimization")
+
+        from lib.database import Database
+        db = Database()
+        if not db.connect():
+            raise RuntimeError("Failed to connect to database")
+
+        # Keep the previous run's grid unless overridden on the command line
+        previous = db.load_limits_config() or {}
+        params = previous.get('strategy_params') or {}
+        limit_range = params.get('limit_range') or DEFAULT_LIMIT_RANGE
+        duration = args.duration or previous.get('duration') or DEFAULT_DURATION
+        limit_range = (args.limit_min or limit_range[0], args.limit_max or limit_range[1])
+        min_trades = args.min_trades if args.min_trades is not None else params.get('min_trades') or DEFAULT_MIN_TRADES
+        min_avg_earn = (args.min_avg_earn if args.min_avg_earn is not None
+                        else params.get('min_avg_earn') or DEFAULT_MIN_AVG_EARN)
+        buy_fee = params.get('buy_fee') or DEFAULT_BUY_FEE
+        sell_fee = params.get('sell_fee') or DEFAULT_SELL_FEE
+
+        configured = db.get_configured_cryptos()
+        inst_ids = ([inst_id.strip() for inst_id in args.inst_ids.split(',') if inst_id.strip()]
+                    if args.inst_ids else configured)
+        if not inst_ids:
+            raise RuntimeError("No instruments to optimize; pass --inst-ids")
+
+        from okx_client import OKXClient
+        market_api = OKXClient(logger).get_market_api()
+        if not market_api:
+            raise RuntimeError("OKX market API not initialized")
+
+        from utils_candles import get_candle_store
+        store = get_candle_store()
+        fetch_started = time.monotonic()
+        candles_by_inst = {}
+        for inst_id in inst_ids:
+            try:
+                candles_by_inst[inst_id] = load_daily_candles(store, inst_id, args.days, market_api)
+            except Exception as e:
+                logger.warning(f"⚠️ Skipping {inst_id}: {e}")
+        logger.info(f"📈 Loaded candles for {len(candles_by_inst)} pairs in {time.monotonic() - fetch_started:.1f}s")
+
+        optimize_started = time.monotonic()
+        config = optimize_limits(
+            candles_by_inst, duration=int(duration), limit_range=limit_range,
+            min_trades=int(min_trades), min_avg_earn=float(min_avg_earn),
+            buy_fee=float(buy_fee), sell_fee=float(sell_fee),
+        )
+        crypto_configs = config['crypto_configs']
+        logger.info(
+            f"🧮 Optimized {len(candles_by_inst)} pairs x {limit_range[1] - limit_range[0] + 1} limits "
+            f"in {time.monotonic() - optimize_started:.2f}s; {len(crypto_configs)} pairs qualify"
+        )
+        for inst_id, crypto_config in list(crypto_configs.items())[:5]:
+            logger.info(f"   {inst_id}: limit={crypto_config['best_limit']}, returns={crypto_config['max_returns']}")
+
+        config = merge_crypto_configs(config, previous.get('crypto_configs'))
+        kept = len(config['crypto_configs']) - len(crypto_configs)
+        if kept:
+            logger.info(f"📌 Keeping the previous settings of {kept} configured pair(s) not updated by this run")
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=2)
+            logger.info(f"💾 Wrote {args.output}")
+
+        if args.dry_run:
+            logger.info("ℹ️ Dry run, database not updated")
+        elif not crypto_configs:
+            raise RuntimeError("No pair met the trade filters; keeping the current configuration")
+        elif not db.save_limits_config(config):
+            raise RuntimeError("Failed to save configuration to database")
+        else:
+            logger.info("✅ Limits configuration updated")
+    except Exception as e:
+        logger.error(f"❌ Error optimizing limits: {e}")
+        sys.exit(1)
+    finally:
+        if db:
+            db.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Filled Orders Schema Migration Script
+Converts filled_orders.ts and sell_time from TEXT to BIGINT, adds the
+columns and partial indexes used by auto_sell_orders.py and
+fetch_filled_orders.py.
+
+Also creates the table on a database that has never stored fills.
+
+Run once before deploying code that expects the typed schema:
+    python migrate_filled_orders.py --dry-run
+    python migrate_filled_orders.py
+"""
+
+import sys
+import logging
+import argparse
+
+# Load environment variables
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+from lib.database import get_database_connection
+
+TYPED_COLUMNS = ('ts', 'sell_time')
+
+# (name, type) - added if missing
+ADDED_COLUMNS = [
+    # clOrdId shared by lots sold together in one aggregated market order
+    ('sell_client_order_id', 'TEXT'),
+]
+
+# Base table for a fresh database; migrate() adds everything below
+FILLED_ORDERS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS filled_orders (
+        instId TEXT NOT NULL,
+        ordId TEXT,
+        tradeId TEXT PRIMARY KEY,
+        billId TEXT,
+        fillPx TEXT,
+        fillSz TEXT,
+        side TEXT,
+        ts BIGINT,
+        subType TEXT,
+        execType TEXT,
+        fee TEXT,
+        feeCcy TEXT,
+        feeRate TEXT,
+        fillTime TEXT,
+        posSide TEXT,
+        clOrdId TEXT,
+        tag TEXT,
+        sell_time BIGINT,
+        sold_status TEXT,
+        sell_order_id TEXT,
+        trigger_rebuild_pending BOOLEAN DEFAULT FALSE
+    )
+'''
+
+# (name, definition) - all are idempotent
+FILLED_ORDERS_INDEXES = [
+    # New sells: WHERE side='buy' AND sold_status IS NULL AND sell_time <= now
+    ('idx_filled_orders_due_sell',
+     "ON filled_orders (sell_time) WHERE side = 'buy' AND sold_status IS NULL"),
+    # Interrupted sells awaiting reconciliation
+    ('idx_filled_orders_pending_sell',
+     "ON filled_orders (sell_time) WHERE side = 'buy' AND sold_status IN ('PROCESSING', 'SELL_SUBMITTED')"),
+    # Legacy unsold rows without sell_time, selected by buy day
+    ('idx_filled_orders_legacy_unsold',
+     "ON filled_orders (ts) WHERE side = 'buy' AND sold_status IS NULL AND sell_time IS NULL"),
+    # MAX(ts) for incremental fetches and the daily-close check
+    ('idx_filled_orders_ts', "ON filled_orders (ts)"),
+    # Active-position counts and manual-sell reconciliation
+    ('idx_filled_orders_unsold_inst',
+     "ON filled_orders (instId) WHERE side = 'buy' AND (sold_status IS NULL OR sold_status != 'SOLD')"),
+]
+
+
+def setup_logging():
+    """Setup logging configuration"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    return logging.getLogger(__name__)
+
+
+def get_column_types(cursor):
+    """Return {column: data_type} for the columns being migrated"""
+    cursor.execute('''
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_name = 'filled_orders' AND column_name = ANY(%s)
+    ''', (list(TYPED_COLUMNS),))
+    return {name.lower(): data_type for name, data_type in cursor.fetchall()}
+
+
+def count_non_numeric(cursor, column):
+    """Count non-empty values that cannot be converted and will become NULL"""
+    cursor.execute(f'''
+        SELECT COUNT(*) FROM filled_orders
+        WHERE {column} IS NOT NULL AND {column} != '' AND {column} !~ '^[0-9]+$'
+    ''')
+    return cursor.fetchone()[0]
+
+
+def create_table(cursor, logger, dry_run=False):
+    """Create filled_orders if it does not exist; returns True when it was created"""
+    cursor.execute("SELECT to_regclass('filled_orders')")
+    if cursor.fetchone()[0]:
+        return False
+    logger.info(f"{'📝 [dry-run] ' if dry_run else '🔧 '}{' '.join(FILLED_ORDERS_TABLE.split())}")
+    if not dry_run:
+        cursor.execute(FILLED_ORDERS_TABLE)
+    return True
+
+
+def migrate(cursor, logger, dry_run=False):
+    """Apply the migration on ``cursor``; returns the list of statements"""
+    statements = []
+    if create_table(cursor, logger, dry_run=dry_run) and dry_run:
+        # Nothing to inspect yet; the created table already has the typed columns
+        return [FILLED_ORDERS_TABLE]
+    column_types = get_column_types(cursor)
+    if not column_types:
+        raise RuntimeError("filled_orders table not found")
+
+    for column in TYPED_COLUMNS:
+        data_type = column_types.get(column)
+        if data_type == 'bigint':
+            logger.info(f"✅ filled_orders.{column} is already BIGINT")
+            continue
+        if data_type is None:
+            raise RuntimeError(f"filled_orders.{column} column not found")
+
+        invalid = count_non_numeric(cursor, column)
+        if invalid:
+            logger.warning(f"⚠️ {invalid} non-numeric filled_orders.{column} value(s) will become NULL")
+        statements.append(f'''
+            ALTER TABLE filled_orders
+            ALTER COLUMN {column} TYPE BIGINT
+            USING (CASE WHEN {column} ~ '^[0-9]+$' THEN CAST({column} AS BIGINT) END)
+        ''')
+
+    for name, column_type in ADDED_COLUMNS:
+        statements.append(f"ALTER TABLE filled_orders ADD COLUMN IF NOT EXISTS {name} {column_type}")
+
+    for name, definition in FILLED_ORDERS_INDEXES:
+        statements.append(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+
+    for statement in statements:
+        logger.info(f"{'📝 [dry-run] ' if dry_run else '🔧 '}{' '.join(statement.split())}")
+        if not dry_run:
+            cursor.execute(statement)
+
+    # Refresh planner statistics for the new column types and indexes
+    if statements and not dry_run:
+        cursor.execute('ANALYZE filled_orders')
+    return statements
+
+
+def main():
+    """Main function to migrate the filled_orders schema"""
+    parser = argparse.ArgumentParser(description='Migrate filled_orders timestamps to BIGINT and add indexes')
+    parser.add_argument('--dry-run', action='store_true', help='Print the statements without applying them')
+    args = parser.parse_args()
+
+    logger = setup_logging()
+    conn = None
+    try:
+        logger.info("🚀 Starting filled_orders schema migration")
+        conn = get_database_connection()
+        with conn.cursor() as cursor:
+            migrate(cursor, logger, dry_run=args.dry_run)
+        if args.dry_run:
+            conn.rollback()
+            logger.info("ℹ️ Dry run complete, no changes applied")
+        else:
+            # Single transaction: either every step applies or none does
+            conn.commit()
+            logger.info("✅ filled_orders schema migration completed")
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        logger.error(f"❌ Migration failed: {e}")
+        sys.exit(1)
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Mock OKX REST Server
+A local stand-in for the OKX v5 REST endpoints the trading scripts call, for
+end-to-end benchmarks (benchmark_scripts.py) and manual dry runs.  Point the
+scripts at it with OKX_API_DOMAIN=http://127.0.0.1:<port>; signatures are not
+checked.
+
+Simulated exchange: N spot pairs (MOCK000-USDT, ...) with fixed daily candles,
+a USDT balance, trigger/limit buys that fill immediately with probability
+``fill_rate`` (fills are back-dated by ``fill_age_ms`` so their lots are
+already due for sale) and market sells that always fill.
+
+Fault injection: fixed ``latency_ms`` per request, HTTP 429 (code 50011) once
+an endpoint exceeds ``rate_limit`` requests per 2 seconds, and dropped
+connections with probability ``disconnect_rate``.
+
+    python mock_okx_server.py --pairs 100 --latency-ms 50 --rate-limit 20 --disconnect-rate 0.01
+
+GET /mock/stats returns per-endpoint call counts; POST /mock/reset clears them.
+"""
+
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAIRS = 10
+DEFAULT_FILL_RATE = 0.1
+DEFAULT_FILL_AGE_MS = 25 * 60 * 60 * 1000
+DEFAULT_BALANCE_USDT = 1_000_000.0
+# OKX rate limits are expressed per 2 seconds
+RATE_LIMIT_WINDOW_SECONDS = 2.0
+PAGE_LIMIT = 100
+DAY_MS = 24 * 60 * 60 * 1000
+SGT_OFFSET_MS = 8 * 60 * 60 * 1000
+BAR_MS = {'1m': 60 * 1000, '5m': 5 * 60 * 1000, '15m': 15 * 60 * 1000,
+          '1H': 60 * 60 * 1000, '4H': 4 * 60 * 60 * 1000, '1D': DAY_MS}
+
+
+def mock_inst_ids(pairs):
+    """Instrument ids served by a mock exchange with ``pairs`` pairs"""
+    return [f"MOCK{index:03d}-USDT" for index in range(pairs)]
+
+
+def _ok(data):
+    return {'code': '0', 'msg': '', 'data': data}
+
+
+def _error(code, msg):
+    return {'code': code, 'msg': msg, 'data': []}
+
+
+def _num(value):
+    return f"{value:.10f}".rstrip('0').rstrip('.') or '0'
+
+
+class MockExchange:
+    """In-memory exchange state; every public method returns an OKX response dict"""
+
+    def __init__(self, pairs=DEFAULT_PAIRS, fill_rate=DEFAULT_FILL_RATE,
+                 fill_age_ms=DEFAULT_FILL_AGE_MS, seed=0, announcements=None):
+        self.lock = threading.Lock()
+        self.fill_rate = fill_rate
+        self.fill_age_ms = fill_age_ms
+        self.seed = seed
+        self.announcements = announcements or []
+        self.reset(pairs)
+
+    def reset(self, pairs=None):
+        """Drop all orders, fills and holdings (optionally changing the pair count)"""
+        with self.lock:
+            if pairs is not None:
+                self.inst_ids = mock_inst_ids(pairs)
+                self.prices = {inst_id: 1.0 + index for index, inst_id in enumerate(self.inst_ids)}
+            self.random = random.Random(self.seed)
+            self.balances = {'USDT': DEFAULT_BALANCE_USDT}
+            self.orders = {}
+            self.algo_orders = {}
+            self.fills = []
+            self.next_id = 1
+
+    def _id(self):
+        self.next_id += 1
+        return str(10 ** 12 + self.next_id)
+
+    def _fill(self, order, price, ts):
+        ccy = order['instId'].split('-')[0]
+        size = float(order['sz'])
+        if order['side'] == 'buy':
+            self.balances[ccy] = self.balances.get(ccy, 0.0) + size
+            self.balances['USDT'] -= size * price
+        else:
+            size = min(size, self.balances.get(ccy, 0.0))
+            self.balances[ccy] = self.balances.get(ccy, 0.0) - size
+            self.balances['USDT'] += size * price
+        order.update(state='filled', accFillSz=_num(size), avgPx=_num(price), fillPx=_num(price),
+                     uTime=str(ts), fillTime=str(ts))
+        self.fills.append({
+            'instType': 'SPOT', 'instId': order['instId'], 'ordId': order['ordId'],
+            'clOrdId': order.get('clOrdId', ''), 'tradeId': self._id(), 'billId': self._id(),
+            'fillPx': _num(price), 'fillSz': _num(size), 'side': order['side'], 'posSide': 'net',
+            'execType': 'T', 'fee': _num(-size * price * 0.001), 'feeCcy': 'USDT', 'feeRate': '-0.001',
+            'subType': '1' if order['side'] == 'buy' else '2', 'tag': '', 'ts': str(ts), 'fillTime': str(ts),
+        })
+
+    def _create_order(self, inst_id, body, ts):
+        order = {
+            'instType': 'SPOT', 'instId': inst_id, 'ordId': self._id(), 'clOrdId': body.get('clOrdId', ''),
+            'side': body.get('side', 'buy'), 'ordType': body.get('ordType', 'limit'), 'sz': body.get('sz', '0'),
+            'px': body.get('px', ''), 'state': 'live', 'accFillSz': '0', 'avgPx': '', 'fillPx': '',
+            'cTime': str(ts), 'uTime': str(ts), 'tag': body.get('tag', ''),
+        }
+        self.orders[order['ordId']] = order
+        return order
+
+    def _new_order(self, body, ts):
+        inst_id = body.get('instId')
+        if inst_id not in self.prices:
+            return None, {'sCode': '51001', 'sMsg': 'Instrument ID does not exist', 'ordId': '', 'clOrdId': ''}
+        order = self._create_order(inst_id, body, ts)
+        if order['ordType'] == 'market':
+            self._fill(order, self.prices[inst_id], ts)
+        elif self.random.random() < self.fill_rate:
+            self._fill(order, float(order['px'] or self.prices[inst_id]), ts - self.fill_age_ms)
+        return order, {'sCode': '0', 'sMsg': '', 'ordId': order['ordId'], 'clOrdId': order['clOrdId']}
+
+    # Trade
+
+    def place_order(self, body):
+        with self.lock:
+            _order, result = self._new_order(body, int(time.time() * 1000))
+        return _ok([result]) if result['sCode'] == '0' else dict(_error('1', 'Operation failed'), data=[result])
+
+    def place_multiple_orders(self, bodies):
+        with self.lock:
+            now = int(time.time() * 1000)
+            results = [self._new_order(body, now)[1] for body in bodies]
+        if any(result['sCode'] != '0' for result in results):
+            return dict(_error('2', 'Batch operation failed'), data=results)
+        return _ok(results)
+
+    def get_order(self, params):
+        with self.lock:
+            order = self.orders.get(params.get('ordId', ''))
+            if order is None and params.get('clOrdId'):
+                order = next((o for o in self.orders.values() if o['clOrdId'] == params['clOrdId']), None)
+            return _ok([dict(order)]) if order else _error('51603', 'Order does not exist')
+
+    def _page(self, items, key, params):
+        items = sorted(items, key=lambda item: int(item[key]), reverse=True)
+        if params.get('after'):
+            items = [item for item in items if int(item[key]) < int(params['after'])]
+        if params.get('before'):
+            items = [item for item in items if int(item[key]) > int(params['before'])]
+        if params.get('begin'):
+            items = [item for item in items if int(item['ts' if 'ts' in item else 'cTime']) >= int(params['begin'])]
+        if params.get('instId'):
+            items = [item for item in items if item['instId'] == params['instId']]
+        return items[:min(int(params.get('limit') or PAGE_LIMIT), PAGE_LIMIT)]
+
+    def get_order_list(self, params):
+        with self.lock:
+            live = [dict(o) for o in self.orders.values() if o['state'] == 'live'
+                    and (not params.get('ordType') or o['ordType'] == params['ordType'])]
+            return _ok(self._page(live, 'ordId', params))
+
+    def get_orders_history(self, params):
+        with self.lock:
+            done = [dict(o) for o in self.orders.values() if o['state'] in ('filled', 'canceled')
+                    and (not params.get('ordType') or o['ordType'] == params['ordType'])]
+            return _ok(self._page(done, 'ordId', params))
+
+    def cancel_order(self, body):
+        with self.lock:
+            order = self.orders.get(body.get('ordId', ''))
+            if not order or order['state'] != 'live':
+                return dict(_error('1', 'Operation failed'),
+                            data=[{'sCode': '51400', 'sMsg': 'Cancellation failed', 'ordId': body.get('ordId', '')}])
+            order['state'] = 'canceled'
+            return _ok([{'sCode': '0', 'sMsg': '', 'ordId': order['ordId'], 'clOrdId': order['clOrdId']}])
+
+    def get_fills(self, params):
+        with self.lock:
+            return _ok(self._page(self.fills, 'billId', params))
+
+    def place_algo_order(self, body):
+        with self.lock:
+            inst_id = body.get('instId')
+            if inst_id not in self.prices:
+                return dict(_error('1', 'Operation failed'),
+                            data=[{'sCode': '51001', 'sMsg': 'Instrument ID does not exist', 'algoId': ''}])
+            now = int(time.time() * 1000)
+            algo = {
+                'instType': 'SPOT', 'instId': inst_id, 'algoId': self._id(), 'ordType': body.get('ordType', 'trigger'),
+                'side': body.get('side', 'buy'), 'sz': body.get('sz', '0'), 'triggerPx': body.get('triggerPx', ''),
+                'orderPx': body.get('orderPx', '-1'), 'state': 'live', 'cTime': str(now),
+                'algoClOrdId': body.get('algoClOrdId', ''),
+            }
+            self.algo_orders[algo['algoId']] = algo
+            if self.random.random() < self.fill_rate:
+                algo['state'] = 'effective'
+                price = algo['orderPx'] if algo['orderPx'] not in ('', '-1') else algo['triggerPx']
+                order = self._create_order(inst_id, {'side': algo['side'], 'ordType': 'limit',
+                                                     'sz': algo['sz'], 'px': price}, now)
+                self._fill(order, float(price), now - self.fill_age_ms)
+            return _ok([{'algoId': algo['algoId'], 'sCode': '0', 'sMsg': '', 'algoClOrdId': algo['algoClOrdId']}])
+
+    def order_algos_list(self, params):
+        with self.lock:
+            live = [dict(a) for a in self.algo_orders.values() if a['state'] == 'live'
+                    and (not params.get('ordType') or a['ordType'] == params['ordType'])]
+            return _ok(self._page(live, 'algoId', params))
+
+    def cancel_algo_order(self, bodies):
+        with self.lock:
+            results = []
+            for body in bodies:
+                algo = self.algo_orders.get(body.get('algoId', ''))
+                if algo and algo['state'] == 'live':
+                    algo['state'] = 'canceled'
+                    results.append({'algoId': algo['algoId'], 'sCode': '0', 'sMsg': ''})
+                else:
+                    results.append({'algoId': body.get('algoId', ''), 'sCode': '51000', 'sMsg': 'Order does not exist'})
+            return _ok(results)
+
+    # Account
+
+    def get_account_balance(self, _params):
+        with self.lock:
+            details = []
+            for ccy, amount in self.balances.items():
+                if amount <= 0:
+                    continue
+                price = 1.0 if ccy == 'USDT' else self.prices.get(f"{ccy}-USDT", 0.0)
+                details.append({'ccy': ccy, 'eq': _num(amount), 'cashBal': _num(amount), 'availBal': _num(amount),
+                                'frozenBal': '0', 'ordFrozen': '0', 'eqUsd': _num(amount * price)})
+            return _ok([{'details': details, 'totalEq': _num(sum(float(d['eqUsd']) for d in details))}])
+
+    # Market / public data
+
+    def _ticker(self, inst_id):
+        price = _num(self.prices[inst_id])
+        return {'instType': 'SPOT', 'instId': inst_id, 'last': price, 'askPx': price, 'bidPx': price,
+                'open24h': price, 'sodUtc8': price, 'ts': str(int(time.time() * 1000))}
+
+    def get_tickers(self, _params):
+        return _ok([self._ticker(inst_id) for inst_id in self.inst_ids])
+
+    def get_ticker(self, params):
+        inst_id = params.get('instId')
+        return _ok([self._ticker(inst_id)]) if inst_id in self.prices else _error('51001', 'Instrument ID does not exist')
+
+    def get_candlesticks(self, params):
+        """Flat candles at the pair's price, newest first; the current bar is unconfirmed"""
+        inst_id = params.get('instId')
+        if inst_id not in self.prices:
+            return _error('51001', 'Instrument ID does not exist')
+        bar_ms = BAR_MS.get(params.get('bar') or '1m', 60 * 1000)
+        now = int(time.time() * 1000)
+        current = (now + SGT_OFFSET_MS) // bar_ms * bar_ms - SGT_OFFSET_MS if bar_ms == DAY_MS else now // bar_ms * bar_ms
+        newest = int(params['after']) - bar_ms if params.get('after') else current
+        price = _num(self.prices[inst_id])
+        rows = []
+        for index in range(min(int(params.get('limit') or PAGE_LIMIT), PAGE_LIMIT)):
+            ts = newest - index * bar_ms
+            rows.append([str(ts), price, price, price, price, '1000', '1000', '1000', '0' if ts == current else '1'])
+        return _ok(rows)
+
+    def get_instruments(self, _params):
+        return _ok([{'instType': 'SPOT', 'instId': inst_id, 'baseCcy': inst_id.split('-')[0], 'quoteCcy': 'USDT',
+                     'tickSz': '0.0001', 'lotSz': '0.000001', 'minSz': '0.0001', 'state': 'live'}
+                    for inst_id in self.inst_ids])
+
+    def get_system_time(self, _params):
+        return _ok([{'ts': str(int(time.time() * 1000))}])
+
+    def get_announcements(self, params):
+        page = int(params.get('page') or 1)
+        details = self.announcements if page == 1 else []
+        return _ok([{'details': details, 'totalPage': '1'}])
+
+
+# (method, path) -> (exchange method, body is a list)
+ROUTES = {
+    ('POST', '/api/v5/trade/order'): 'place_order',
+    ('POST', '/api/v5/trade/batch-orders'): 'place_multiple_orders',
+    ('GET', '/api/v5/trade/order'): 'get_order',
+    ('GET', '/api/v5/trade/orders-pending'): 'get_order_list',
+    ('GET', '/api/v5/trade/orders-history'): 'get_orders_history',
+    ('POST', '/api/v5/trade/cancel-order'): 'cancel_order',
+    ('GET', '/api/v5/trade/fills'): 'get_fills',
+    ('GET', '/api/v5/trade/fills-history'): 'get_fills',
+    ('POST', '/api/v5/trade/order-algo'): 'place_algo_order',
+    ('GET', '/api/v5/trade/orders-algo-pending'): 'order_algos_list',
+    ('POST', '/api/v5/trade/cancel-algos'): 'cancel_algo_order',
+    ('GET', '/api/v5/account/balance'): 'get_account_balance',
+    ('GET', '/api/v5/market/tickers'): 'get_tickers',
+    ('GET', '/api/v5/market/ticker'): 'get_ticker',
+    ('GET', '/api/v5/market/candles'): 'get_candlesticks',
+    ('GET', '/api/v5/market/history-candles'): 'get_candlesticks',
+    ('GET', '/api/v5/public/instruments'): 'get_instruments',
+    ('GET', '/api/v5/public/time'): 'get_system_time',
+    ('GET', '/api/v5/support/announcements'): 'get_announcements',
+}
+
+
+class MockOKXServer(ThreadingHTTPServer):
+    """HTTP front end with call accounting and fault injection"""
+
+    daemon_threads = True
+
+    def __init__(self, exchange, host='127.0.0.1', port=0, latency_ms=0.0,
+                 rate_limit=None, disconnect_rate=0.0, seed=0):
+        super().__init__((host, port), _Handler)
+        self.exchange = exchange
+        self.latency_ms = latency_ms
+        self.rate_limit = rate_limit
+        self.disconnect_rate = disconnect_rate
+        self.random = random.Random(seed)
+        self.stats_lock = threading.Lock()
+        self.windows = {}
+        self.reset_stats()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.calls = Counter()
+            self.rate_limited = 0
+            self.disconnects = 0
+            self.windows.clear()
+
+    def stats(self):
+        with self.stats_lock:
+            return {'calls': sum(self.calls.values()), 'by_endpoint': dict(self.calls),
+                    'rate_limited': self.rate_limited, 'disconnects': self.disconnects}
+
+    def admit(self, endpoint):
+        """Count a call; returns 'ok', 'rate_limited' or 'disconnect'"""
+        with self.stats_lock:
+            self.calls[endpoint] += 1
+            if self.disconnect_rate and self.random.random() < self.disconnect_rate:
+                self.disconnects += 1
+                return 'disconnect'
+            if self.rate_limit:
+                now = time.monotonic()
+                window = self.windows.setdefault(endpoint, deque())
+                while window and now - window[0] >= RATE_LIMIT_WINDOW_SECONDS:
+                    window.popleft()
+                if len(window) >= self.rate_limit:
+                    self.rate_limited += 1
+                    return 'rate_limited'
+                window.append(now)
+            return 'ok'
+
+    def start(self):
+        """Serve from a background thread; returns the thread"""
+        thread = threading.Thread(target=self.serve_forever, name='mock-okx', daemon=True)
+        thread.start()
+        return thread
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+
+        if url.path == '/mock/stats':
+            return self._send(200, self.server.stats())
+        if url.path == '/mock/reset':
+            self.server.reset_stats()
+            return self._send(200, {'code': '0'})
+
+        route = ROUTES.get((method, url.path))
+        if route is None:
+            return self._send(404, _error('404', f"Not mocked: {method} {url.path}"))
+
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000.0)
+        verdict = self.server.admit(f"{method} {url.path}")
+        if verdict == 'disconnect':
+            self.close_connection = True
+            return None
+        if verdict == 'rate_limited':
+            return self._send(429, _error('50011', 'Too Many Requests'))
+
+        try:
+            argument = json.loads(raw) if method == 'POST' and raw else dict(parse_qsl(url.query))
+            return self._send(200, getattr(self.server.exchange, route)(argument))
+        except Exception as e:
+            logger.error(f"❌ Mock handler {route} failed: {e}")
+            return self._send(500, _error('50000', str(e)))
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Local mock of the OKX REST API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pairs', type=int, default=DEFAULT_PAIRS, help='Number of spot pairs')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay added to every request')
+    parser.add_argument('--rate-limit', type=int, default=None, help='Requests per endpoint per 2s before HTTP 429')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help='Probability of dropping a request')
+    parser.add_argument('--fill-rate', type=float, default=DEFAULT_FILL_RATE, help='Probability a buy fills at once')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        handlers=[logging.StreamHandler(sys.stdout)])
+    exchange = MockExchange(pairs=args.pairs, fill_rate=args.fill_rate)
+    server = MockOKXServer(exchange, args.host, args.port, latency_ms=args.latency_ms,
+                           rate_limit=args.rate_limit, disconnect_rate=args.disconnect_rate)
+    logger.info(f"🧪 Mock OKX serving {args.pairs} pairs at {server.url} (export OKX_API_DOMAIN={server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("⏹️  Mock OKX stopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
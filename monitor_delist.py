@@ -9,17 +9,21 @@ import requests
 import time
 import os
 import sys
+import json
 import logging
 import logging.handlers
 import hmac
 import hashlib
 import base64
 from datetime import datetime, timedelta
-from typing import Set, List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Set, List, Dict, Any, Optional, Tuple
 
 # Import our utility modules
 from utils_http import get_global_session, safe_request
-from utils_deduplication import is_action_processed, mark_action_processed
+from utils_deduplication import are_actions_processed, is_action_processed, mark_action_processed, mark_actions_processed
+from utils_rate_limit import get_rate_limiter
+from okx_client import get_okx_api_domain
 from utils_time import (
     get_utc_now_naive, timestamp_to_utc_datetime_naive, 
     format_datetime_utc, is_within_hours, get_log_filename
@@ -40,16 +44,27 @@ from crypto_matcher import CryptoMatcher
 from protection_manager import ProtectionManager
 from blacklist_manager import BlacklistManager
 
+# Announcements crawl: pages are read until they fall outside the alert window
+ANNOUNCEMENT_WINDOW_HOURS = 24
+ANNOUNCEMENT_CRAWL_WORKERS = 3
+ANNOUNCEMENT_MAX_PAGES = 10
+# Newest pTime and validators of the last fully processed check, so a tick
+# with nothing new costs one (possibly 304) page-1 request.  Kept in the
+# database when configured (each cron run is a fresh process), else in a file.
+ANNOUNCEMENT_CRAWL_STATE_NAME = 'okx_delist_spot'
+DEFAULT_ANNOUNCEMENT_STATE_PATH = os.path.join('cache', 'delist_announcements_state.json')
+
 
 class OKXDelistMonitor:
     """OKX Delist Monitor (Refactored Version)"""
     
-    def __init__(self):
+    def __init__(self, okx_client=None):
         # API configuration
         self.api_key = os.environ.get('OKX_API_KEY', '')
         self.secret_key = os.environ.get('OKX_SECRET_KEY', '')
         self.passphrase = os.environ.get('OKX_PASSPHRASE', '')
-        self.base_url = "https://www.okx.com/api/v5/support/announcements"
+        self.base_url = f"{get_okx_api_domain() or 'https://www.okx.com'}/api/v5/support/announcements"
+        self.state_path = os.getenv('OKX_ANNOUNCEMENT_STATE_PATH', DEFAULT_ANNOUNCEMENT_STATE_PATH)
         
         # Monitoring configuration
         self.check_interval = 300  # 5 minutes = 300 seconds (match Cloudflare cron)
@@ -58,6 +73,9 @@ class OKXDelistMonitor:
         # Setup logging
         self.setup_logging()
         
+        # Shared with ProtectionManager when provided (e.g. by trading_daemon.py)
+        self.okx_client = okx_client
+
         # Delay DB-backed manager creation until we know we need stateful checks.
         self.config_manager = None
         self.crypto_matcher = None
@@ -73,7 +91,7 @@ class OKXDelistMonitor:
         if self.crypto_matcher is None:
             self.crypto_matcher = CryptoMatcher(self.config_manager, self.logger)
         if self.protection_manager is None:
-            self.protection_manager = ProtectionManager(logger=self.logger)
+            self.protection_manager = ProtectionManager(okx_client=getattr(self, 'okx_client', None), logger=self.logger)
         if self.blacklist_manager is None:
             self.blacklist_manager = BlacklistManager(logger=self.logger)
 
@@ -82,6 +100,14 @@ class OKXDelistMonitor:
         if self.blacklist_manager is None:
             self.blacklist_manager = BlacklistManager(logger=self.logger)
 
+    def close(self):
+        """Return the config DB connection to the pool between resident runs."""
+        if self.config_manager is not None:
+            self.config_manager.close()
+        # The matcher caches the configured symbols; reload both on the next check
+        self.config_manager = None
+        self.crypto_matcher = None
+
     def log_config_stats(self):
         """Log configured crypto count when DB-backed managers are available."""
         self.ensure_state_managers()
@@ -146,6 +172,17 @@ class OKXDelistMonitor:
     
     def fetch_delist_announcements(self, page: int = 1) -> List[Dict[str, Any]]:
         """Fetch delist announcements"""
+        return self._fetch_announcements_page(page)[0]
+
+    def _fetch_announcements_page(self, page: int = 1,
+                                  conditional_headers: Optional[Dict[str, str]] = None
+                                  ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Fetch one page of delist announcements.
+
+        Returns (details, meta); meta carries totalPage, the response's
+        ETag/Last-Modified validators and whether the server answered 304
+        to ``conditional_headers``.
+        """
         max_retries = 3
         base_delay = 60  # 1 minute base delay
         
@@ -158,25 +195,42 @@ class OKXDelistMonitor:
                 timestamp = datetime.utcnow().isoformat("T", "milliseconds") + 'Z'
                 signature = self.generate_signature(timestamp, 'GET', request_path)
                 headers = self.get_headers(timestamp, signature)
+                if conditional_headers:
+                    headers.update(conditional_headers)
                 
                 # Send request with robust HTTP session
                 session = get_global_session()
+                get_rate_limiter().acquire('get_announcements')
                 response = safe_request('GET', self.base_url, session=session, 
                                       params={
                                           'annType': 'announcements-delistings',
                                           'page': page
                                       }, headers=headers, timeout=10)
                 
+                response_headers = getattr(response, 'headers', None) or {}
+                meta = {
+                    'not_modified': response.status_code == 304,
+                    'total_pages': 1,
+                    'etag': response_headers.get('ETag'),
+                    'last_modified': response_headers.get('Last-Modified'),
+                }
+                if response.status_code == 304:
+                    self.logger.info(f"ℹ️ Announcements page {page} not modified")
+                    return [], meta
                 if response.status_code == 200:
                     data = response.json()
                     if data.get('code') == '0':
                         # Check if there's actual announcement data
                         if 'data' in data and len(data['data']) > 0 and 'details' in data['data'][0]:
-                            self.logger.info(f"📢 Found {len(data['data'])} announcement(s)")
-                            return data['data'][0]['details']
+                            try:
+                                meta['total_pages'] = int(data['data'][0].get('totalPage') or 1)
+                            except (TypeError, ValueError):
+                                pass
+                            self.logger.info(f"📢 Found {len(data['data'][0]['details'])} announcement(s) on page {page}")
+                            return data['data'][0]['details'], meta
                         else:
                             self.logger.info("ℹ️ No announcement details found in API response")
-                            return []
+                            return [], meta
                     else:
                         self.logger.error(f"❌ OKX API error: {data}")
                         raise RuntimeError(
@@ -207,7 +261,105 @@ class OKXDelistMonitor:
                 else:
                     raise RuntimeError("Unable to fetch OKX delist announcements") from e
         
-        return []
+        return [], {'not_modified': False, 'total_pages': 1, 'etag': None, 'last_modified': None}
+
+    def load_crawl_state(self) -> Dict[str, Any]:
+        """Read the last processed crawl state from the database, else the local file (empty when missing)"""
+        if os.getenv('DATABASE_URL'):
+            self.ensure_blacklist_manager()
+            state = self.blacklist_manager.get_crawl_state(ANNOUNCEMENT_CRAWL_STATE_NAME)
+            if state is not None:
+                return state
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"⚠️ Ignoring unreadable announcement crawl state {self.state_path}: {e}")
+            return {}
+
+    def save_crawl_state(self, state: Dict[str, Any]):
+        """Persist crawl state; only called once every crawled announcement was handled"""
+        if os.getenv('DATABASE_URL'):
+            self.ensure_blacklist_manager()
+            self.blacklist_manager.save_crawl_state(ANNOUNCEMENT_CRAWL_STATE_NAME, state)
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            self.logger.warning(f"⚠️ Could not save announcement crawl state: {e}")
+
+    @staticmethod
+    def _page_ptimes(details: List[Dict[str, Any]]) -> List[int]:
+        ptimes = []
+        for ann in details:
+            try:
+                ptimes.append(int(ann['pTime']))
+            except (KeyError, TypeError, ValueError):
+                continue
+        return ptimes
+
+    def crawl_recent_announcements(self) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Fetch every announcement newer than both the alert window and the last processed check.
+
+        Page 1 is requested conditionally; if it is unchanged or holds nothing
+        newer than the stored pTime, that is the only request.  Otherwise the
+        following pages are fetched ANNOUNCEMENT_CRAWL_WORKERS at a time until
+        a page reaches past the cutoff.  Returns (announcements, new_state);
+        the caller saves new_state after handling the announcements.
+        """
+        state = self.load_crawl_state()
+        newest_seen = int(state.get('newest_ptime') or 0)
+        conditional_headers = {}
+        if state.get('etag'):
+            conditional_headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            conditional_headers['If-Modified-Since'] = state['last_modified']
+
+        details, meta = self._fetch_announcements_page(1, conditional_headers or None)
+        if meta['not_modified']:
+            return [], None
+
+        ptimes = self._page_ptimes(details)
+        new_state = {
+            'newest_ptime': max(ptimes + [newest_seen]),
+            'etag': meta['etag'],
+            'last_modified': meta['last_modified'],
+        }
+        if not ptimes or max(ptimes) <= newest_seen:
+            self.logger.info("ℹ️ No announcements newer than the last check")
+            return [], new_state
+
+        window_start = int(time.time() * 1000) - ANNOUNCEMENT_WINDOW_HOURS * 60 * 60 * 1000
+
+        def reaches_cutoff(page_ptimes):
+            # Older than the alert window, or already seen by a completed check
+            return not page_ptimes or min(page_ptimes) < window_start or min(page_ptimes) <= newest_seen
+
+        announcements = list(details)
+        last_page = min(meta['total_pages'], ANNOUNCEMENT_MAX_PAGES)
+        next_page = 2
+        reached_cutoff = reaches_cutoff(ptimes)
+        while not reached_cutoff and next_page <= last_page:
+            pages = list(range(next_page, min(next_page + ANNOUNCEMENT_CRAWL_WORKERS, last_page + 1)))
+            with ThreadPoolExecutor(max_workers=len(pages)) as executor:
+                results = list(executor.map(self.fetch_delist_announcements, pages))
+            for page_details in results:
+                announcements.extend(page_details)
+                if reaches_cutoff(self._page_ptimes(page_details)):
+                    reached_cutoff = True
+                    break
+            next_page += len(pages)
+
+        if not reached_cutoff and meta['total_pages'] > ANNOUNCEMENT_MAX_PAGES:
+            self.logger.warning(f"⚠️ Stopped announcement crawl at page {ANNOUNCEMENT_MAX_PAGES} before reaching the window")
+        self.logger.info(f"📢 Crawled {next_page - 1} announcement page(s), {len(announcements)} announcement(s)")
+        return announcements, new_state
     
     def is_recent_announcement(self, announcement: Dict[str, Any]) -> bool:
         """Check if it's an announcement from the past 24 hours (UTC time)"""
@@ -291,6 +443,7 @@ class OKXDelistMonitor:
             self.logger.error("❌ Protection completed but announcement state was not persisted; retry required")
             return False
         mark_action_processed('delist_protection', announcement_id=announcement_id)
+        mark_action_processed('delist_announcement', announcement_id=announcement_id)
         return True
         
         # No need to recreate all algo triggers: we only cancelled affected inst_ids; other triggers stay.
@@ -300,7 +453,6 @@ class OKXDelistMonitor:
         timestamp_ms = int(announcement['pTime'])
         announcement_time = timestamp_to_utc_datetime_naive(timestamp_ms)
         date = format_datetime_utc(announcement_time)
-        announcement_id = f"{announcement['title']}_{announcement['pTime']}"
         
         print("\n" + "="*60)
         print("ℹ️  Delist Spot announcement found")
@@ -312,17 +464,26 @@ class OKXDelistMonitor:
         print("="*60)
         
         self.logger.info(f"ℹ️ Delist Spot announcement found: {announcement['title']}")
-        
-        # Mark announcement as processed (info only, no protection)
-        self.blacklist_manager.mark_announcement_processed(
-            announcement_id=announcement_id,
-            title=announcement['title'],
-            url=announcement['url'],
-            p_time=int(announcement['pTime']),
-            affected_cryptos=None,
-            protection_executed=False,
-            notes="Info alert only - no protection executed"
-        )
+    
+    def mark_info_announcements_processed(self, announcements: List[Dict[str, Any]]) -> bool:
+        """Mark info-only announcements (no protection) processed in one write"""
+        announcement_ids = [f"{ann['title']}_{ann['pTime']}" for ann in announcements]
+        if not self.blacklist_manager.mark_announcement_processed_many([
+            {
+                'announcement_id': announcement_id,
+                'title': ann['title'],
+                'url': ann['url'],
+                'p_time': int(ann['pTime']),
+                'affected_cryptos': None,
+                'protection_executed': False,
+                'notes': "Info alert only - no protection executed",
+            }
+            for announcement_id, ann in zip(announcement_ids, announcements)
+        ]):
+            return False
+        mark_actions_processed('delist_announcement', [{'announcement_id': announcement_id}
+                                                        for announcement_id in announcement_ids])
+        return True
     
 
     
@@ -332,86 +493,124 @@ class OKXDelistMonitor:
         self.logger.info(f"🔍 [{format_datetime_utc(now_utc, '%Y-%m-%d %H:%M:%S')}] Starting delist announcement check...")
         
         try:
-            # Fetch announcements from page 1
-            announcements = self.fetch_delist_announcements(page=1)
-            
-            if not announcements:
-                self.logger.info("ℹ️ No announcements found - ending check")
-                self._found_announcements = False
-                return
-
-            # Cheap filters first: if nothing recent/spot-like exists, skip DB setup entirely.
-            recent_announcements = [ann for ann in announcements if self.is_recent_announcement(ann)]
-            if not recent_announcements:
-                self.logger.info("✅ No new delist spot announcements found")
-                self._found_announcements = False
-                return
-
-            recent_spot_candidates = [
-                ann for ann in recent_announcements
-                if 'title' in ann and 'pTime' in ann and self.is_spot_related_announcement(ann)
-            ]
-            if not recent_spot_candidates:
-                self.logger.info("✅ No new delist spot announcements found")
-                self._found_announcements = False
-                return
+            announcements, crawl_state = self.crawl_recent_announcements()
+            self._handle_announcements(announcements)
+            # Every crawled announcement is handled; later checks can stop at this pTime
+            if crawl_state:
+                self.save_crawl_state(crawl_state)
+        except Exception as e:
+            self.logger.error(f"❌ Error during check: {e}")
+            self._found_announcements = False
+            raise
 
-            self.ensure_blacklist_manager()
+    def _handle_announcements(self, announcements: List[Dict[str, Any]]):
+        """Alert on and protect against the recent spot delistings among ``announcements``"""
+        if not announcements:
+            self.logger.info("ℹ️ No announcements found - ending check")
+            self._found_announcements = False
+            return
+
+        # Cheap filters first: if nothing recent/spot-like exists, skip DB setup entirely.
+        recent_announcements = [ann for ann in announcements if self.is_recent_announcement(ann)]
+        if not recent_announcements:
+            self.logger.info("✅ No new delist spot announcements found")
+            self._found_announcements = False
+            return
+
+        recent_spot_candidates = [
+            ann for ann in recent_announcements
+            if 'title' in ann and 'pTime' in ann and self.is_spot_related_announcement(ann)
+        ]
+        if not recent_spot_candidates:
+            self.logger.info("✅ No new delist spot announcements found")
+            self._found_announcements = False
+            return
+
+        # One batched dedup lookup settles every announcement handled by an
+        # earlier run; only the misses need the per-announcement blacklist check.
+        candidate_ids = [f"{ann['title']}_{ann['pTime']}" for ann in recent_spot_candidates]
+        already_handled = are_actions_processed(
+            'delist_announcement', [{'announcement_id': announcement_id} for announcement_id in candidate_ids]
+        )
+        pending = [
+            (announcement_id, ann)
+            for announcement_id, ann, handled in zip(candidate_ids, recent_spot_candidates, already_handled)
+            if not handled
+        ]
+        if not pending:
+            self.logger.info("✅ No new delist spot announcements found")
+            self._found_announcements = False
+            return
 
-            recent_spot_announcements = []
-            recent_affected_announcements = []
-            unprocessed_spot_announcements = []
+        self.ensure_blacklist_manager()
 
-            for ann in recent_spot_candidates:
-                announcement_id = f"{ann['title']}_{ann['pTime']}"
+        recent_spot_announcements = []
+        recent_affected_announcements = []
+        info_announcements = []
+        unprocessed_spot_announcements = []
+
+        # Check which are new announcements (one database query for the whole batch)
+        unprocessed_ids = set(self.blacklist_manager.get_unprocessed_announcement_ids(
+            [announcement_id for announcement_id, _ann in pending]
+        ))
+        handled_ids = []
+        for announcement_id, ann in pending:
+            if announcement_id in unprocessed_ids:
+                unprocessed_spot_announcements.append(ann)
+            else:
+                handled_ids.append(announcement_id)
+        # Processed by an earlier run whose dedup write was lost: one store write
+        if handled_ids:
+            mark_actions_processed('delist_announcement', [{'announcement_id': announcement_id}
+                                                            for announcement_id in handled_ids])
 
-                # Check if it's a new announcement (using database)
-                if not self.blacklist_manager.is_announcement_processed(announcement_id):
-                    unprocessed_spot_announcements.append(ann)
+        if not unprocessed_spot_announcements:
+            self.logger.info("✅ No new delist spot announcements found")
+            self._found_announcements = False
+            return
 
-            if not unprocessed_spot_announcements:
-                self.logger.info("✅ No new delist spot announcements found")
-                self._found_announcements = False
-                return
+        self.log_config_stats()
 
-            self.log_config_stats()
+        for ann in unprocessed_spot_announcements:
+            recent_spot_announcements.append(ann)
 
-            for ann in unprocessed_spot_announcements:
-                recent_spot_announcements.append(ann)
+            # Also check if it affects configured cryptocurrencies
+            is_affected, affected_cryptos = self.crypto_matcher.check_announcement_impact(ann)
+            if is_affected:
+                # A prior failed protection run may already have blacklisted
+                # the asset.  It must still be cancelled/sold until this
+                # announcement is durably marked processed.
+                ann['affected_cryptos'] = affected_cryptos
+                recent_affected_announcements.append(ann)
+            else:
+                info_announcements.append(ann)
+        
+        # Play alert sound for all new delist spot announcements
+        if recent_spot_announcements:
+            self.logger.warning(f"🔊 Found {len(recent_spot_announcements)} new delist spot announcements (past 24 hours)!")
+            self._found_announcements = True
 
-                # Also check if it affects configured cryptocurrencies
-                is_affected, affected_cryptos = self.crypto_matcher.check_announcement_impact(ann)
-                if is_affected:
-                    # A prior failed protection run may already have blacklisted
-                    # the asset.  It must still be cancelled/sold until this
-                    # announcement is durably marked processed.
-                    ann['affected_cryptos'] = affected_cryptos
-                    recent_affected_announcements.append(ann)
             
-            # Play alert sound for all new delist spot announcements
-            if recent_spot_announcements:
-                self.logger.warning(f"🔊 Found {len(recent_spot_announcements)} new delist spot announcements (past 24 hours)!")
-                self._found_announcements = True
+            # Info-only announcements are alerted and marked even when others in
+            # the batch need protection; the saved crawl state skips past them
+            if info_announcements:
+                self.logger.info(
+                    f"✅ {len(info_announcements)} of these spot announcements do not affect your configured cryptocurrencies"
+                )
+                for ann in info_announcements:
+                    self.send_info_alert(ann)
+                if not self.mark_info_announcements_processed(info_announcements):
+                    raise RuntimeError(f"Could not mark {len(info_announcements)} info announcements processed")
 
-                
-                # Then process announcements affecting configured cryptocurrencies
-                if recent_affected_announcements:
-                    self.logger.warning(f"🎯 Among them {len(recent_affected_announcements)} affect configured cryptocurrencies!")
-                    for ann in recent_affected_announcements:
-                        if not self.send_protection_alert(ann, ann['affected_cryptos']):
-                            raise RuntimeError(f"Delist protection incomplete for {ann['title']}")
-                else:
-                    self.logger.info("✅ These spot announcements do not affect your configured cryptocurrencies")
-                    for ann in recent_spot_announcements:
-                        self.send_info_alert(ann)
-            else:
-                self.logger.info("✅ No new delist spot announcements found")
-                self._found_announcements = False
-                
-        except Exception as e:
-            self.logger.error(f"❌ Error during check: {e}")
+            # Then process announcements affecting configured cryptocurrencies
+            if recent_affected_announcements:
+                self.logger.warning(f"🎯 Among them {len(recent_affected_announcements)} affect configured cryptocurrencies!")
+                for ann in recent_affected_announcements:
+                    if not self.send_protection_alert(ann, ann['affected_cryptos']):
+                        raise RuntimeError(f"Delist protection incomplete for {ann['title']}")
+        else:
+            self.logger.info("✅ No new delist spot announcements found")
             self._found_announcements = False
-            raise
 
     def is_spot_related_announcement(self, announcement: Dict[str, Any]) -> bool:
         """Cheap spot-related check that does not require DB-backed matchers."""
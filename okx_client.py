@@ -6,8 +6,12 @@ Responsible for interacting with OKX API, including balance queries and trading
 
 import os
 import logging
+import threading
 import time
-from typing import Dict, Any, Optional, Tuple
+import weakref
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils_rate_limit import get_rate_limiter, rate_limited
 
 # Initialize variables
 OKX_AVAILABLE = False
@@ -43,6 +47,96 @@ def get_order_operation_error(result, require_data: bool = False) -> Optional[st
         )
     return None
 
+def get_okx_api_domain() -> Optional[str]:
+    """REST base URL override (OKX_API_DOMAIN), e.g. a local mock_okx_server.py"""
+    return os.getenv('OKX_API_DOMAIN', '').rstrip('/') or None
+
+# Position checks within this window share one get_account_balance() response
+BALANCE_SNAPSHOT_TTL_SECONDS = 5.0
+
+
+class AccountBalanceSnapshot:
+    """One full trading-account balance response, indexed by currency.
+
+    OKX only returns currencies with a non-zero balance, so a missing
+    currency is an authoritative zero.
+    """
+
+    def __init__(self, result, requested_at_ms: Optional[int] = None):
+        if not result or result.get('code') != '0':
+            raise RuntimeError(f"Failed to get trading account balance: {result}")
+        data = result.get('data') or []
+        details = data[0].get('details') if data else []
+        if not isinstance(details, list):
+            raise RuntimeError("Trading account balance response contained invalid details")
+
+        self.has_data = bool(data)
+        self.fetched_at = time.monotonic()
+        # Wall-clock time the request was sent; fills after it may be missing
+        self.requested_at_ms = requested_at_ms if requested_at_ms is not None else int(time.time() * 1000)
+        self.details: Dict[str, Dict[str, Any]] = {}
+        for detail in details:
+            ccy = (detail.get('ccy') or '').upper()
+            if ccy:
+                self.details[ccy] = detail
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    def get(self, ccy: str) -> Optional[Dict[str, Any]]:
+        return self.details.get(ccy.upper())
+
+    def value(self, ccy: str, field: str) -> float:
+        """Float value of ``field`` for ``ccy`` (0.0 when missing or unparsable)"""
+        detail = self.get(ccy) or {}
+        try:
+            return float(detail.get(field) or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def eq_usd(self, ccy: str) -> float:
+        return self.value(ccy, 'eqUsd')
+
+    def avail_bal(self, ccy: str) -> float:
+        return self.value(ccy, 'availBal')
+
+    def frozen(self, ccy: str) -> float:
+        return max(self.value(ccy, 'frozenBal'), self.value(ccy, 'ordFrozen'))
+
+    def non_usdt_assets(self) -> List[Tuple[str, float]]:
+        """(ccy, eqUsd) for every non-USDT currency in the account"""
+        return [(ccy, self.eq_usd(ccy)) for ccy in self.details if ccy != 'USDT']
+
+
+_balance_snapshots = weakref.WeakKeyDictionary()
+_balance_snapshot_lock = threading.Lock()
+
+
+def get_balance_snapshot(account_api, max_age: float = BALANCE_SNAPSHOT_TTL_SECONDS) -> AccountBalanceSnapshot:
+    """Return a balance snapshot for ``account_api`` no older than ``max_age`` seconds.
+
+    Raises RuntimeError on API errors; callers keep their own fail-open or
+    fail-closed handling.
+    """
+    # Held across the request so concurrent callers share one fetch
+    with _balance_snapshot_lock:
+        snapshot = _balance_snapshots.get(account_api)
+        if snapshot is not None and snapshot.age() <= max_age:
+            return snapshot
+        requested_at_ms = int(time.time() * 1000)
+        snapshot = AccountBalanceSnapshot(account_api.get_account_balance(), requested_at_ms)
+        _balance_snapshots[account_api] = snapshot
+        return snapshot
+
+
+def invalidate_balance_snapshot(account_api=None):
+    """Drop cached balances after a fill, sell or cancel (all accounts when ``account_api`` is None)"""
+    with _balance_snapshot_lock:
+        if account_api is None:
+            _balance_snapshots.clear()
+        else:
+            _balance_snapshots.pop(account_api, None)
+
 # Try to import OKX SDK
 try:
     import okx
@@ -123,13 +217,18 @@ class OKXClient:
             # Get trading environment setting
             testnet = os.getenv('OKX_TESTNET', 'false')
             okx_flag = "1" if testnet.lower() == "true" else "0"
+            domain = get_okx_api_domain()
+            domain_kwargs = {'domain': domain} if domain else {}
+            if domain:
+                self.logger.info(f"🧪 Using OKX API domain: {domain}")
             
             # Initialize Market API (public data, no authentication required)
             if MarketData:
                 try:
                     self.market_api = MarketData.MarketAPI(
                         flag=okx_flag,
-                        debug=False
+                        debug=False,
+                        **domain_kwargs
                     )
                     self.logger.info("✅ Market API initialized successfully")
                 except Exception as e:
@@ -140,7 +239,8 @@ class OKXClient:
                 try:
                     self.public_api = PublicData.PublicAPI(
                         flag=okx_flag,
-                        debug=False
+                        debug=False,
+                        **domain_kwargs
                     )
                     self.logger.info("✅ Public API initialized successfully")
                 except Exception as e:
@@ -156,7 +256,8 @@ class OKXClient:
                             api_secret_key=self.secret_key,
                             passphrase=self.passphrase,
                             flag=okx_flag,
-                            debug=False
+                            debug=False,
+                            **domain_kwargs
                         )
                         self.logger.info("✅ Funding API initialized successfully")
                     except Exception as e:
@@ -170,7 +271,8 @@ class OKXClient:
                             api_secret_key=self.secret_key,
                             passphrase=self.passphrase,
                             flag=okx_flag,
-                            debug=False
+                            debug=False,
+                            **domain_kwargs
                         )
                         self.logger.info("✅ Trade API initialized successfully")
                     except Exception as e:
@@ -184,7 +286,8 @@ class OKXClient:
                             api_secret_key=self.secret_key,
                             passphrase=self.passphrase,
                             flag=okx_flag,
-                            debug=False
+                            debug=False,
+                            **domain_kwargs
                         )
                         self.logger.info("✅ Account API initialized successfully")
                     except Exception as e:
@@ -205,6 +308,14 @@ class OKXClient:
                 if self.market_api:
                     self.logger.info("✅ OKX Market API initialized successfully (only public data)")
             
+            # Route every SDK call through the shared per-endpoint rate limiter
+            limiter = get_rate_limiter()
+            self.funding_api = rate_limited(self.funding_api, limiter)
+            self.trade_api = rate_limited(self.trade_api, limiter)
+            self.market_api = rate_limited(self.market_api, limiter)
+            self.account_api = rate_limited(self.account_api, limiter)
+            self.public_api = rate_limited(self.public_api, limiter)
+            
         except Exception as e:
             self.logger.error(f"❌ Failed to initialize OKX API client: {e}")
             self.funding_api = None
@@ -254,19 +365,12 @@ class OKXClient:
         
         try:
             # Get all trading account balances at once
-            result = self.account_api.get_account_balance()
-            if not result or result.get('code') != '0':
-                raise RuntimeError(f"Failed to get trading account balance: {result}")
-            data = result.get('data', [])
-            if not data:
+            snapshot = get_balance_snapshot(self.account_api)
+            if not snapshot.has_data:
                 raise RuntimeError("Trading account balance response contained no data")
-            details = data[0].get('details', [])
-            if not isinstance(details, list):
-                raise RuntimeError("Trading account balance response contained invalid details")
-            self.logger.info("🔎 Trading account balance returned %d currency entries", len(details))
-            for detail in details:
-                ccy = detail.get('ccy')
-                if not ccy or ccy not in affected_cryptos:
+            self.logger.info("🔎 Trading account balance returned %d currency entries", len(snapshot.details))
+            for ccy, detail in snapshot.details.items():
+                if ccy not in affected_cryptos:
                     continue
                 avail = float(detail.get('availBal', 0))
                 total = max(
@@ -313,6 +417,7 @@ class OKXClient:
                 sz=str(available_balance),  # Sell quantity (base currency)
                 tgtCcy="base_ccy"   # Explicitly specify selling by base currency quantity
             )
+            invalidate_balance_snapshot()
             
             error_msg = get_order_operation_error(result, require_data=True)
             if not error_msg:
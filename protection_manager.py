@@ -7,9 +7,22 @@ Responsible for executing complete protection workflow: cancel orders, sell bala
 import subprocess
 import sys
 import logging
-from typing import Set, Optional, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Set, Optional, Tuple
 from okx_client import OKXClient
 
+# (kind, fallback script, description); the kinds are cancelled concurrently
+CANCELLATION_SCRIPTS = (
+    ('triggers', 'cancel_pending_triggers.py', 'Cancel pending trigger orders'),
+    ('limits', 'cancel_pending_limits.py', 'Cancel pending limit orders'),
+)
+
+# One protection run at a time per process: the scheduled delist monitor and
+# the daemon's fill listener may otherwise cancel/sell the same orders at once
+# and overwrite each other's ``cancellation_results``
+_protection_run_lock = threading.RLock()
+
 
 class ProtectionManager:
     """Protection Operation Manager"""
@@ -19,63 +32,99 @@ class ProtectionManager:
                  logger: Optional[logging.Logger] = None):
         self.okx_client = okx_client or OKXClient()
         self.logger = logger or logging.getLogger(__name__)
+        self.cancellation_results: Dict[str, Dict[str, Any]] = {}
+    
+    def _cancel_in_process(self, kind: str, inst_ids=None) -> Dict[str, Any]:
+        """Cancel one order kind with the script's manager class on the shared OKX client"""
+        if kind == 'triggers':
+            from cancel_pending_triggers import OKXOrderManager
+            manager = OKXOrderManager(okx_client=self.okx_client)
+            succeeded = manager.cancel_all_pending_triggers(inst_ids=inst_ids)
+        else:
+            from cancel_pending_limits import OKXLimitOrderManager
+            manager = OKXLimitOrderManager(okx_client=self.okx_client)
+            succeeded = manager.cancel_all_pending_limits(inst_ids=inst_ids)
+        return {'mode': 'in_process', 'succeeded': bool(succeeded), 'orders': getattr(manager, 'cancel_results', [])}
+    
+    def _run_cancellation_script(self, script_name: str, description: str, inst_ids=None) -> bool:
+        """Run one cancellation script in a child interpreter (fallback path)"""
+        try:
+            self.logger.info(f"Executing script: {script_name} - {description}")
+            
+            cmd = [sys.executable, script_name]
+            if inst_ids:
+                cmd.extend(["--inst-ids", ",".join(inst_ids)])
+            
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=300
+            )
+            
+            if result.returncode == 0:
+                self.logger.info(f"✅ {script_name} executed successfully")
+                if result.stdout:
+                    self.logger.debug(f"Script output: {result.stdout}")
+                return True
+            
+            self.logger.error(f"❌ {script_name} execution failed (exit code: {result.returncode})")
+            if result.stderr:
+                self.logger.error(f"Error message: {result.stderr}")
+            if result.stdout:
+                self.logger.debug(f"Script output: {result.stdout}")
+                
+        except subprocess.TimeoutExpired:
+            self.logger.error(f"⏰ {script_name} execution timeout (exceeded 5 minutes)")
+        except FileNotFoundError:
+            self.logger.error(f"❌ Script file not found: {script_name}")
+        except Exception as e:
+            self.logger.error(f"❌ Error occurred while executing {script_name}: {e}")
+        return False
+    
+    def _cancel_orders(self, kind: str, script_name: str, description: str, inst_ids=None) -> Dict[str, Any]:
+        """Cancel one order kind in-process, falling back to its script if that cannot run"""
+        try:
+            return self._cancel_in_process(kind, inst_ids)
+        except (Exception, SystemExit) as e:
+            # SystemExit: the manager classes exit on missing credentials
+            self.logger.warning(f"⚠️ In-process {kind} cancellation failed ({e!r}), falling back to {script_name}")
+        return {'mode': 'subprocess', 'succeeded': self._run_cancellation_script(script_name, description, inst_ids),
+                'orders': []}
     
     def execute_cancellation_scripts(self, inst_ids=None) -> bool:
-        """Execute order cancellation scripts. If inst_ids is provided (list of e.g. BTC-USDT), only cancel orders for those; otherwise cancel all."""
+        """Cancel pending trigger and limit orders. If inst_ids is provided (list of e.g. BTC-USDT), only cancel orders for those; otherwise cancel all.
+
+        Both kinds are cancelled concurrently in this process on the shared OKX
+        client; the cancellation scripts only run as a fallback.  Per-kind and
+        per-order results are left in ``self.cancellation_results``.
+        """
+        with _protection_run_lock:
+            return self._execute_cancellations(inst_ids)
+    
+    def _execute_cancellations(self, inst_ids=None) -> bool:
         self.logger.info("🚨 Starting automatic order cancellation" + (" (affected inst_ids only)" if inst_ids else " (all orders)"))
         
-        # Script paths and their optional args
-        scripts = [
-            ("cancel_pending_triggers.py", "Cancel pending trigger orders", ["--inst-ids"] if inst_ids else []),
-            ("cancel_pending_limits.py", "Cancel pending limit orders", ["--inst-ids"] if inst_ids else []),
-        ]
+        with ThreadPoolExecutor(max_workers=len(CANCELLATION_SCRIPTS)) as executor:
+            futures = {
+                kind: executor.submit(self._cancel_orders, kind, script_name, description, inst_ids)
+                for kind, script_name, description in CANCELLATION_SCRIPTS
+            }
+            self.cancellation_results = {kind: future.result() for kind, future in futures.items()}
         
-        success_count = 0
-        inst_ids_arg = ",".join(inst_ids) if inst_ids else None
+        success_count = sum(1 for result in self.cancellation_results.values() if result['succeeded'])
+        for kind, result in self.cancellation_results.items():
+            cancelled = sum(1 for order in result['orders'] if order['cancelled'])
+            self.logger.info(f"   {kind}: {'✅' if result['succeeded'] else '❌'} ({result['mode']}, "
+                             f"{cancelled}/{len(result['orders'])} orders cancelled)")
+        self.logger.info(f"📊 Order cancellation completed: {success_count}/{len(CANCELLATION_SCRIPTS)} successful")
         
-        for script_name, description, extra_args in scripts:
-            try:
-                self.logger.info(f"Executing script: {script_name} - {description}")
-                
-                cmd = [sys.executable, script_name]
-                if extra_args and inst_ids_arg:
-                    cmd.extend(extra_args)
-                    cmd.append(inst_ids_arg)
-                
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=300
-                )
-                
-                if result.returncode == 0:
-                    self.logger.info(f"✅ {script_name} executed successfully")
-                    if result.stdout:
-                        self.logger.debug(f"Script output: {result.stdout}")
-                    success_count += 1
-                else:
-                    self.logger.error(f"❌ {script_name} execution failed (exit code: {result.returncode})")
-                    if result.stderr:
-                        self.logger.error(f"Error message: {result.stderr}")
-                    if result.stdout:
-                        self.logger.debug(f"Script output: {result.stdout}")
-                        
-            except subprocess.TimeoutExpired:
-                self.logger.error(f"⏰ {script_name} execution timeout (exceeded 5 minutes)")
-            except FileNotFoundError:
-                self.logger.error(f"❌ Script file not found: {script_name}")
-            except Exception as e:
-                self.logger.error(f"❌ Error occurred while executing {script_name}: {e}")
-        
-        self.logger.info(f"📊 Order cancellation script execution completed: {success_count}/{len(scripts)} successful")
-        
-        if success_count == len(scripts):
-            self.logger.info("✅ All order cancellation scripts executed successfully")
+        if success_count == len(CANCELLATION_SCRIPTS):
+            self.logger.info("✅ All pending orders for the requested inst_ids cancelled")
         else:
-            self.logger.warning("⚠️ Some order cancellation scripts failed, please check logs")
+            self.logger.warning("⚠️ Some order cancellations failed, please check logs")
         
-        return success_count == len(scripts)
+        return success_count == len(CANCELLATION_SCRIPTS)
     
     def handle_affected_balances(self, affected_cryptos: Set[str]) -> Tuple[int, int]:
         """Handle affected balances, return (successful sells, total sells)"""
@@ -101,7 +150,11 @@ class ProtectionManager:
 
     
     def execute_full_protection(self, affected_cryptos: Set[str]) -> dict:
-        """Execute complete protection workflow"""
+        """Execute complete protection workflow (serialized with other runs in this process)"""
+        with _protection_run_lock:
+            return self._execute_full_protection(affected_cryptos)
+    
+    def _execute_full_protection(self, affected_cryptos: Set[str]) -> dict:
         if not affected_cryptos:
             self.logger.info("ℹ️ No affected cryptocurrencies, skipping protection operations")
             return {'status': 'skipped', 'reason': 'no_affected_cryptos'}
@@ -122,6 +175,7 @@ class ProtectionManager:
             # Step 1: Cancel only pending orders for affected inst_ids (not all)
             self.logger.info("📋 Step 1: Cancel pending trigger/limit orders for affected inst_ids only")
             results['cancellation_success'] = self.execute_cancellation_scripts(inst_ids=inst_ids)
+            results['cancellations'] = self.cancellation_results
             
             # Step 2: Check and sell affected balances
             self.logger.info("💰 Step 2: Check and sell affected balances")
@@ -159,6 +213,11 @@ class ProtectionManager:
         
         print(f"🎯 Affected cryptocurrencies: {results['affected_cryptos']}")
         print(f"📋 Order cancellation: {'✅ Successful' if results['cancellation_success'] else '❌ Failed'}")
+        for kind, cancellation in results.get('cancellations', {}).items():
+            failed = [order for order in cancellation['orders'] if not order['cancelled']]
+            print(f"   {kind} ({cancellation['mode']}): {len(cancellation['orders']) - len(failed)}/{len(cancellation['orders'])} orders cancelled")
+            for order in failed:
+                print(f"      ❌ {order['inst_id']} {order['order_id']}: {order['error']}")
         
         sell_results = results['sell_results']
         if sell_results['total'] > 0:
@@ -0,0 +1,66 @@
+import unittest
+
+from backtest import run_backtest, sgt_day_start, trade_return
+from utils_candles import BAR_MS
+
+HOUR_MS = 60 * 60 * 1000
+DAY0 = sgt_day_start(1_700_000_000_000)
+
+
+def _day(day, open_price, close=None, dip_hour=None, dip_low=None):
+    """24 hourly bars around ``open_price``; optionally one bar dipping to ``dip_low``"""
+    close = open_price if close is None else close
+    bars = []
+    for hour in range(24):
+        ts = DAY0 + day * BAR_MS + hour * HOUR_MS
+        price = open_price + (close - open_price) * hour / 23
+        low = dip_low if hour == dip_hour else price * 0.999
+        bars.append((ts, price, price * 1.001, low, price, 1.0))
+    return bars
+
+
+class BacktestTests(unittest.TestCase):
+    def test_fill_sells_after_delay_and_yesterday_gain_skips_next_buy(self):
+        candles = (
+            _day(0, 100.0)
+            + _day(1, 100.0, close=120.0, dip_hour=5, dip_low=85.0)  # fills at 90, closes +20%
+            + _day(2, 110.0, dip_hour=3, dip_low=50.0)               # skipped: yesterday > 10%
+            + _day(3, 110.0)
+        )
+        report = run_backtest({'AAA-USDT': candles}, {'AAA-USDT': {'best_limit': 90}},
+                              order_size=100.0, buy_fee=0.001, sell_fee=0.001)
+
+        self.assertEqual(len(report['trades']), 1)
+        trade = report['trades'][0]
+        self.assertEqual(trade['buy_ts'], DAY0 + BAR_MS + 5 * HOUR_MS)
+        self.assertAlmostEqual(trade['buy_price'], 90.0)
+        # Sold at the open of the bar 24h after the fill
+        self.assertEqual(trade['sell_ts'], DAY0 + 2 * BAR_MS + 5 * HOUR_MS)
+        self.assertAlmostEqual(trade['sell_price'], 110.0)
+        self.assertAlmostEqual(trade['pnl'], 100.0 * trade_return(90.0, 110.0, 0.001, 0.001))
+        self.assertEqual(report['summary']['gain_skips'], 1)
+        self.assertEqual(report['summary']['win_rate'], 1.0)
+        self.assertEqual(report['open_lots'], [])
+
+    def test_capacity_cancels_remaining_buys_and_blocks_next_day(self):
+        inst_ids = ['AAA-USDT', 'BBB-USDT', 'CCC-USDT', 'DDD-USDT']
+        candles = {}
+        for offset, inst_id in enumerate(inst_ids):
+            # Pairs dip one after another on day 1; the fourth would fill last
+            candles[inst_id] = (_day(0, 100.0) + _day(1, 100.0, dip_hour=2 + offset, dip_low=80.0)
+                                + _day(2, 100.0, dip_hour=1, dip_low=80.0))
+        configs = {inst_id: {'best_limit': 95} for inst_id in inst_ids}
+
+        report = run_backtest(candles, configs, order_size=100.0, buy_fee=0.0, sell_fee=0.0)
+
+        bought = [trade['inst_id'] for trade in report['trades']]
+        self.assertEqual(sorted(bought), inst_ids[:3])
+        self.assertEqual(report['summary']['capacity_cancels'], 1)
+        # Three lots are still held at day 2's open, so no buys are planned that day
+        self.assertEqual(report['summary']['capacity_days'], 1)
+        self.assertEqual(report['summary']['orders'], 2 * 4)
+        self.assertTrue(all(trade['buy_price'] == 95.0 for trade in report['trades']))
+
+
+if __name__ == '__main__':
+    unittest.main()
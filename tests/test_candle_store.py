@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import utils_candles
+from utils_candles import BAR_MS, RECORD, CandleStore, okx_rows_to_candles
+
+
+def _row(ts, price, confirm='1'):
+    value = str(price)
+    return [str(ts), value, value, value, value, '10', '0', '0', confirm]
+
+
+class _PagedMarketAPI:
+    """Serves daily candles newest first, honouring ``after`` like OKX"""
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: -int(row[0]))
+        self.calls = []
+
+    def _page(self, name, instId, bar, limit, after=None):
+        self.calls.append((name, after))
+        rows = [row for row in self.rows if after is None or int(row[0]) < int(after)]
+        return {'code': '0', 'data': rows[:int(limit)]}
+
+    def get_candlesticks(self, **kwargs):
+        return self._page('get_candlesticks', **kwargs)
+
+    def get_history_candlesticks(self, **kwargs):
+        return self._page('get_history_candlesticks', **kwargs)
+
+
+class CandleStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = CandleStore(self.tmp.name)
+        self.today = 1_700_000_000_000 // BAR_MS * BAR_MS
+
+    def test_sync_pages_history_once_then_fetches_only_newer_bars(self):
+        days = [self.today - BAR_MS * offset for offset in range(250, 0, -1)]
+        api = _PagedMarketAPI([_row(ts, index) for index, ts in enumerate(days)] + [_row(self.today, 999, '0')])
+
+        with patch.object(utils_candles, 'get_today_start_sgt_timestamp_ms', return_value=self.today - BAR_MS):
+            self.assertEqual(self.store.sync('BTC-USDT', api, max_days=1000), 250)
+        self.assertEqual([name for name, _after in api.calls],
+                         ['get_candlesticks', 'get_history_candlesticks', 'get_history_candlesticks'])
+        candles = self.store.read('BTC-USDT')
+        self.assertEqual([candle[0] for candle in candles], days)  # forming bar excluded, oldest first
+        self.assertEqual(self.store.read('BTC-USDT', limit=2)[-1][4], 249.0)
+
+        # Already holding yesterday's bar: no request at all
+        api.calls.clear()
+        with patch.object(utils_candles, 'get_today_start_sgt_timestamp_ms', return_value=self.today):
+            self.assertEqual(self.store.sync('BTC-USDT', api), 0)
+        self.assertEqual(api.calls, [])
+
+        # A day later only the new bar is fetched and appended
+        api.rows.insert(0, _row(self.today, 250))
+        with patch.object(utils_candles, 'get_today_start_sgt_timestamp_ms', return_value=self.today + BAR_MS):
+            self.assertEqual(self.store.sync('BTC-USDT', api), 1)
+        self.assertEqual(api.calls, [('get_candlesticks', None)])
+        self.assertEqual(self.store.last_ts('BTC-USDT'), self.today)
+
+    def test_sync_backfills_a_current_store_holding_too_little_history(self):
+        store = CandleStore(self.tmp.name, bar='1H')
+        hour = 60 * 60 * 1000
+        latest_closed = self.today - hour
+        hours = [latest_closed - hour * offset for offset in range(99, -1, -1)]
+        api = _PagedMarketAPI([_row(ts, index) for index, ts in enumerate(hours)])
+        # Seeded with only the latest closed bar, e.g. by an earlier partial run
+        store.append('BTC-USDT', [(latest_closed, 7.0, 7.0, 7.0, 7.0, 1.0)])
+
+        with patch.object(utils_candles.time, 'time', return_value=self.today / 1000):
+            self.assertTrue(store.is_current('BTC-USDT'))
+            self.assertEqual(store.sync('BTC-USDT', api, max_days=2), 47)
+            self.assertEqual([candle[0] for candle in store.read('BTC-USDT')], hours[-48:])
+            self.assertEqual(store.read('BTC-USDT', limit=1)[0][4], 7.0)  # stored bar kept
+
+            api.calls.clear()
+            self.assertEqual(store.sync('BTC-USDT', api, max_days=2), 0)
+        self.assertEqual(api.calls, [])
+
+    def test_append_okx_rows_only_extends_a_synced_file_without_gaps(self):
+        day = lambda offset: offset * BAR_MS
+        self.assertEqual(self.store.append_okx_rows('SOL-USDT', [_row(day(1), 1)]), 0)
+        self.assertFalse(os.path.exists(self.store.path('SOL-USDT')))
+
+        self.store.append('SOL-USDT', okx_rows_to_candles([_row(day(1), 1)]))
+        self.assertEqual(self.store.append_okx_rows('SOL-USDT', [_row(day(3), 3)]), 0)  # day 2 missing
+        self.assertEqual(self.store.append_okx_rows('SOL-USDT', [_row(day(3), 3), _row(day(2), 2),
+                                                                 _row(day(1), 1), _row(day(4), 4, '0')]), 2)
+        self.assertEqual([candle[0] for candle in self.store.read('SOL-USDT')], [day(1), day(2), day(3)])
+
+    def test_append_skips_stored_bars_and_recovers_from_a_torn_record(self):
+        self.assertEqual(self.store.append('ETH-USDT', okx_rows_to_candles([_row(2, 2), _row(1, 1), _row(3, 3, '0')])), 2)
+        self.assertEqual(self.store.append('ETH-USDT', okx_rows_to_candles([_row(2, 2), _row(1, 1)])), 0)
+
+        with open(self.store.path('ETH-USDT'), 'ab') as f:
+            f.write(b'\x00' * (RECORD.size // 2))
+        self.assertEqual(self.store.count('ETH-USDT'), 2)
+        self.assertEqual(self.store.last_ts('ETH-USDT'), 2)
+
+        self.assertEqual(self.store.append('ETH-USDT', okx_rows_to_candles([_row(4, 4)])), 1)
+        self.assertEqual(os.path.getsize(self.store.path('ETH-USDT')), 3 * RECORD.size)
+        self.assertEqual([candle[0] for candle in self.store.read('ETH-USDT')], [1, 2, 4])
+        self.assertEqual(self.store.read('MISSING-USDT'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import random
+import re
+import unittest
+
+from crypto_matcher import CryptoMatcher
+
+
+def _regex_matches(alias_mapping, text):
+    """Per-alias regex matching the automaton replaced"""
+    found = set()
+    text_upper = text.upper()
+    for crypto, aliases in alias_mapping.items():
+        for alias in aliases:
+            if re.search(rf'(?<![A-Z0-9]){re.escape(alias)}(?![A-Z0-9])', text_upper, re.I):
+                found.add(crypto)
+                break
+    return found
+
+
+def _matcher(cryptos):
+    matcher = CryptoMatcher.__new__(CryptoMatcher)
+    matcher.configured_cryptos = set(cryptos)
+    matcher._create_alias_mapping()
+    return matcher
+
+
+class CryptoMatcherTests(unittest.TestCase):
+    def test_word_boundaries_and_pair_formats(self):
+        matcher = _matcher({'BTC', 'ETH', 'AR', 'X', '1INCH'})
+
+        self.assertEqual(matcher.find_affected_cryptos('OKX to delist WBTC, ETHW and ARB spot trading pairs'), set())
+        self.assertEqual(matcher.find_affected_cryptos('Delisting of btc/usdc, ETHUSDT and AR-EUR'), {'BTC', 'ETH', 'AR'})
+        self.assertEqual(matcher.find_affected_cryptos('OKX to delist X, BSV and 1INCH spot trading pairs'), {'X', '1INCH'})
+        self.assertEqual(matcher.find_affected_cryptos('BTC-ETH'), {'BTC', 'ETH'})
+        self.assertEqual(matcher.find_affected_cryptos(''), set())
+
+    def test_matches_per_alias_regex_on_random_titles(self):
+        rng = random.Random(21)
+        cryptos = {'BTC', 'ETH', 'AR', 'ARB', 'X', 'OXT', 'DOGE', 'SHIB', 'USD', 'BTCUSD', '1INCH', 'K', 'I'}
+        matcher = _matcher(cryptos)
+        tokens = sorted(cryptos) + ['USDT', 'USDC', 'EUR', 'W', 'S', '3L', 'spot', 'delist', 'İ', 'K', 'ß']
+        separators = [' ', '-', '/', '', ', ', '(', ')', '_', '.']
+
+        for _ in range(2000):
+            text = ''.join(rng.choice(tokens) + rng.choice(separators) for _ in range(rng.randint(0, 8)))
+            if rng.random() < 0.5:
+                text = text.lower()
+            self.assertEqual(matcher.find_affected_cryptos(text), _regex_matches(matcher.alias_mapping, text), text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import fill_stream
+from fetch_filled_orders import OKXFilledOrdersFetcher
+from fill_stream import OKXFillStream, order_push_to_fill
+from utils_websocket import (
+    OPCODE_CLOSE, OPCODE_TEXT, decode_frame, encode_frame, websocket_accept_key,
+)
+
+
+ORDER_PUSH = {
+    'instId': 'BTC-USDT', 'ordId': '101', 'clOrdId': 'c101', 'tag': '', 'side': 'buy',
+    'posSide': 'net', 'state': 'filled', 'tradeId': '9001', 'fillPx': '50000',
+    'fillSz': '0.001', 'fillTime': '1700000000000', 'fillFee': '-0.000001',
+    'fillFeeCcy': 'BTC', 'execType': 'M',
+}
+
+
+class _StandInOKXServer:
+    """Local private-channel stand-in: accepts login/subscribe, pushes fills, then drops the first connection."""
+
+    def __init__(self, pushes):
+        self.pushes = pushes
+        self.connections = 0
+        self.received = []
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen()
+        self.url = f"ws://127.0.0.1:{self.sock.getsockname()[1]}/ws/v5/private"
+        self.thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self.thread.start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(conn, self.connections), daemon=True).start()
+
+    def _send(self, conn, payload):
+        text = payload if isinstance(payload, str) else json.dumps(payload)
+        conn.sendall(encode_frame(OPCODE_TEXT, text.encode('utf-8'), mask=False))
+
+    def _serve(self, conn, number):
+        buffer = bytearray()
+        with conn:
+            while b'\r\n\r\n' not in buffer:
+                buffer += conn.recv(4096)
+            head, _, rest = bytes(buffer).partition(b'\r\n\r\n')
+            buffer = bytearray(rest)
+            key = next(line.split(':', 1)[1].strip() for line in head.decode().split('\r\n')
+                       if line.lower().startswith('sec-websocket-key'))
+            conn.sendall((
+                "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {websocket_accept_key(key)}\r\n\r\n"
+            ).encode())
+
+            while True:
+                frame = decode_frame(buffer)
+                if frame is None:
+                    try:
+                        chunk = conn.recv(4096)
+                    except OSError:
+                        return
+                    if not chunk:
+                        return
+                    buffer += chunk
+                    continue
+                _fin, opcode, payload, consumed = frame
+                del buffer[:consumed]
+                if opcode == OPCODE_CLOSE:
+                    return
+                message = payload.decode('utf-8')
+                self.received.append(message)
+                if message == 'ping':
+                    self._send(conn, 'pong')
+                    continue
+                request = json.loads(message)
+                if request['op'] == 'login':
+                    self._send(conn, {'event': 'login', 'code': '0', 'msg': ''})
+                elif request['op'] == 'subscribe':
+                    self._send(conn, {'event': 'subscribe', 'arg': request['args'][0]})
+                    if number == 1:
+                        for push in self.pushes:
+                            self._send(conn, push)
+                        conn.sendall(encode_frame(OPCODE_CLOSE, struct.pack('!H', 1001), mask=False))
+
+    def close(self):
+        self.sock.close()
+
+
+class _RecordingFetcher:
+    def __init__(self):
+        self.events = []
+        self.saved = []
+
+    def fetch_and_save_filled_trades(self, **_kwargs):
+        self.events.append('backfill')
+
+    def save_trades_batch(self, trades):
+        self.events.append('save')
+        self.saved.extend(trades)
+        return len(trades), 0
+
+    def check_and_cancel_triggers_if_needed(self):
+        self.events.append('protect')
+
+    def close(self):
+        self.events.append('close')
+
+
+@patch.dict(os.environ, {'OKX_API_KEY': 'key', 'OKX_SECRET_KEY': 'secret', 'OKX_PASSPHRASE': 'pass'})
+class FillStreamTests(unittest.TestCase):
+    def test_order_push_maps_only_buy_fills_to_trade_rows(self):
+        fill = order_push_to_fill(ORDER_PUSH)
+        self.assertEqual(fill['ts'], '1700000000000')
+        self.assertEqual(fill['fee'], '-0.000001')
+        self.assertEqual(fill['feeCcy'], 'BTC')
+
+        row = OKXFilledOrdersFetcher.__new__(OKXFilledOrdersFetcher).prepare_trade_data(fill)
+        self.assertEqual(row[:3], ('BTC-USDT', '101', '9001'))
+        self.assertEqual(row[7], 1700000000000)
+        self.assertEqual(row[-1], 1700000000000 + 24 * 60 * 60 * 1000)
+
+        self.assertIsNone(order_push_to_fill({**ORDER_PUSH, 'side': 'sell'}))
+        self.assertIsNone(order_push_to_fill({**ORDER_PUSH, 'tradeId': '', 'state': 'live'}))
+        self.assertIsNone(order_push_to_fill({**ORDER_PUSH, 'fillSz': '0'}))
+
+    def test_stream_persists_pushed_fill_and_backfills_after_reconnect(self):
+        server = _StandInOKXServer([
+            {'arg': {'channel': 'orders', 'instType': 'SPOT'}, 'data': [ORDER_PUSH]},
+            {'arg': {'channel': 'orders', 'instType': 'SPOT'}, 'data': [{**ORDER_PUSH, 'tradeId': '', 'fillSz': '0'}]},
+        ])
+        fetcher = _RecordingFetcher()
+        stream = OKXFillStream(fetcher=fetcher, url=server.url)
+
+        with patch.object(fill_stream, 'RECONNECT_MIN_DELAY_SECONDS', 0.01):
+            thread = threading.Thread(target=stream.run, daemon=True)
+            thread.start()
+            deadline = time.monotonic() + 5
+            while fetcher.events.count('backfill') < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            stream.stop()
+            thread.join(timeout=5)
+        server.close()
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([trade['tradeId'] for trade in fetcher.saved], ['9001'])
+        # Subscribe, backfill, persist the push, protect; reconnect and backfill the gap
+        self.assertEqual(fetcher.events[:5], ['backfill', 'save', 'protect', 'close', 'backfill'])
+        self.assertEqual(server.connections, 2)
+        login = json.loads(server.received[0])
+        self.assertEqual(login['op'], 'login')
+        self.assertEqual(set(login['args'][0]), {'apiKey', 'passphrase', 'timestamp', 'sign'})
+        self.assertEqual(json.loads(server.received[1])['args'], [{'channel': 'orders', 'instType': 'SPOT'}])
+
+    def test_fill_protection_holds_the_shared_lock_unless_the_listener_protects(self):
+        lock = threading.Lock()
+        fetcher = _RecordingFetcher()
+        fetcher.check_and_cancel_triggers_if_needed = lambda: fetcher.events.append(('protect', lock.locked()))
+        fetcher.fetch_and_save_filled_trades = lambda **_kwargs: fetcher.events.append(('backfill', lock.locked()))
+        fill = order_push_to_fill(ORDER_PUSH)
+
+        stream = OKXFillStream(fetcher=fetcher, url='ws://unused', protection_lock=lock)
+        stream.backfill()
+        self.assertEqual(stream.handle_fills([fill]), 1)
+        self.assertEqual(fetcher.events, [('backfill', True), 'save', ('protect', True)])
+
+        fetcher.events.clear()
+        stream = OKXFillStream(fetcher=fetcher, url='ws://unused', protection_lock=lock, run_protection=False)
+        self.assertEqual(stream.handle_fills([fill]), 1)
+        self.assertEqual(fetcher.events, ['save'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+
+import limits_optimizer
+from limits_optimizer import evaluate_limits, load_daily_candles, optimize_limits
+from utils_candles import CandleStore
+
+
+def _reference_trades(candles, limit, duration, buy_fee, sell_fee):
+    """Plain-Python simulation the vectorized grid must agree with"""
+    returns = []
+    for day in range(len(candles) - duration):
+        open_price, _high, low, _close = candles[day]
+        buy_price = open_price * limit / 100.0
+        if low <= buy_price:
+            sell_price = candles[day + duration][0]
+            returns.append(sell_price * (1 - sell_fee) / (buy_price * (1 + buy_fee)))
+    return returns
+
+
+class LimitsOptimizerTests(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.candles = {}
+        for inst_id, days in (('AAA-USDT', 120), ('BBB-USDT', 80), ('CCC-USDT', 2)):
+            opens = 100 * np.cumprod(1 + rng.normal(0, 0.03, days))
+            lows = opens * (1 - rng.uniform(0, 0.2, days))
+            highs = opens * (1 + rng.uniform(0, 0.1, days))
+            closes = lows + (highs - lows) * rng.uniform(0, 1, days)
+            self.candles[inst_id] = np.column_stack([opens, highs, lows, closes])
+
+    def test_grid_matches_per_trade_simulation_for_every_pair_and_limit(self):
+        limits = np.arange(80, 100)
+        padded = limits_optimizer._pad_candles([self.candles['AAA-USDT'], self.candles['BBB-USDT']])
+        metrics = evaluate_limits(padded, limits, duration=2, buy_fee=0.001, sell_fee=0.002)
+
+        for row, inst_id in enumerate(('AAA-USDT', 'BBB-USDT')):
+            for column, limit in enumerate(limits):
+                trades = _reference_trades(self.candles[inst_id].tolist(), limit, 2, 0.001, 0.002)
+                self.assertEqual(metrics['trade_count'][row, column], len(trades))
+                if trades:
+                    self.assertAlmostEqual(metrics['max_returns'][row, column], float(np.prod(trades)))
+                    self.assertAlmostEqual(metrics['avg_return_per_trade'][row, column], float(np.mean(trades)) - 1)
+                    self.assertAlmostEqual(metrics['median_earn'][row, column], float(np.median(trades)) - 1)
+                    self.assertAlmostEqual(metrics['win_rate'][row, column], sum(t > 1 for t in trades) / len(trades))
+
+    def test_best_limit_respects_trade_filters_and_fits_limits_config(self):
+        config = optimize_limits(self.candles, duration=1, limit_range=(80, 99), min_trades=5,
+                                 min_avg_earn=-1.0, chunk_size=1)
+        self.assertEqual(config['strategy_params']['limit_range'], [80, 99])
+        self.assertNotIn('CCC-USDT', config['crypto_configs'])
+        for inst_id, crypto_config in config['crypto_configs'].items():
+            self.assertGreaterEqual(crypto_config['trade_count'], 5)
+            self.assertTrue(80 <= crypto_config['best_limit'] <= 99)
+            candidates = [
+                np.prod(trades) for limit in range(80, 100)
+                for trades in [_reference_trades(self.candles[inst_id].tolist(), limit, 1, 0.001, 0.001)]
+                if len(trades) >= 5
+            ]
+            self.assertAlmostEqual(crypto_config['max_returns'], round(float(max(candidates)), 6))
+
+    def test_merge_keeps_previous_pairs_the_run_did_not_update(self):
+        config = optimize_limits(self.candles, duration=1, limit_range=(80, 99), min_trades=5, min_avg_earn=-1.0)
+        previous = {'CCC-USDT': {'best_limit': 70}, 'AAA-USDT': {'best_limit': 1}, 'ZZZ-USDT': {'best_limit': 95}}
+
+        merged = limits_optimizer.merge_crypto_configs(config, previous)
+        self.assertEqual(list(merged['crypto_configs']), ['AAA-USDT', 'BBB-USDT', 'CCC-USDT', 'ZZZ-USDT'])
+        self.assertEqual(merged['crypto_configs']['AAA-USDT'], config['crypto_configs']['AAA-USDT'])
+        self.assertEqual(merged['crypto_configs']['CCC-USDT'], {'best_limit': 70})
+        self.assertEqual(merged['strategy_params'], config['strategy_params'])
+        self.assertNotIn('ZZZ-USDT', config['crypto_configs'])
+
+    def test_candles_are_read_from_the_local_store_as_ohlc_columns(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as root:
+            store = CandleStore(root)
+            store.append('AAA-USDT', [(day, *row, 0.0) for day, row in enumerate(self.candles['AAA-USDT'].tolist())])
+            candles = load_daily_candles(store, 'AAA-USDT', days=30)
+        np.testing.assert_array_equal(candles, self.candles['AAA-USDT'][-30:])
+
+
+if __name__ == '__main__':
+    unittest.main()
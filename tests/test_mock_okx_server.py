@@ -0,0 +1,69 @@
+import json
+import unittest
+import urllib.error
+import urllib.request
+
+from mock_okx_server import MockExchange, MockOKXServer
+
+
+class MockOKXServerTests(unittest.TestCase):
+    def setUp(self):
+        self.exchange = MockExchange(pairs=3, fill_rate=0.0)
+        self.server = MockOKXServer(self.exchange)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.server.url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read())
+
+    def test_trigger_lifecycle_and_call_accounting(self):
+        placed = self._request('POST', '/api/v5/trade/order-algo', {
+            'instId': 'MOCK001-USDT', 'tdMode': 'cash', 'side': 'buy', 'ordType': 'trigger',
+            'sz': '5', 'triggerPx': '1.9', 'orderPx': '1.9',
+        })
+        algo_id = placed['data'][0]['algoId']
+        pending = self._request('GET', '/api/v5/trade/orders-algo-pending?ordType=trigger')
+        self.assertEqual([order['algoId'] for order in pending['data']], [algo_id])
+
+        cancelled = self._request('POST', '/api/v5/trade/cancel-algos', [{'instId': 'MOCK001-USDT', 'algoId': algo_id}])
+        self.assertEqual(cancelled['data'][0]['sCode'], '0')
+        self.assertEqual(self._request('GET', '/api/v5/trade/orders-algo-pending?ordType=trigger')['data'], [])
+
+        stats = self.server.stats()
+        self.assertEqual(stats['calls'], 4)
+        self.assertEqual(stats['by_endpoint']['GET /api/v5/trade/orders-algo-pending'], 2)
+
+    def test_filled_buy_shows_up_in_fills_and_balance(self):
+        self.exchange.fill_rate = 1.0
+        self._request('POST', '/api/v5/trade/order-algo', {
+            'instId': 'MOCK002-USDT', 'side': 'buy', 'ordType': 'trigger', 'sz': '4', 'triggerPx': '2.5', 'orderPx': '2.5',
+        })
+
+        fills = self._request('GET', '/api/v5/trade/fills?instType=SPOT')['data']
+        self.assertEqual([(fill['instId'], fill['side'], fill['fillPx']) for fill in fills], [('MOCK002-USDT', 'buy', '2.5')])
+        details = {d['ccy']: d for d in self._request('GET', '/api/v5/account/balance')['data'][0]['details']}
+        self.assertEqual(details['MOCK002']['availBal'], '4')
+        self.assertEqual(details['MOCK002']['eqUsd'], '12')
+
+    def test_rate_limit_returns_429_after_endpoint_burst(self):
+        self.server.rate_limit = 2
+        self._request('GET', '/api/v5/public/instruments?instType=SPOT')
+        self._request('GET', '/api/v5/public/instruments?instType=SPOT')
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            self._request('GET', '/api/v5/public/instruments?instType=SPOT')
+        self.assertEqual(raised.exception.code, 429)
+        self.assertEqual(json.loads(raised.exception.read())['code'], '50011')
+        # Other endpoints have their own window
+        self.assertEqual(self._request('GET', '/api/v5/market/ticker?instId=MOCK000-USDT')['code'], '0')
+        self.assertEqual(self.server.stats()['rate_limited'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
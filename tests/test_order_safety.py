@@ -1,4 +1,8 @@
 import logging
+import os
+import tempfile
+import threading
+import time
 import unittest
 from decimal import Decimal
 from unittest.mock import patch
@@ -8,9 +12,16 @@ from cancel_pending_limits import OKXLimitOrderManager
 from cancel_pending_triggers import OKXOrderManager
 from create_algo_triggers import OKXAlgoTrigger
 from fetch_filled_orders import OKXFilledOrdersFetcher
-from okx_client import OKXClient, get_order_operation_error
+from okx_client import OKXClient, get_balance_snapshot, get_order_operation_error
 from monitor_delist import OKXDelistMonitor
 from protection_manager import ProtectionManager
+from utils_rate_limit import RateLimiter, rate_limited
+from utils_instruments import InstrumentRulesStore
+from utils_deduplication import DeduplicationManager, PostgresDedupStore
+from blacklist_manager import BlacklistManager
+import lib.database as database
+import migrate_filled_orders
+import trading_daemon
 
 
 class _TradeAPI:
@@ -121,6 +132,21 @@ class OrderSafetyTests(unittest.TestCase):
         )
         self.assertEqual(seller.trade_api.last_place_order_kwargs['sz'], '0.01')
 
+    def test_seller_adds_missing_sell_client_order_id_column_once(self):
+        seller = AutoSellOrders.__new__(AutoSellOrders)
+        seller.logger = logging.getLogger('test-auto-sell')
+        seller.cursor = _Cursor([])
+        seller.conn = _Connection()
+
+        with patch('auto_sell_orders._sell_state_columns_ready', False):
+            seller.ensure_sell_state_columns()
+            seller.ensure_sell_state_columns()
+
+        statements = [statement for statement, _params in seller.cursor.executed]
+        self.assertEqual(len(statements), 2)
+        self.assertIn('information_schema.columns', statements[0])
+        self.assertEqual(statements[1], 'ALTER TABLE filled_orders ADD COLUMN IF NOT EXISTS sell_client_order_id TEXT')
+
     def test_unconfirmed_sell_is_retained_for_verification(self):
         seller = AutoSellOrders.__new__(AutoSellOrders)
         seller.logger = logging.getLogger('test-auto-sell')
@@ -168,6 +194,101 @@ class OrderSafetyTests(unittest.TestCase):
         seller.process_sell_orders()
         self.assertEqual(marked, ['trade-1'])
 
+    def test_interrupted_sells_are_recovered_from_one_orders_history_page(self):
+        seller = AutoSellOrders.__new__(AutoSellOrders)
+        seller.logger = logging.getLogger('test-auto-sell')
+        history_calls = []
+        seller.trade_api = _TradeAPI(None)
+        seller.trade_api.get_orders_history = lambda **kwargs: history_calls.append(kwargs) or {
+            'code': '0',
+            'data': [
+                {'ordId': 'sell-1', 'clOrdId': '', 'state': 'filled'},
+                {'ordId': 'sell-x', 'clOrdId': seller._sell_client_order_id('trade-2'), 'state': 'canceled'},
+            ],
+        }
+        checked = []
+        seller.get_market_sell_state = lambda inst_id, order_id=None, client_order_id=None: (
+            checked.append(order_id or client_order_id) or 'PENDING'
+        )
+        orders = [
+            ('BTC-USDT', 'buy-1', 'trade-1', '1', 'buy', 1000, 2000, '1', 'SELL_SUBMITTED', 'sell-1'),
+            ('ETH-USDT', 'buy-2', 'trade-2', '1', 'buy', 1000, 3000, '1', 'PROCESSING', None),
+            ('SOL-USDT', 'buy-3', 'trade-3', '1', 'buy', 1000, 4000, '1', 'SELL_SUBMITTED', 'sell-3'),
+            ('XRP-USDT', 'buy-4', 'trade-4', '1', 'buy', 1000, 5000, '1', None, None),
+        ]
+
+        states = seller.recover_pending_sell_states(orders)
+
+        self.assertEqual(states, {'trade-1': 'FILLED', 'trade-2': 'FAILED', 'trade-3': 'PENDING'})
+        self.assertEqual(len(history_calls), 1)
+        self.assertEqual(history_calls[0]['ordType'], 'market')
+        self.assertEqual(int(history_calls[0]['begin']), 2000 - 60 * 60 * 1000)
+        self.assertEqual(checked, ['sell-3'])
+
+    def test_aggregated_lots_are_sold_in_one_order_recorded_against_every_trade(self):
+        seller = AutoSellOrders.__new__(AutoSellOrders)
+        seller.logger = logging.getLogger('test-auto-sell')
+        seller.aggregate_lots = True
+        seller.cursor = _Cursor([('trade-1',), ('trade-2',), ('trade-3',)])
+        seller.cursor.rowcount = 3
+        seller.conn = _Connection()
+        seller.has_significant_non_usdt_assets = lambda: True
+        seller.ensure_database_initialized = lambda: None
+        seller.normalize_pending_sell_times = lambda: None
+        seller.get_orders_ready_to_sell = lambda: [
+            ('BTC-USDT', 'buy-1', 'trade-1', '0.15', 'buy', 1, 1, '1', None, None, None),
+            ('BTC-USDT', 'buy-1', 'trade-2', '0.15', 'buy', 1, 1, '1', None, None, None),
+            ('BTC-USDT', 'buy-2', 'trade-3', '0.15', 'buy', 1, 1, '1', None, None, None),
+        ]
+        placed = []
+        seller.place_market_sell_order = lambda inst_id, size, client_order_id: (
+            placed.append((inst_id, size, client_order_id)) or ('FILLED', 'sell-1')
+        )
+        marked = []
+        seller.mark_trades_as_sold_batch = lambda trade_ids: marked.extend(trade_ids) or len(trade_ids)
+        seller.mark_trigger_rebuild_pending = lambda _trade_ids: True
+        seller.has_pending_trigger_rebuild = lambda: False
+
+        seller.process_sell_orders()
+
+        client_order_id = seller._group_client_order_id(['trade-3', 'trade-1', 'trade-2'])
+        self.assertEqual(placed, [('BTC-USDT', '0.45', client_order_id)])
+        lock, submitted = [params for _statement, params in seller.cursor.executed]
+        self.assertEqual(lock, (client_order_id, ['trade-1', 'trade-2', 'trade-3']))
+        self.assertEqual(submitted, ('sell-1', ['trade-1', 'trade-2', 'trade-3']))
+        self.assertEqual(marked, ['trade-1', 'trade-2', 'trade-3'])
+        self.assertEqual(seller._group_client_order_id(['trade-1']), seller._sell_client_order_id('trade-1'))
+
+    def test_sell_scheduler_wakes_at_the_next_due_time_and_logs_lateness(self):
+        import threading
+        from utils_time import datetime_to_timestamp_ms, get_utc_now
+
+        seller = AutoSellOrders.__new__(AutoSellOrders)
+        seller.logger = logging.getLogger('test-auto-sell')
+        seller.stop_event = threading.Event()
+        seller.wake_event = threading.Event()
+        seller.ensure_database_initialized = lambda: None
+        seller.close = lambda: None
+        due_ms = datetime_to_timestamp_ms(get_utc_now()) + 200
+        seller.get_unsold_sell_times = lambda: [(due_ms + 24 * 60 * 60 * 1000, 'trade-2'), (due_ms, 'trade-1')]
+        passes = []
+
+        def process_sell_orders():
+            passes.append(datetime_to_timestamp_ms(get_utc_now()))
+            if len(passes) == 1:
+                return []  # startup reconcile pass, nothing due yet
+            seller.stop()
+            return ['trade-1']
+
+        seller.process_sell_orders = process_sell_orders
+        with self.assertLogs('test-auto-sell', level='INFO') as logs:
+            seller.run_sell_scheduler(refresh_seconds=3600, reconcile_seconds=3600)
+
+        self.assertEqual(len(passes), 2)
+        self.assertGreaterEqual(passes[1], due_ms)
+        self.assertLess(passes[1] - due_ms, 2000)
+        self.assertTrue(any('trade-1 sold' in line and 'after its due time' in line for line in logs.output))
+
     def test_trigger_rebuild_failure_after_filled_sell_propagates(self):
         seller = AutoSellOrders.__new__(AutoSellOrders)
         seller.logger = logging.getLogger('test-auto-sell')
@@ -207,6 +328,63 @@ class OrderSafetyTests(unittest.TestCase):
         manager.handle_affected_balances = lambda _cryptos: (0, 1)
         self.assertEqual(manager.execute_full_protection({'BTC'})['status'], 'failed')
 
+    def test_protection_cancels_both_kinds_concurrently_and_falls_back_to_scripts(self):
+        manager = ProtectionManager()
+        both_started = threading.Barrier(2, timeout=5)
+        scripts = []
+
+        def in_process(kind, inst_ids):
+            both_started.wait()
+            if kind == 'limits':
+                raise SystemExit(1)
+            return {'mode': 'in_process', 'succeeded': True, 'orders': [
+                {'inst_id': inst_ids[0], 'order_id': '7', 'order_type': 'trigger', 'cancelled': True, 'error': None},
+            ]}
+
+        manager._cancel_in_process = in_process
+        manager._run_cancellation_script = lambda script, _description, inst_ids: scripts.append((script, inst_ids)) or True
+        manager.handle_affected_balances = lambda _cryptos: (0, 0)
+
+        results = manager.execute_full_protection({'BTC'})
+        self.assertEqual(results['status'], 'completed')
+        self.assertEqual(scripts, [('cancel_pending_limits.py', ['BTC-USDT'])])
+        self.assertEqual(results['cancellations']['triggers']['mode'], 'in_process')
+        self.assertEqual(results['cancellations']['triggers']['orders'][0]['order_id'], '7')
+        self.assertEqual(results['cancellations']['limits'], {'mode': 'subprocess', 'succeeded': True, 'orders': []})
+
+    def test_protection_runs_are_serialized_across_managers(self):
+        active = []
+        overlaps = []
+
+        def in_process(kind, inst_ids):
+            active.append(kind)
+            overlaps.append(len(active))
+            time.sleep(0.01)
+            active.remove(kind)
+            return {'mode': 'in_process', 'succeeded': True, 'orders': [
+                {'inst_id': inst_ids[0], 'order_id': kind, 'order_type': kind, 'cancelled': True, 'error': None},
+            ]}
+
+        managers = [ProtectionManager(), ProtectionManager()]
+        results = {}
+        for manager in managers:
+            manager._cancel_in_process = in_process
+            manager.handle_affected_balances = lambda _cryptos: (0, 0)
+        threads = [
+            threading.Thread(target=lambda m=manager, c=crypto: results.__setitem__(c, m.execute_full_protection({c})))
+            for manager, crypto in zip(managers, ('BTC', 'ETH'))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Within a run both kinds overlap; two runs never do
+        self.assertLessEqual(max(overlaps), 2)
+        for crypto in ('BTC', 'ETH'):
+            orders = [order for kind in results[crypto]['cancellations'].values() for order in kind['orders']]
+            self.assertEqual({order['inst_id'] for order in orders}, {f'{crypto}-USDT'})
+
     def test_affected_balance_query_fails_closed_on_api_error_or_frozen_balance(self):
         client = OKXClient.__new__(OKXClient)
         client.logger = logging.getLogger('test-okx-client')
@@ -230,6 +408,27 @@ class OrderSafetyTests(unittest.TestCase):
         with self.assertRaisesRegex(RuntimeError, 'cancel failed'):
             fetcher.check_and_cancel_triggers_if_needed()
 
+    def test_live_capacity_checks_share_one_limit(self):
+        cancelled = []
+        fetcher = OKXFilledOrdersFetcher.__new__(OKXFilledOrdersFetcher)
+        fetcher.auto_mark_manual_sells = lambda: 0
+        fetcher.count_active_trading_currencies = lambda: 2
+        fetcher.cancel_all_trigger_orders = lambda: cancelled.append(True)
+
+        trigger = OKXAlgoTrigger.__new__(OKXAlgoTrigger)
+        trigger._get_significant_non_usdt_assets = lambda: [('BTC', 10.0), ('ETH', 10.0)]
+        trigger.blacklist_manager = type('Blacklist', (), {'get_blacklisted_cryptos': lambda self: None})()
+
+        with patch('fetch_filled_orders.MAX_ACTIVE_TRADING_CURRENCIES', 2), \
+                patch('config_manager.ConfigManager') as config_manager:
+            config_manager.return_value.load_full_config.return_value = {
+                'crypto_configs': {'SOL-USDT': {'best_limit': '90'}},
+            }
+            fetcher.check_and_cancel_triggers_if_needed()
+            # At capacity the trigger run stops before it ever reads the blacklist
+            self.assertTrue(trigger.process_limits_from_database())
+        self.assertEqual(cancelled, [True])
+
     def test_account_only_trigger_protection_fails_closed(self):
         fetcher = OKXFilledOrdersFetcher.__new__(OKXFilledOrdersFetcher)
         fetcher.okx_client = _OKXClientWithAccount(_AccountAPI({'code': '50000', 'msg': 'temporary error'}))
@@ -272,6 +471,119 @@ class OrderSafetyTests(unittest.TestCase):
             with self.assertRaisesRegex(RuntimeError, 'Unable to fetch OKX delist announcements'):
                 monitor.fetch_delist_announcements()
 
+    def test_delist_crawl_pages_until_window_then_stops_at_stored_ptime(self):
+        monitor = OKXDelistMonitor.__new__(OKXDelistMonitor)
+        monitor.logger = logging.getLogger('test-monitor-delist')
+        hour_ms = 60 * 60 * 1000
+        now_ms = 1_800_000_000_000
+        # Pages of 2, newest first: page 3 is the first one to reach past 24h
+        pages = {
+            page: [{'title': f"Delist spot {page}-{index}", 'pTime': str(now_ms - (page * 2 + index) * 4 * hour_ms)}
+                   for index in range(2)]
+            for page in range(1, 7)
+        }
+        requested = []
+
+        def fetch_page(page, conditional_headers=None):
+            requested.append((page, conditional_headers))
+            if conditional_headers and conditional_headers.get('If-None-Match') == 'v2':
+                return [], {'not_modified': True, 'total_pages': 6, 'etag': 'v2', 'last_modified': None}
+            return pages[page], {'not_modified': False, 'total_pages': 6, 'etag': 'v1', 'last_modified': None}
+
+        monitor._fetch_announcements_page = fetch_page
+        with tempfile.TemporaryDirectory() as tmpdir, patch('monitor_delist.time.time', return_value=now_ms / 1000):
+            monitor.state_path = os.path.join(tmpdir, 'state.json')
+
+            announcements, state = monitor.crawl_recent_announcements()
+            self.assertEqual(sorted(page for page, _ in requested), [1, 2, 3, 4])
+            self.assertEqual(len(announcements), 6)
+            self.assertEqual(state['newest_ptime'], int(pages[1][0]['pTime']))
+            monitor.save_crawl_state(state)
+
+            # Nothing newer on page 1: one conditional request and nothing to handle
+            requested.clear()
+            self.assertEqual(monitor.crawl_recent_announcements()[0], [])
+            self.assertEqual(requested, [(1, {'If-None-Match': 'v1'})])
+
+            # Newer announcements: crawl only down to the stored pTime
+            pages[1] = [{'title': 'Delist spot new', 'pTime': str(now_ms)}, pages[1][0]]
+            requested.clear()
+            announcements, state = monitor.crawl_recent_announcements()
+            self.assertEqual([page for page, _ in requested], [1])
+            self.assertEqual(state['newest_ptime'], now_ms)
+
+            monitor.save_crawl_state(dict(state, etag='v2'))
+            self.assertEqual(monitor.crawl_recent_announcements(), ([], None))
+
+    def test_dedup_store_survives_runs_and_batches_cache_misses(self):
+        class _Store:
+            def __init__(self):
+                self.rows = {}
+                self.lookups = []
+                self.writes = []
+
+            def get_many(self, action_ids, now_ms):
+                self.lookups.append(list(action_ids))
+                return {a: p for a, (p, expires) in self.rows.items() if a in action_ids and expires > now_ms}
+
+            def put_many(self, action_ids, action_type, processed_ms, expires_ms):
+                self.writes.append(list(action_ids))
+                for action_id in action_ids:
+                    self.rows[action_id] = (processed_ms, expires_ms)
+
+        store = _Store()
+        DeduplicationManager(store=store).mark_processed('delist_announcement', announcement_id='a')
+        DeduplicationManager(store=store).mark_processed_many('delist_announcement', [
+            {'announcement_id': i} for i in ('d', 'e', 'f')
+        ])
+        self.assertEqual([len(write) for write in store.writes], [1, 3])
+
+        # A fresh process resolves the whole page with one lookup, then serves repeats from memory
+        manager = DeduplicationManager(store=store)
+        params = [{'announcement_id': i} for i in ('a', 'b', 'c')]
+        self.assertEqual(manager.is_processed_many('delist_announcement', params), [True, False, False])
+        self.assertEqual(len(store.lookups), 1)
+        self.assertEqual(len(store.lookups[0]), 3)
+        self.assertTrue(manager.is_processed('delist_announcement', announcement_id='a'))
+        self.assertEqual(len(store.lookups), 1)
+
+        def _failing(*_args):
+            raise RuntimeError('database unavailable')
+        store.get_many = _failing
+        self.assertFalse(DeduplicationManager(store=store).is_processed('delist_announcement', announcement_id='a'))
+
+    def test_dedup_table_is_marked_ready_only_after_its_commit(self):
+        cursor = _Cursor([])
+
+        class _FlakyConnection:
+            def __init__(self):
+                self.commit_failures = 1
+                self.rollbacks = 0
+
+            def cursor(self):
+                return type('Ctx', (), {'__enter__': lambda _s: cursor, '__exit__': lambda _s, *_a: False})()
+
+            def commit(self):
+                if self.commit_failures:
+                    self.commit_failures -= 1
+                    raise RuntimeError('could not serialize access')
+
+            def rollback(self):
+                self.rollbacks += 1
+
+        store = PostgresDedupStore()
+        conn = _FlakyConnection()
+        with self.assertRaises(RuntimeError):
+            store._ensure_table(conn)
+        self.assertFalse(store._table_ready)
+        self.assertEqual(conn.rollbacks, 1)
+
+        store._ensure_table(conn)
+        store._ensure_table(conn)
+        self.assertTrue(store._table_ready)
+        creates = [statement for statement, _ in cursor.executed if 'CREATE TABLE' in statement]
+        self.assertEqual(len(creates), 2)
+
     def test_pending_order_query_errors_are_not_treated_as_empty(self):
         limit_manager = OKXLimitOrderManager.__new__(OKXLimitOrderManager)
         limit_manager.trade_api = type('TradeAPI', (), {
@@ -354,6 +666,35 @@ class OrderSafetyTests(unittest.TestCase):
         self.assertEqual(len(updates), 1)
         self.assertIn('AND sold_status IS NULL', updates[0])
 
+    def test_manual_sell_reconciliation_marks_all_settled_instruments_in_one_update(self):
+        fetcher = OKXFilledOrdersFetcher.__new__(OKXFilledOrdersFetcher)
+        fetcher.ensure_database_initialized = lambda: None
+        fetcher.cursor = _Cursor([('BTC-USDT',), ('ETH-USDT',), ('SOL-USDT',), ('DOGE-USDT',)])
+        fetcher.conn = _Connection()
+        balance_api = _BalanceAPI({'code': '0', 'data': [{'details': []}]})
+        # A snapshot cached before a fill (DOGE not yet bought) must not be reused
+        get_balance_snapshot(balance_api)
+        balance_api.result = {
+            'code': '0',
+            'data': [{'details': [
+                {'ccy': 'BTC', 'eqUsd': '50', 'frozenBal': '0', 'ordFrozen': '0'},
+                {'ccy': 'ETH', 'eqUsd': '0.001', 'frozenBal': '0', 'ordFrozen': '0.5'},
+                {'ccy': 'SOL', 'eqUsd': '0.001', 'frozenBal': '0', 'ordFrozen': '0'},
+                {'ccy': 'DOGE', 'eqUsd': '12', 'frozenBal': '0', 'ordFrozen': '0'},
+            ]}],
+        }
+        fetcher.okx_client = _OKXClientWithAccount(balance_api)
+
+        with patch('okx_client.time.time', return_value=1700000000.0):
+            fetcher.auto_mark_manual_sells()
+
+        updates = [(statement, params) for statement, params in fetcher.cursor.executed if 'SET sold_status' in statement]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('instId = ANY(%s)', updates[0][0])
+        self.assertIn('AND ts < %s', updates[0][0])
+        # Lots that filled within a minute of the balance request wait for the next run
+        self.assertEqual(updates[0][1], (['SOL-USDT'], 1700000000000 - 60 * 1000))
+
     def test_trigger_cancellation_uses_final_exchange_state_not_transient_batch_errors(self):
         manager = OKXOrderManager.__new__(OKXOrderManager)
         order = {'instId': 'BTC-USDT', 'algoId': '1', 'ordType': 'trigger'}
@@ -363,6 +704,9 @@ class OrderSafetyTests(unittest.TestCase):
 
         with patch('cancel_pending_triggers.time.sleep'):
             self.assertTrue(manager.cancel_all_pending_triggers())
+        self.assertEqual(manager.cancel_results, [
+            {'inst_id': 'BTC-USDT', 'order_id': '1', 'order_type': 'trigger', 'cancelled': True, 'error': None},
+        ])
 
     def test_yesterday_gain_filter_uses_strict_ten_percent_threshold(self):
         class _MarketAPI:
@@ -395,10 +739,10 @@ class OrderSafetyTests(unittest.TestCase):
         trigger_creator.trade_api = object()
         trigger_creator.should_skip_buy_for_yesterday_gain = lambda _inst_id: True
 
-        self.assertFalse(
-            trigger_creator._place_limit_buy_order.__wrapped__(
-                trigger_creator, 'BTC-USDT', '90'
-            )
+        # trade_api has no order methods: any placement attempt would raise
+        self.assertEqual(
+            trigger_creator._place_limit_buy_orders_batch([('BTC-USDT', '90')]),
+            {'BTC-USDT': ('BTC-USDT', 'Skipped due to yesterday gain above 10%', False)},
         )
         self.assertFalse(
             trigger_creator._create_trigger_order_internal.__wrapped__(
@@ -407,10 +751,678 @@ class OrderSafetyTests(unittest.TestCase):
         )
 
         trigger_creator.get_crypto_data = lambda _inst_id: self.fail('must not fetch today open')
-        result = trigger_creator._process_single_limit_pair(
+        result = trigger_creator._plan_single_limit_pair(
             'BTC-USDT', {'best_limit': '90'}, set()
         )
-        self.assertEqual(result, ('BTC-USDT', 'Skipped due to yesterday gain above 10%', False))
+        self.assertEqual(result, (('BTC-USDT', 'Skipped due to yesterday gain above 10%', False), None))
+
+    def test_concurrent_trigger_summary_keeps_configuration_order(self):
+        trigger_creator = OKXAlgoTrigger.__new__(OKXAlgoTrigger)
+        trigger_creator.max_workers = 4
+        trigger_creator._get_significant_non_usdt_assets = lambda: []
+        trigger_creator.prefetch_market_data = lambda _inst_ids: None
+        trigger_creator.blacklist_manager = type('Blacklist', (), {'get_blacklisted_cryptos': lambda _self: set()})()
+        configs = {f'C{i}-USDT': {'best_limit': '90'} for i in range(8)}
+        processed = []
+
+        def plan(inst_id, _config, _blacklisted):
+            processed.append(inst_id)
+            return (inst_id, 'Order failed', inst_id.startswith('C1')), None
+
+        trigger_creator._plan_single_limit_pair = plan
+        with patch('config_manager.ConfigManager') as config_manager, \
+                patch('create_algo_triggers.logger') as test_logger:
+            config_manager.return_value.load_full_config.return_value = {'crypto_configs': configs}
+            self.assertFalse(trigger_creator.process_limits_from_database())
+
+        self.assertCountEqual(processed, list(configs))
+        failures = [
+            call.args[0].strip().split(':')[0]
+            for call in test_logger.warning.call_args_list
+            if call.args[0].startswith('   ')
+        ]
+        self.assertEqual(failures, [inst_id for inst_id in configs if not inst_id.startswith('C1')])
+
+    def test_prefetch_serves_pair_loop_from_cache(self):
+        class _MarketAPI:
+            def __init__(self):
+                self.calls = []
+
+            def get_tickers(self, **kwargs):
+                self.calls.append(('get_tickers', kwargs))
+                return {'code': '0', 'data': [
+                    {'instId': 'BTC-USDT', 'last': '95'},
+                    {'instId': 'ETH-USDT', 'last': '0'},
+                    {'instId': 'DOGE-USDT', 'last': '1'},
+                ]}
+
+            def get_candlesticks(self, **kwargs):
+                self.calls.append(('get_candlesticks', kwargs['instId']))
+                return {'code': '0', 'data': [['today', '100'], ['yesterday', '100', '101', '99', '100']]}
+
+            def get_ticker(self, **kwargs):
+                self.calls.append(('get_ticker', kwargs['instId']))
+                return {'code': '0', 'data': [{'last': '3000'}]}
+
+        trigger_creator = OKXAlgoTrigger.__new__(OKXAlgoTrigger)
+        trigger_creator.data_cache = {}
+        trigger_creator.max_workers = 2
+        trigger_creator.market_api = _MarketAPI()
+
+        trigger_creator.prefetch_market_data(['BTC-USDT', 'ETH-USDT'])
+        prefetch_calls = list(trigger_creator.market_api.calls)
+
+        self.assertEqual(trigger_creator.get_current_price('BTC-USDT'), Decimal('95'))
+        self.assertEqual(trigger_creator.get_crypto_data.__wrapped__(trigger_creator, 'BTC-USDT'), Decimal('100'))
+        self.assertFalse(trigger_creator.should_skip_buy_for_yesterday_gain('ETH-USDT'))
+        self.assertEqual(trigger_creator.market_api.calls, prefetch_calls)
+        self.assertEqual(sum(1 for name, _ in prefetch_calls if name == 'get_tickers'), 1)
+        self.assertCountEqual(
+            [arg for name, arg in prefetch_calls if name == 'get_candlesticks'],
+            ['BTC-USDT', 'ETH-USDT'],
+        )
+
+        # A pair without a usable prefetched ticker falls back to the per-pair API
+        self.assertEqual(trigger_creator.get_current_price('ETH-USDT'), Decimal('3000'))
+
+    def test_batch_limit_buys_map_per_order_results_back_to_pairs(self):
+        class _BatchTradeAPI:
+            def __init__(self):
+                self.batches = []
+
+            def place_multiple_orders(self, orders):
+                self.batches.append(orders)
+                return {'code': '2', 'msg': '', 'data': [
+                    {'sCode': '51008', 'sMsg': 'insufficient balance'} if order['instId'] == 'C3-USDT'
+                    else {'sCode': '0', 'ordId': order['instId']}
+                    for order in orders
+                ]}
+
+        trigger_creator = OKXAlgoTrigger.__new__(OKXAlgoTrigger)
+        trigger_creator.order_size = '100'
+        trigger_creator.instrument_rules_cache = {}
+        trigger_creator.trade_api = _BatchTradeAPI()
+        trigger_creator.should_skip_buy_for_yesterday_gain = lambda inst_id: inst_id == 'C5-USDT'
+        trigger_creator.get_instrument_rules = lambda _inst_id: {
+            'tick_sz': Decimal('0.01'), 'lot_sz': Decimal('0.0001'), 'min_sz': Decimal('0.0001'),
+        }
+        orders = [(f'C{i}-USDT', Decimal('10')) for i in range(25)]
+
+        results = trigger_creator._place_limit_buy_orders_batch(orders)
+
+        self.assertEqual([len(batch) for batch in trigger_creator.trade_api.batches], [20, 4])
+        self.assertEqual(trigger_creator.trade_api.batches[0][0]['px'], '10')
+        self.assertEqual(trigger_creator.trade_api.batches[0][0]['sz'], '10')
+        self.assertEqual(results['C3-USDT'], ('C3-USDT', 'Failed to place limit order: 51008: insufficient balance', False))
+        self.assertEqual(results['C5-USDT'], ('C5-USDT', 'Skipped due to yesterday gain above 10%', False))
+        self.assertTrue(OKXAlgoTrigger._is_expected_skip_reason(results['C5-USDT'][1]))
+        self.assertEqual(sum(success for _inst_id, _reason, success in results.values()), 23)
+
+    def test_batch_limit_buys_verify_failed_requests_before_resending(self):
+        class _FlakyTradeAPI:
+            def __init__(self):
+                self.batches = []
+                self.accepted = set()
+                self.lookups = []
+
+            def get_order(self, instId, clOrdId):
+                self.lookups.append(instId)
+                if clOrdId in self.accepted:
+                    # Already filled, so OKX would accept the same clOrdId again
+                    return {'code': '0', 'data': [{'instId': instId, 'clOrdId': clOrdId, 'state': 'filled'}]}
+                return {'code': '51603', 'msg': 'Order does not exist', 'data': []}
+
+            def place_multiple_orders(self, orders):
+                self.batches.append([order['instId'] for order in orders])
+                if len(self.batches) == 1:
+                    # The request reached OKX but the response was lost
+                    self.accepted.update(order['clOrdId'] for order in orders if order['instId'] == 'A-USDT')
+                    raise ConnectionError('connection reset')
+                data = []
+                for order in orders:
+                    if order['instId'] == 'B-USDT' and len(self.batches) == 2:
+                        data.append({'sCode': '50011', 'sMsg': 'Too Many Requests'})
+                    else:
+                        self.accepted.add(order['clOrdId'])
+                        data.append({'sCode': '0', 'ordId': order['instId']})
+                return {'code': '2', 'msg': '', 'data': data}
+
+        trigger_creator = OKXAlgoTrigger.__new__(OKXAlgoTrigger)
+        trigger_creator.order_size = '100'
+        trigger_creator.trade_api = _FlakyTradeAPI()
+        trigger_creator.should_skip_buy_for_yesterday_gain = lambda _inst_id: False
+        trigger_creator.get_instrument_rules = lambda _inst_id: {
+            'tick_sz': Decimal('0.01'), 'lot_sz': Decimal('0.0001'), 'min_sz': Decimal('0.0001'),
+        }
+
+        with patch('create_algo_triggers.time.sleep'):
+            results = trigger_creator._place_limit_buy_orders_batch([('A-USDT', Decimal('10')), ('B-USDT', Decimal('10'))])
+
+        # The filled A is never resent; B is resent after the lookup and again after a transient sCode
+        self.assertEqual(trigger_creator.trade_api.batches, [['A-USDT', 'B-USDT'], ['B-USDT'], ['B-USDT']])
+        self.assertEqual(trigger_creator.trade_api.lookups, ['A-USDT', 'B-USDT'])
+        self.assertEqual(results, {'A-USDT': ('A-USDT', None, True), 'B-USDT': ('B-USDT', None, True)})
+
+        # An order OKX cannot confirm either way is reported failed, not resent
+        trigger_creator.trade_api = _FlakyTradeAPI()
+        trigger_creator.trade_api.get_order = lambda **_kwargs: {'code': '50001', 'msg': 'Service unavailable'}
+        with patch('create_algo_triggers.time.sleep'):
+            results = trigger_creator._place_limit_buy_orders_batch([('A-USDT', Decimal('10'))])
+        self.assertEqual(trigger_creator.trade_api.batches, [['A-USDT']])
+        self.assertEqual(results['A-USDT'], ('A-USDT', 'Failed to place limit order: connection reset', False))
+
+    def test_instrument_store_fetches_all_spot_rules_once_and_persists(self):
+        class _PublicAPI:
+            def __init__(self):
+                self.calls = []
+
+            def get_instruments(self, **kwargs):
+                self.calls.append(kwargs)
+                return {'code': '0', 'data': [
+                    {'instId': 'BTC-USDT', 'tickSz': '0.1', 'lotSz': '0.00001', 'minSz': '0.00001', 'state': 'live'},
+                    {'instId': 'ETH-USDT', 'tickSz': '0.01', 'lotSz': '0.0001', 'minSz': '0.0001', 'state': 'live'},
+                ]}
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'instruments.json')
+            api = _PublicAPI()
+            store = InstrumentRulesStore(path=path, ttl_hours=1)
+
+            self.assertEqual(store.get('BTC-USDT', api)['tickSz'], '0.1')
+            self.assertEqual(store.get('ETH-USDT', api)['lotSz'], '0.0001')
+            self.assertIsNone(store.get('NEW-USDT', api))
+            self.assertEqual(api.calls, [{'instType': 'SPOT'}])
+
+            next_process_api = _PublicAPI()
+            next_store = InstrumentRulesStore(path=path, ttl_hours=1)
+            self.assertEqual(next_store.get('ETH-USDT', next_process_api)['minSz'], '0.0001')
+            self.assertEqual(next_process_api.calls, [])
+
+            # A long-running process retries misses and stale snapshots once per refresh interval
+            with patch('utils_instruments.time.monotonic', return_value=time.monotonic() + 301):
+                self.assertIsNone(store.get('NEW-USDT', api))
+                self.assertIsNone(store.get('NEW-USDT', api))
+            self.assertEqual(len(api.calls), 2)
+            with patch('utils_instruments.time.time', return_value=time.time() + 3601), \
+                    patch('utils_instruments.time.monotonic', return_value=time.monotonic() + 602):
+                self.assertEqual(store.get('BTC-USDT', api)['tickSz'], '0.1')
+            self.assertEqual(len(api.calls), 3)
+
+    def test_database_pool_reuses_connections_and_discards_broken_ones(self):
+        class _PooledConnection:
+            def __init__(self):
+                self.closed = 0
+                self.rollbacks = 0
+                self.status = 0
+
+            def get_transaction_status(self):
+                return self.status
+
+            def rollback(self):
+                self.rollbacks += 1
+                self.status = 0
+
+        class _FakePool:
+            def __init__(self, _minconn, _maxconn, _dsn):
+                self.connects = 0
+                self.idle = []
+                self.closed_on_put = []
+
+            def getconn(self):
+                if self.idle:
+                    return self.idle.pop()
+                self.connects += 1
+                return _PooledConnection()
+
+            def putconn(self, conn, close=False):
+                if close:
+                    self.closed_on_put.append(conn)
+                else:
+                    self.idle.append(conn)
+
+        with patch('lib.database._CountingConnectionPool', _FakePool):
+            pool = database.DatabasePool('postgresql://example', 1, 2)
+
+        with pool.connection() as conn:
+            conn.status = 2  # left inside a transaction
+        self.assertEqual(conn.rollbacks, 1)
+        with pool.connection() as reused:
+            self.assertIs(reused, conn)
+
+        with self.assertRaises(database.psycopg2.OperationalError):
+            with pool.connection():
+                raise database.psycopg2.OperationalError('server closed the connection')
+
+        stats = pool.stats()
+        self.assertEqual(stats['acquisitions'], 3)
+        self.assertEqual(stats['connects'], 1)
+        self.assertEqual(stats['discarded'], 1)
+        self.assertEqual(pool._pool.closed_on_put, [conn])
+
+    def test_database_pool_pings_idle_connections_and_times_out_when_exhausted(self):
+        class _PooledConnection:
+            closed = 0
+            dead = False
+
+            def get_transaction_status(self):
+                return 0
+
+            def rollback(self):
+                pass
+
+            def cursor(self):
+                connection = self
+
+                class _PingCursor:
+                    def __enter__(self):
+                        return self
+
+                    def __exit__(self, *_args):
+                        return False
+
+                    def execute(self, _statement):
+                        if connection.dead:
+                            raise database.psycopg2.OperationalError('server closed the connection unexpectedly')
+                return _PingCursor()
+
+        class _FakePool:
+            def __init__(self, _minconn, _maxconn, _dsn):
+                self.connects = 0
+                self.idle = []
+                self.closed_on_put = []
+
+            def getconn(self):
+                if self.idle:
+                    return self.idle.pop()
+                self.connects += 1
+                return _PooledConnection()
+
+            def putconn(self, conn, close=False):
+                (self.closed_on_put if close else self.idle).append(conn)
+
+        with patch('lib.database._CountingConnectionPool', _FakePool):
+            pool = database.DatabasePool('postgresql://example', 1, 1, acquire_timeout=0.05)
+
+        stale = pool.acquire()
+        pool.release(stale)
+        stale.dead = True  # dropped by the server while idle
+        with patch('lib.database.time.monotonic', return_value=time.monotonic() + 60):
+            fresh = pool.acquire()
+        self.assertIsNot(fresh, stale)
+        self.assertEqual(pool._pool.closed_on_put, [stale])
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+        with self.assertRaises(database.PoolError):
+            pool.acquire()
+        pool.release(fresh)
+        self.assertIs(pool.acquire(), fresh)
+
+    def test_blacklist_queries_borrow_pooled_connections(self):
+        class _DictCursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *_args):
+                return False
+
+            def execute(self, _statement, _params=None):
+                pass
+
+            def fetchall(self):
+                return [{'crypto_symbol': 'LUNA'}]
+
+        class _PooledConnection:
+            def cursor(self, **_kwargs):
+                return _DictCursor()
+
+        borrowed = []
+
+        class _Borrow:
+            def __enter__(self):
+                borrowed.append(True)
+                return _PooledConnection()
+
+            def __exit__(self, *_args):
+                return False
+
+        manager = BlacklistManager.__new__(BlacklistManager)
+        manager.logger = logging.getLogger('test-blacklist')
+        manager.db_config = {'host': 'db', 'port': 5432, 'database': 'd', 'user': 'u', 'password': 'p'}
+        with patch('blacklist_manager.pooled_connection', _Borrow), \
+                patch('blacklist_manager.psycopg2.connect', side_effect=AssertionError('must use pool')):
+            self.assertEqual(manager.get_blacklisted_cryptos(), {'LUNA'})
+            self.assertEqual(manager.get_blacklisted_cryptos(), {'LUNA'})
+        self.assertEqual(len(borrowed), 2)
+
+    def test_delist_tick_checks_and_marks_announcements_in_one_query_each(self):
+        cursor = _Cursor([('Delist spot A_1',)])
+
+        class _Borrow:
+            def __enter__(self):
+                return type('Conn', (_Connection,), {'cursor': lambda _self: type('Ctx', (), {
+                    '__enter__': lambda _s: cursor, '__exit__': lambda _s, *_a: False})()})()
+
+            def __exit__(self, *_args):
+                return False
+
+        manager = BlacklistManager.__new__(BlacklistManager)
+        manager.logger = logging.getLogger('test-blacklist')
+        manager.db_config = {'host': 'db', 'port': 5432, 'database': 'd', 'user': 'u', 'password': 'p'}
+        announcements = [{'title': f'Delist spot {name}', 'pTime': str(p_time), 'url': 'u'}
+                         for name, p_time in (('A', 1), ('B', 2), ('C', 3))]
+
+        monitor = OKXDelistMonitor.__new__(OKXDelistMonitor)
+        monitor.logger = logging.getLogger('test-monitor-delist')
+        monitor.blacklist_manager = manager
+        monitor.ensure_blacklist_manager = lambda: None
+        monitor.log_config_stats = lambda: None
+        monitor.is_recent_announcement = lambda _ann: True
+        monitor.crypto_matcher = type('Matcher', (), {'check_announcement_impact': lambda _self, _ann: (False, set())})()
+        written = []
+        with patch('blacklist_manager.pooled_connection', _Borrow), \
+                patch('blacklist_manager.execute_values', lambda _cur, _sql, rows: written.extend(rows)), \
+                patch('monitor_delist.are_actions_processed', lambda _type, params: [False] * len(params)), \
+                patch('monitor_delist.mark_actions_processed') as mark_actions, patch('builtins.print'):
+            monitor._handle_announcements(announcements)
+
+        self.assertEqual(mark_actions.call_count, 2)  # already processed A, then the info-marked B and C
+        self.assertEqual(len(cursor.executed), 1)
+        self.assertIn('ANY(%s)', cursor.executed[0][0])
+        self.assertEqual(cursor.executed[0][1], (['Delist spot A_1', 'Delist spot B_2', 'Delist spot C_3'],))
+        self.assertEqual([row[0] for row in written], ['Delist spot B_2', 'Delist spot C_3'])
+        self.assertTrue(monitor._found_announcements)
+
+    def test_delist_batch_with_affected_announcement_still_marks_info_announcements(self):
+        class _Blacklist:
+            def __init__(self):
+                self.marked = []
+
+            def get_unprocessed_announcement_ids(self, announcement_ids):
+                return announcement_ids
+
+            def mark_announcement_processed_many(self, rows):
+                self.marked.extend(row['announcement_id'] for row in rows)
+                return True
+
+        announcements = [{'title': f'Delist spot {name}', 'pTime': str(p_time), 'url': 'u'}
+                         for name, p_time in (('AAA', 1), ('B', 2), ('C', 3))]
+        monitor = OKXDelistMonitor.__new__(OKXDelistMonitor)
+        monitor.logger = logging.getLogger('test-monitor-delist')
+        monitor.blacklist_manager = _Blacklist()
+        monitor.ensure_blacklist_manager = lambda: None
+        monitor.log_config_stats = lambda: None
+        monitor.is_recent_announcement = lambda _ann: True
+        monitor.crypto_matcher = type('Matcher', (), {'check_announcement_impact': lambda _self, ann: (
+            ('AAA' in ann['title']), {'AAA'} if 'AAA' in ann['title'] else set())})()
+        protected = []
+        monitor.send_protection_alert = lambda ann, affected: protected.append((ann['title'], affected)) or True
+        with patch('monitor_delist.are_actions_processed', lambda _type, params: [False] * len(params)), \
+                patch('monitor_delist.mark_actions_processed') as mark_actions, patch('builtins.print'):
+            monitor._handle_announcements(announcements)
+
+        self.assertEqual(protected, [('Delist spot AAA', {'AAA'})])
+        self.assertEqual(monitor.blacklist_manager.marked, ['Delist spot B_2', 'Delist spot C_3'])
+        mark_actions.assert_called_once_with('delist_announcement', [
+            {'announcement_id': 'Delist spot B_2'}, {'announcement_id': 'Delist spot C_3'}])
+
+    def test_delist_crawl_state_prefers_the_database(self):
+        class _Blacklist:
+            def __init__(self):
+                self.states = {}
+
+            def get_crawl_state(self, name):
+                return self.states.get(name, {})
+
+            def save_crawl_state(self, name, state):
+                self.states[name] = state
+                return True
+
+        monitor = OKXDelistMonitor.__new__(OKXDelistMonitor)
+        monitor.logger = logging.getLogger('test-monitor-delist')
+        monitor.blacklist_manager = _Blacklist()
+        monitor.ensure_blacklist_manager = lambda: None
+        with tempfile.TemporaryDirectory() as tmpdir, patch.dict(os.environ, {'DATABASE_URL': 'postgresql://db/x'}):
+            monitor.state_path = os.path.join(tmpdir, 'state.json')
+            monitor.save_crawl_state({'newest_ptime': 5})
+            os.remove(monitor.state_path)  # a fresh cron container has no local file
+            self.assertEqual(monitor.load_crawl_state(), {'newest_ptime': 5})
+
+    def test_trade_timestamps_are_stored_as_integers_for_typed_schema(self):
+        fetcher = OKXFilledOrdersFetcher.__new__(OKXFilledOrdersFetcher)
+        row = fetcher.prepare_trade_data({
+            'instId': 'BTC-USDT', 'ordId': '1', 'tradeId': '2', 'fillPx': '100',
+            'fillSz': '1', 'side': 'buy', 'ts': '1700000000000',
+        })
+        self.assertEqual(row[7], 1700000000000)
+        self.assertEqual(row[-1], 1700000000000 + 24 * 60 * 60 * 1000)
+
+        class MigrationCursor(_Cursor):
+            def fetchall(self):
+                return [('ts', 'text'), ('sell_time', 'bigint')]
+
+            def fetchone(self):
+                return (3,)
+
+        cursor = MigrationCursor([])
+        statements = migrate_filled_orders.migrate(cursor, logging.getLogger(__name__), dry_run=True)
+        alters = [statement for statement in statements if 'ALTER COLUMN' in statement]
+        self.assertEqual(len(alters), 1)
+        self.assertIn('ALTER COLUMN ts TYPE BIGINT', alters[0])
+        self.assertEqual(
+            len(statements),
+            1 + len(migrate_filled_orders.ADDED_COLUMNS) + len(migrate_filled_orders.FILLED_ORDERS_INDEXES),
+        )
+        self.assertFalse(any(statement in statements for statement, _ in cursor.executed))
+
+    def test_migration_creates_filled_orders_on_a_fresh_database(self):
+        class FreshCursor(_Cursor):
+            def fetchall(self):
+                return [('ts', 'bigint'), ('sell_time', 'bigint')]
+
+            def fetchone(self):
+                return (None,)
+
+        cursor = FreshCursor([])
+        migrate_filled_orders.migrate(cursor, logging.getLogger(__name__))
+        executed = [' '.join(statement.split()) for statement, _ in cursor.executed]
+        self.assertTrue(executed[1].startswith('CREATE TABLE IF NOT EXISTS filled_orders'))
+        self.assertFalse(any('ALTER COLUMN' in statement for statement in executed))
+        self.assertIn('ALTER TABLE filled_orders ADD COLUMN IF NOT EXISTS sell_client_order_id TEXT', executed)
+        self.assertEqual(executed[-1], 'ANALYZE filled_orders')
+
+    def test_daemon_schedule_mirrors_worker_crons_and_isolates_job_exits(self):
+        from datetime import datetime, timezone
+
+        def at(hour, minute):
+            return datetime(2025, 9, 15, hour, minute, tzinfo=timezone.utc)
+
+        self.assertEqual(
+            [script for script, _ in trading_daemon.jobs_for_minute(at(3, 6))],
+            ['monitor_delist', 'cancel_pending_limits', 'fetch_filled_orders'],
+        )
+        self.assertEqual(trading_daemon.jobs_for_minute(at(15, 55)), [
+            ('auto_sell_orders', {'verify_daily_close': True}),
+            ('cancel_pending_triggers', {'verify_daily_close': True}),
+        ])
+        self.assertEqual(trading_daemon.jobs_for_minute(at(16, 10)), [('fetch_filled_orders', {'force_db': True})])
+        self.assertEqual(trading_daemon.jobs_for_minute(at(16, 7)), [])
+
+        daemon = trading_daemon.TradingDaemon(okx_client=object())
+        calls = []
+
+        def exits(_options):
+            raise SystemExit(1)
+
+        daemon._run_cancel_pending_triggers = exits
+        daemon._run_create_algo_triggers = lambda options: calls.append(options)
+        failed = daemon.run_jobs([('cancel_pending_triggers', {}), ('create_algo_triggers', {})])
+        self.assertEqual(failed, ['cancel_pending_triggers'])
+        self.assertEqual(calls, [{}])
+
+    def test_fill_ingestion_pages_back_to_billid_cursor_and_advances_it(self):
+        import time as time_module
+        now_ms = int(time_module.time() * 1000)
+        # 250 fills newest first; billIds increase with time, every third is a sell
+        fills = [
+            {'billId': str(1000 + i), 'tradeId': str(5000 + i), 'ts': str(now_ms - (250 - i) * 1000),
+             'side': 'sell' if i % 3 == 0 else 'buy', 'instId': 'BTC-USDT'}
+            for i in reversed(range(250))
+        ]
+
+        class PagedTradeAPI:
+            def __init__(self):
+                self.calls = []
+
+            def get_fills(self, **kwargs):
+                self.calls.append(kwargs)
+                after = int(kwargs.get('after') or 10 ** 9)
+                older = [fill for fill in fills if int(fill['billId']) < after]
+                return {'code': '0', 'data': older[:int(kwargs['limit'])]}
+
+            def get_fills_history(self, **_kwargs):
+                raise AssertionError('recent cursor must use get_fills')
+
+        fetcher = OKXFilledOrdersFetcher.__new__(OKXFilledOrdersFetcher)
+        fetcher.trade_api = PagedTradeAPI()
+        fetcher.ensure_database_initialized = lambda: None
+        cursor_fill = next(fill for fill in fills if fill['billId'] == '1020')
+        fetcher.get_fill_cursor = lambda: (1020, int(cursor_fill['ts']))
+        saved_cursors, saved_pages = [], []
+        fetcher.save_fill_cursor = lambda bill_id, ts: saved_cursors.append((bill_id, ts))
+        fetcher.save_trades_batch = lambda trades: saved_pages.append(trades) or (len(trades), 0)
+        protection_checks = []
+        fetcher.check_and_cancel_triggers_if_needed = lambda: protection_checks.append(True)
+
+        fetcher.fetch_and_save_filled_trades()
+
+        saved = [trade for page in saved_pages for trade in page]
+        expected = [fill for fill in fills if int(fill['billId']) > 1020 and fill['side'] == 'buy']
+        self.assertEqual(saved, expected)
+        self.assertEqual(len(saved_pages), 3)
+        self.assertEqual([call.get('after') for call in fetcher.trade_api.calls], [None, '1150', '1050'])
+        self.assertEqual(saved_cursors, [(1249, int(fills[0]['ts']))])
+        self.assertEqual(protection_checks, [True])
+
+    def test_position_checks_share_one_balance_snapshot_until_invalidated(self):
+        from okx_client import invalidate_balance_snapshot
+
+        class CountingBalanceAPI(_BalanceAPI):
+            calls = 0
+
+            def get_account_balance(self, **kwargs):
+                self.last_kwargs = kwargs
+                CountingBalanceAPI.calls += 1
+                return self.result
+
+        account_api = CountingBalanceAPI({
+            'code': '0',
+            'data': [{'details': [
+                {'ccy': 'BTC', 'eqUsd': '25', 'availBal': '0.001', 'eq': '0.001'},
+                {'ccy': 'USDT', 'eqUsd': '100', 'availBal': '100', 'eq': '100'},
+            ]}],
+        })
+        client = _OKXClientWithAccount(account_api)
+
+        fetcher = OKXFilledOrdersFetcher.__new__(OKXFilledOrdersFetcher)
+        fetcher.ensure_database_initialized = lambda: None
+        fetcher.cursor = _Cursor([('BTC-USDT',), ('ETH-USDT',), ('SOL-USDT',)])
+        fetcher.conn = _Connection()
+        fetcher.okx_client = client
+        fetcher.auto_mark_manual_sells()
+
+        seller = AutoSellOrders.__new__(AutoSellOrders)
+        seller.logger = logging.getLogger('test-auto-sell')
+        seller.min_usd_value = 0.01
+        seller.okx_client = client
+        self.assertTrue(seller.has_significant_non_usdt_assets())
+        self.assertEqual(seller.get_available_balance('BTC-USDT'), (0.001, 25.0, 25.0, False, True))
+        self.assertEqual(CountingBalanceAPI.calls, 1)
+        self.assertEqual(account_api.last_kwargs, {})
+
+        invalidate_balance_snapshot(account_api)
+        self.assertFalse(seller.get_available_balance('ETH-USDT')[4])
+        self.assertEqual(CountingBalanceAPI.calls, 2)
+
+    def test_fill_and_sold_writes_notify_listeners_inside_their_transaction(self):
+        import json
+        import socket
+        from types import SimpleNamespace
+
+        class RecordingConnection(_Connection):
+            def __init__(self, cursor):
+                self.cursor = cursor
+
+            def commit(self):
+                self.cursor.executed.append(('COMMIT', None))
+
+            def rollback(self):
+                self.cursor.executed.append(('ROLLBACK', None))
+
+        fetcher = OKXFilledOrdersFetcher.__new__(OKXFilledOrdersFetcher)
+        fetcher.ensure_database_initialized = lambda: None
+        fetcher.cursor = _Cursor([])
+        fetcher.conn = RecordingConnection(fetcher.cursor)
+        # The real execute_values needs a live connection (encoding, mogrify)
+        with patch('fetch_filled_orders.execute_values',
+                   lambda cursor, statement, rows, page_size=None: cursor.execute(statement, rows)):
+            self.assertEqual(fetcher.save_trades_batch([
+                {'instId': 'BTC-USDT', 'ordId': '1', 'tradeId': '1', 'fillPx': '1', 'fillSz': '1', 'side': 'buy', 'ts': '1'},
+                {'instId': 'ETH-USDT', 'ordId': '2', 'tradeId': '2', 'fillPx': '1', 'fillSz': '1', 'side': 'sell', 'ts': '1'},
+            ]), (2, 0))
+        statements = [statement for statement, _params in fetcher.cursor.executed]
+        self.assertEqual(statements[-2:], ['SELECT pg_notify(%s, %s)', 'COMMIT'])
+        channel, payload = fetcher.cursor.executed[-2][1]
+        self.assertEqual((channel, json.loads(payload)), (database.FILLS_CHANNEL, {'instIds': ['BTC-USDT']}))
+
+        seller = AutoSellOrders.__new__(AutoSellOrders)
+        seller.logger = logging.getLogger('test-auto-sell')
+        seller.cursor = _Cursor([])
+        seller.cursor.executemany = seller.cursor.execute
+        seller.conn = RecordingConnection(seller.cursor)
+        self.assertEqual(seller.mark_trades_as_sold_batch(['trade-1']), 1)
+        self.assertEqual(seller.cursor.executed[-2][1][0], database.SOLD_CHANNEL)
+        self.assertEqual(seller.cursor.executed[-1][0], 'COMMIT')
+
+        # The listener blocks in select() on the connection socket and decodes payloads
+        reader, writer = socket.socketpair()
+        self.addCleanup(reader.close)
+        self.addCleanup(writer.close)
+
+        class ListenConnection:
+            notifies = []
+
+            def fileno(self):
+                return reader.fileno()
+
+            def poll(self):
+                reader.recv(1)
+                self.notifies.append(SimpleNamespace(channel=database.FILLS_CHANNEL, payload='{"instIds": ["BTC-USDT"]}'))
+
+        listener = database.NotificationListener()
+        listener.conn = ListenConnection()
+        self.assertEqual(listener.poll(timeout=0.01), [])
+        writer.send(b'x')
+        self.assertEqual(listener.poll(timeout=1), [(database.FILLS_CHANNEL, {'instIds': ['BTC-USDT']})])
+
+    def test_rate_limiter_throttles_only_after_endpoint_burst(self):
+        limiter = RateLimiter(limits={'place_order': (2, 0.2)}, safety_factor=1.0)
+        api = rate_limited(_TradeAPI({'code': '0', 'data': [{'sCode': '0'}]}), limiter)
+
+        for _ in range(3):
+            api.place_order(instId='BTC-USDT')
+
+        stats = limiter.get_stats()['place_order']
+        self.assertEqual(stats['calls'], 3)
+        self.assertEqual(stats['throttled_calls'], 1)
+        self.assertGreater(stats['wait_seconds'], 0)
+        self.assertEqual(api.last_place_order_kwargs, {'instId': 'BTC-USDT'})
+
+    def test_rate_limiter_uses_separate_bucket_per_endpoint(self):
+        limiter = RateLimiter(limits={'place_order': (1, 10.0), 'get_order': (1, 10.0)}, safety_factor=1.0)
+
+        self.assertEqual(limiter.acquire('place_order'), 0.0)
+        self.assertEqual(limiter.acquire('get_order'), 0.0)
+        self.assertGreater(limiter._get_bucket('place_order').reserve(), 0)
 
 
 if __name__ == '__main__':
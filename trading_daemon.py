@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Resident Trading Daemon
+Runs the cron jobs from cloudflare-worker.js in a single long-lived process
+instead of one GitHub Actions job per tick. All jobs share one OKXClient, the
+database pool, the rate limiter and warm caches, so a tick starts in
+milliseconds rather than after a runner cold start.
+
+The Cloudflare Worker + GitHub Actions path remains the default deployment;
+run this only on a host where it is the sole scheduler (never both at once).
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import logging.handlers
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+
+# Load environment variables first
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+from okx_client import OKXClient
+from utils_rate_limit import get_rate_limiter
+from lib.database import log_pool_stats, close_database_pool
+
+# Same table and order as CRON_SCRIPTS in cloudflare-worker.js (UTC)
+CRON_SCRIPTS = [
+    ("1,6,11,16,21,26,31,36,41,46,51,56 * * * *", ['monitor_delist', 'cancel_pending_limits', 'fetch_filled_orders']),
+    ("0,15,30,45 * * * *", ['auto_sell_orders']),
+    ("55 15 * * *", ['auto_sell_orders', 'cancel_pending_triggers']),
+    ("5 16 * * *", ['create_algo_triggers']),
+    ("10 16 * * *", ['fetch_filled_orders']),
+]
+
+# Per-cron flags the worker sends as force_db_fetch / verify_daily_close
+CRON_JOB_OPTIONS = {
+    "55 15 * * *": {'verify_daily_close': True},
+    "10 16 * * *": {'force_db': True},
+}
+
+SUPPORTED_SCRIPTS = (
+    'monitor_delist', 'cancel_pending_limits', 'fetch_filled_orders',
+    'auto_sell_orders', 'cancel_pending_triggers', 'create_algo_triggers',
+)
+
+# Missed minutes older than this are dropped instead of replayed after a stall
+MAX_CATCH_UP_MINUTES = 30
+
+CRON_FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+
+def setup_logging():
+    """Setup logging with file rotation"""
+    log_filename = f"trading_daemon_{datetime.now().strftime('%Y%m%d')}.log"
+
+    # Create logs directory if it doesn't exist
+    os.makedirs('logs', exist_ok=True)
+    log_path = os.path.join('logs', log_filename)
+
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    logger.handlers.clear()
+
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    # File handler with rotation (max 10MB, keep 5 backups)
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_path,
+        maxBytes=10*1024*1024,
+        backupCount=5,
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(formatter)
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+
+    return logger
+
+logger = setup_logging()
+
+
+def parse_cron_field(field, low, high):
+    """Expand one cron field (``*``, lists, ``a-b`` ranges, ``/step``) to a set of values"""
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(v) for v in part.split('-', 1))
+        else:
+            start = end = int(part)
+        if start < low or end > high or step < 1:
+            raise ValueError(f"Cron field out of range: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def cron_matches(expression, dt):
+    """Return True when the 5-field cron ``expression`` fires at UTC minute ``dt``"""
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"Expected 5 cron fields: {expression}")
+    minutes, hours, days, months, weekdays = (
+        parse_cron_field(field, low, high)
+        for field, (low, high) in zip(fields, CRON_FIELD_RANGES)
+    )
+    if dt.minute not in minutes or dt.hour not in hours or dt.month not in months:
+        return False
+    day_match = dt.day in days
+    weekday_match = dt.isoweekday() % 7 in weekdays
+    # Standard cron: when both day fields are restricted, either may match
+    if fields[2] != '*' and fields[4] != '*':
+        return day_match or weekday_match
+    return day_match and weekday_match
+
+
+def jobs_for_minute(dt):
+    """Return [(script, options)] scheduled at ``dt``, in CRON_SCRIPTS order"""
+    jobs = []
+    for expression, scripts in CRON_SCRIPTS:
+        if cron_matches(expression, dt):
+            options = CRON_JOB_OPTIONS.get(expression, {})
+            jobs.extend((script, dict(options)) for script in scripts)
+    return jobs
+
+
+class TradingDaemon:
+    """Serial in-process scheduler for the trading scripts"""
+
+    def __init__(self, okx_client=None):
+        self.okx_client = okx_client or OKXClient(logger)
+        self.stop_event = threading.Event()
+        self.job_stats = {}
+
+        # Job objects are created lazily and reused across ticks
+        self._monitor = None
+        self._limit_manager = None
+        self._fetcher = None
+        self._seller = None
+        self._trigger_manager = None
+        self.fill_stream = None
+        self._fill_stream_thread = None
+        self.sell_scheduler = None
+        self._sell_scheduler_thread = None
+        self.protection_listener = None
+        self._protection_fetcher = None
+        # The fill listener thread and the scheduled jobs that cancel triggers
+        # or run delist protection must not act on the same orders at once
+        self.protection_lock = threading.Lock()
+
+    def start_fill_stream(self, run_protection=True):
+        """Run fill_stream.py's WebSocket subscriber in a background thread.
+
+        With ``run_protection=False`` the stream only persists fills and
+        leaves protection to the NOTIFY listener its commits wake.
+        """
+        from fetch_filled_orders import OKXFilledOrdersFetcher
+        from fill_stream import OKXFillStream
+        # Own fetcher (and DB connection): jobs on the main thread must not share its cursor
+        self.fill_stream = OKXFillStream(
+            fetcher=OKXFilledOrdersFetcher(okx_client=self.okx_client),
+            protection_lock=self.protection_lock, run_protection=run_protection,
+        )
+        self._fill_stream_thread = threading.Thread(target=self.fill_stream.run, name='fill-stream', daemon=True)
+        self._fill_stream_thread.start()
+        logger.info("⚡ Fill stream started")
+
+    def start_sell_scheduler(self):
+        """Sell lots at their exact sell_time in a background thread; the cron pass stays as a safety net"""
+        from auto_sell_orders import AutoSellOrders
+        # Own seller (and DB connection), for the same reason as the fill stream
+        self.sell_scheduler = AutoSellOrders(okx_client=self.okx_client)
+        self._sell_scheduler_thread = threading.Thread(
+            target=self.sell_scheduler.run_sell_scheduler, kwargs={'listen': True},
+            name='sell-scheduler', daemon=True,
+        )
+        self._sell_scheduler_thread.start()
+        logger.info("🗓️ Sell scheduler started")
+
+    def start_protection_listener(self):
+        """Run the 3-position trigger protection as soon as any process commits new buy fills"""
+        from fetch_filled_orders import OKXFilledOrdersFetcher
+        from lib.database import NotificationListener, FILLS_CHANNEL
+        self._protection_fetcher = OKXFilledOrdersFetcher(okx_client=self.okx_client)
+        self.protection_listener = NotificationListener(channels=(FILLS_CHANNEL,), logger=logger)
+        threading.Thread(
+            target=self.protection_listener.run, args=(self._protect_after_fills,),
+            name='protection-listener', daemon=True,
+        ).start()
+        logger.info("🛡️ Protection listener started")
+
+    def _protect_after_fills(self, notifications):
+        # One protection pass per wakeup, however many fill batches were committed
+        instruments = sorted({inst_id for _channel, payload in notifications for inst_id in payload.get('instIds', [])})
+        logger.info(f"🔔 New buy fills committed: {', '.join(instruments) or 'unknown'}")
+        with self.protection_lock:
+            try:
+                self._protection_fetcher.check_and_cancel_triggers_if_needed()
+            except Exception as e:
+                logger.error(f"❌ Protection after new fills failed: {e}")
+            finally:
+                self._protection_fetcher.close()
+
+    def _run_monitor_delist(self, options):
+        from monitor_delist import OKXDelistMonitor
+        if self._monitor is None:
+            self._monitor = OKXDelistMonitor(okx_client=self.okx_client)
+        with self.protection_lock:
+            try:
+                self._monitor.run_once()
+            finally:
+                self._monitor.close()
+        return True
+
+    def _run_cancel_pending_limits(self, options):
+        from cancel_pending_limits import OKXLimitOrderManager
+        if self._limit_manager is None:
+            self._limit_manager = OKXLimitOrderManager(okx_client=self.okx_client)
+        return self._limit_manager.cancel_all_pending_limits(side=options.get('side', 'buy'))
+
+    def _run_fetch_filled_orders(self, options):
+        from fetch_filled_orders import OKXFilledOrdersFetcher, run_fetch_cycle
+        if self._fetcher is None:
+            self._fetcher = OKXFilledOrdersFetcher(okx_client=self.okx_client)
+        # Fetch cycles end with the same trigger protection the listener runs
+        with self.protection_lock:
+            try:
+                run_fetch_cycle(self._fetcher, force_db=options.get('force_db', False))
+            finally:
+                self._fetcher.close()
+        return True
+
+    def _run_auto_sell_orders(self, options):
+        from auto_sell_orders import AutoSellOrders
+        if self._seller is None:
+            self._seller = AutoSellOrders(okx_client=self.okx_client)
+        try:
+            self._seller.process_sell_orders(verify_daily_close=options.get('verify_daily_close', False))
+        finally:
+            self._seller.close()
+        return True
+
+    def _run_cancel_pending_triggers(self, options):
+        from cancel_pending_triggers import OKXOrderManager
+        if self._trigger_manager is None:
+            self._trigger_manager = OKXOrderManager(okx_client=self.okx_client)
+        return self._trigger_manager.cancel_all_pending_triggers()
+
+    def _run_create_algo_triggers(self, options):
+        from create_algo_triggers import OKXAlgoTrigger
+        # Fresh instance per run: its price/candle cache is only valid for one day
+        trigger_creator = OKXAlgoTrigger(
+            order_size=os.getenv('OKX_ORDER_SIZE', '100'),
+            okx_client=self.okx_client,
+        )
+        return trigger_creator.process_limits_from_database()
+
+    def run_job(self, script, options=None):
+        """Run one job, isolating its failure from the rest of the tick"""
+        handler = getattr(self, f'_run_{script}', None)
+        if script not in SUPPORTED_SCRIPTS or handler is None:
+            logger.error(f"❌ Unknown script: {script}")
+            return False
+
+        start = time.monotonic()
+        logger.info(f"▶️  {script} {options or ''}".rstrip())
+        try:
+            succeeded = handler(options or {}) is not False
+        except SystemExit as e:
+            # Some scripts exit on fatal configuration errors; never let that stop the daemon
+            succeeded = e.code in (0, None)
+        except Exception as e:
+            logger.error(f"❌ {script} failed: {e}")
+            logger.debug(f"Traceback: {traceback.format_exc()}")
+            succeeded = False
+
+        duration = time.monotonic() - start
+        stats = self.job_stats.setdefault(script, {'runs': 0, 'failures': 0, 'seconds': 0.0})
+        stats['runs'] += 1
+        stats['seconds'] += duration
+        if not succeeded:
+            stats['failures'] += 1
+        logger.info(f"{'✅' if succeeded else '❌'} {script} finished in {duration:.2f}s")
+        return succeeded
+
+    def run_jobs(self, jobs):
+        """Run jobs serially (like the workflow's concurrency group); returns failed scripts"""
+        failed = []
+        for script, options in jobs:
+            if self.stop_event.is_set():
+                break
+            if not self.run_job(script, options):
+                failed.append(script)
+
+        limiter = get_rate_limiter()
+        limiter.log_stats(logger)
+        limiter.reset_stats()
+        return failed
+
+    def run_forever(self):
+        """Fire jobs at the start of every matching UTC minute until stopped"""
+        logger.info("🚀 Trading daemon started (UTC schedule from cloudflare-worker.js)")
+        next_minute = datetime.now(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+        while not self.stop_event.is_set():
+            wait = (next_minute - datetime.now(timezone.utc)).total_seconds()
+            if wait > 0 and self.stop_event.wait(wait):
+                break
+
+            # Replay minutes missed while a long tick was running; each script
+            # runs once per replay even if several missed ticks scheduled it
+            now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+            oldest = max(next_minute, now - timedelta(minutes=MAX_CATCH_UP_MINUTES))
+            if oldest > next_minute:
+                logger.warning(f"⚠️ Dropping ticks from {next_minute:%H:%M} to {oldest:%H:%M} UTC")
+
+            jobs = []
+            minute = oldest
+            while minute <= now:
+                for job in jobs_for_minute(minute):
+                    if job not in jobs:
+                        jobs.append(job)
+                minute += timedelta(minutes=1)
+            next_minute = now + timedelta(minutes=1)
+
+            if jobs:
+                logger.info(f"🕐 Tick {now:%Y-%m-%d %H:%M} UTC: {', '.join(script for script, _ in jobs)}")
+                self.run_jobs(jobs)
+
+        logger.info("⏹️  Trading daemon stopped")
+
+    def stop(self, *_args):
+        self.stop_event.set()
+        if self.fill_stream:
+            self.fill_stream.stop()
+        if self.sell_scheduler:
+            self.sell_scheduler.stop()
+        if self.protection_listener:
+            self.protection_listener.stop()
+
+    def close(self):
+        if self.fill_stream:
+            self.fill_stream.stop()
+            self._fill_stream_thread.join(timeout=10)
+        if self.sell_scheduler:
+            self.sell_scheduler.stop()
+            self._sell_scheduler_thread.join(timeout=10)
+            self.sell_scheduler.close()
+        if self.protection_listener:
+            self.protection_listener.stop()
+        for script, stats in sorted(self.job_stats.items()):
+            logger.info(
+                f"📊 {script}: {stats['runs']} runs, {stats['failures']} failed, "
+                f"{stats['seconds']:.1f}s total"
+            )
+        log_pool_stats(logger)
+        close_database_pool()
+
+
+def main():
+    """Main function"""
+    import argparse
+    parser = argparse.ArgumentParser(description='Run the trading cron jobs in one resident process')
+    parser.add_argument('--run', type=str, default=None,
+                        help='Comma-separated scripts to run once and exit (e.g. fetch_filled_orders,auto_sell_orders)')
+    parser.add_argument('--force-db', action='store_true', help='With --run: force the DB-backed fetch_filled_orders flow')
+    parser.add_argument('--verify-daily-close', action='store_true', help='With --run: verify daily close in auto_sell_orders')
+    parser.add_argument('--fill-stream', action='store_true',
+                        help='Also persist fills in real time from the OKX orders WebSocket (see fill_stream.py)')
+    parser.add_argument('--sell-scheduler', action='store_true',
+                        help='Also sell each lot as soon as its sell_time is reached (see auto_sell_orders.py --scheduler)')
+    parser.add_argument('--protection-listener', action='store_true',
+                        help='Also run trigger protection on every new-fill NOTIFY from any ingesting process')
+    args = parser.parse_args()
+
+    daemon = None
+    exit_code = 0
+    try:
+        daemon = TradingDaemon()
+        signal.signal(signal.SIGTERM, daemon.stop)
+
+        if args.run:
+            options = {'force_db': args.force_db, 'verify_daily_close': args.verify_daily_close}
+            scripts = [s.strip() for s in args.run.split(',') if s.strip()]
+            if daemon.run_jobs([(script, options) for script in scripts]):
+                exit_code = 1
+        else:
+            if args.fill_stream:
+                # The listener already protects after every fill the stream commits
+                daemon.start_fill_stream(run_protection=not args.protection_listener)
+            if args.sell_scheduler:
+                daemon.start_sell_scheduler()
+            if args.protection_listener:
+                daemon.start_protection_listener()
+            daemon.run_forever()
+    except KeyboardInterrupt:
+        logger.info("⏹️  Daemon interrupted by user")
+    except Exception as e:
+        logger.error(f"❌ Daemon failed: {e}")
+        logger.debug(f"Traceback: {traceback.format_exc()}")
+        exit_code = 1
+    finally:
+        if daemon:
+            daemon.close()
+        sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Local candle store
+Append-only, fixed-width binary file per instrument and bar (timestamp + OHLCV as
+little-endian int64/float64), read through mmap.  Once a file holds the
+requested history, each sync only fetches bars newer than the last stored
+timestamp, so backtests, the limits optimizer and the trigger filters read
+history locally instead of re-downloading it.  Only confirmed (closed) candles
+are stored, without gaps.
+"""
+
+import mmap
+import os
+import struct
+import time
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from utils_time import get_today_start_sgt_timestamp_ms
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CANDLE_STORE_DIR = os.path.join('cache', 'candles')
+DEFAULT_SYNC_DAYS = 365
+
+# OKX '1D' bars open at 00:00 UTC+8, the same day boundary as SGT
+CANDLE_BAR = '1D'
+BAR_MS = 24 * 60 * 60 * 1000
+# Intraday bars (UTC-aligned) used by the backtester
+BAR_DURATIONS_MS = {
+    '1m': 60 * 1000,
+    '5m': 5 * 60 * 1000,
+    '15m': 15 * 60 * 1000,
+    '1H': 60 * 60 * 1000,
+    '4H': 4 * 60 * 60 * 1000,
+    CANDLE_BAR: BAR_MS,
+}
+
+# ts (ms), open, high, low, close, volume
+RECORD = struct.Struct('<q5d')
+RECORD_FIELDS = ('ts', 'open', 'high', 'low', 'close', 'volume')
+
+CANDLES_PAGE_LIMIT = 100
+
+Candle = Tuple[int, float, float, float, float, float]
+
+
+def okx_rows_to_candles(rows: Sequence[Sequence[Any]]) -> List[Candle]:
+    """Confirmed OKX candle rows (any order, strings) -> records sorted oldest first"""
+    candles = {}
+    for row in rows:
+        # row: [ts, o, h, l, c, vol, volCcy, volCcyQuote, confirm]
+        if len(row) >= 9 and row[8] != '1':
+            continue
+        try:
+            candles[int(row[0])] = (int(row[0]), *(float(value) for value in row[1:6]))
+        except (TypeError, ValueError, IndexError):
+            continue
+    return [candles[ts] for ts in sorted(candles)]
+
+
+class CandleStore:
+    """Process-wide directory of per-instrument candle files for one bar size."""
+
+    def __init__(self, root: Optional[str] = None, bar: str = CANDLE_BAR):
+        if bar not in BAR_DURATIONS_MS:
+            raise ValueError(f"Unsupported candle bar: {bar}")
+        self.root = root or os.getenv('OKX_CANDLE_STORE_DIR', DEFAULT_CANDLE_STORE_DIR)
+        self.bar = bar
+        self.bar_ms = BAR_DURATIONS_MS[bar]
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        # Instruments whose backfill reached the start of OKX's history this process
+        self._history_exhausted: Set[str] = set()
+
+    def path(self, inst_id: str) -> str:
+        return os.path.join(self.root, f"{inst_id}.{self.bar}.bin")
+
+    def _lock(self, inst_id: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(inst_id, threading.Lock())
+
+    def _read_bytes(self, inst_id: str, limit: Optional[int] = None) -> bytes:
+        """Copy the last ``limit`` complete records out of the mapped file"""
+        try:
+            with open(self.path(inst_id), 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                # A torn append leaves a partial trailing record; ignore it
+                count = size // RECORD.size
+                if count == 0:
+                    return b''
+                start = 0 if limit is None else max(0, count - limit) * RECORD.size
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return mapped[start:count * RECORD.size]
+        except FileNotFoundError:
+            return b''
+
+    def count(self, inst_id: str) -> int:
+        try:
+            return os.path.getsize(self.path(inst_id)) // RECORD.size
+        except OSError:
+            return 0
+
+    def first_ts(self, inst_id: str) -> Optional[int]:
+        try:
+            with open(self.path(inst_id), 'rb') as f:
+                data = f.read(RECORD.size)
+        except FileNotFoundError:
+            return None
+        return RECORD.unpack(data)[0] if len(data) == RECORD.size else None
+
+    def last_ts(self, inst_id: str) -> Optional[int]:
+        data = self._read_bytes(inst_id, limit=1)
+        return RECORD.unpack(data)[0] if data else None
+
+    def _wanted_bars(self, max_days: int) -> int:
+        return max(1, max_days * BAR_MS // self.bar_ms)
+
+    def has_history(self, inst_id: str, max_days: int = DEFAULT_SYNC_DAYS) -> bool:
+        """True when both the stored bar count and span cover ``max_days`` (or all listed history)"""
+        if inst_id in self._history_exhausted:
+            return True
+        first, last = self.first_ts(inst_id), self.last_ts(inst_id)
+        if first is None or last is None:
+            return False
+        wanted = self._wanted_bars(max_days)
+        return self.count(inst_id) >= wanted and (last - first) // self.bar_ms + 1 >= wanted
+
+    def read(self, inst_id: str, limit: Optional[int] = None) -> List[Candle]:
+        """Stored candles, oldest first (the most recent ``limit`` if given)"""
+        return list(RECORD.iter_unpack(self._read_bytes(inst_id, limit)))
+
+    def read_array(self, inst_id: str, limit: Optional[int] = None):
+        """NumPy structured array over the stored records"""
+        import numpy as np
+        dtype = np.dtype([('ts', '<i8')] + [(field, '<f8') for field in RECORD_FIELDS[1:]])
+        return np.frombuffer(self._read_bytes(inst_id, limit), dtype=dtype)
+
+    def append(self, inst_id: str, candles: Sequence[Candle]) -> int:
+        """Append candles newer than the last stored one; returns the number written"""
+        with self._lock(inst_id):
+            last = self.last_ts(inst_id)
+            new = [candle for candle in sorted(candles) if last is None or candle[0] > last]
+            # Drop duplicates within the batch
+            new = [candle for index, candle in enumerate(new) if index == 0 or candle[0] != new[index - 1][0]]
+            if not new:
+                return 0
+            os.makedirs(self.root, exist_ok=True)
+            path = self.path(inst_id)
+            with open(path, 'ab') as f:
+                # Trim a torn record from an interrupted append before writing
+                complete = (f.tell() // RECORD.size) * RECORD.size
+                if f.tell() != complete:
+                    f.truncate(complete)
+                f.write(b''.join(RECORD.pack(*candle) for candle in new))
+            return len(new)
+
+    def merge(self, inst_id: str, candles: Sequence[Candle]) -> int:
+        """Merge bars older and newer than the stored ones; the file is rewritten and swapped in atomically"""
+        with self._lock(inst_id):
+            merged = {candle[0]: tuple(candle) for candle in candles}
+            stored = self.read(inst_id)
+            merged.update((candle[0], candle) for candle in stored)
+            added = len(merged) - len(stored)
+            if not added:
+                return 0
+            os.makedirs(self.root, exist_ok=True)
+            path = self.path(inst_id)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(b''.join(RECORD.pack(*merged[ts]) for ts in sorted(merged)))
+            os.replace(tmp_path, path)
+            return added
+
+    def append_okx_rows(self, inst_id: str, rows: Sequence[Sequence[Any]]) -> int:
+        """Record the confirmed bars of a get_candlesticks response already fetched for other purposes.
+
+        Only extends a file ``sync`` already created, and only when the bars
+        continue it without a gap; anything else is left for the next sync.
+        """
+        last = self.last_ts(inst_id)
+        if last is None:
+            return 0
+        new = [candle for candle in okx_rows_to_candles(rows) if candle[0] > last]
+        if not new or new[0][0] != last + self.bar_ms:
+            return 0
+        try:
+            return self.append(inst_id, new)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not store candles for {inst_id}: {e}")
+            return 0
+
+    def is_current(self, inst_id: str) -> bool:
+        """True when the latest closed bar (yesterday's for daily bars) is stored"""
+        last = self.last_ts(inst_id)
+        if last is None:
+            return False
+        if self.bar == CANDLE_BAR:
+            return last >= get_today_start_sgt_timestamp_ms() - BAR_MS
+        return last >= (int(time.time() * 1000) // self.bar_ms - 1) * self.bar_ms
+
+    def sync(self, inst_id: str, market_api, max_days: int = DEFAULT_SYNC_DAYS) -> int:
+        """Fetch only bars newer than the last stored one, backfilling to ``max_days`` of history first.
+
+        Pages newest -> oldest: get_candlesticks for the first page, then
+        get_history_candlesticks for anything older.  No request is made when
+        the store already holds the latest closed bar and enough history.
+        """
+        backfill = not self.has_history(inst_id, max_days)
+        if not backfill and self.is_current(inst_id):
+            return 0
+        last = None if backfill else self.last_ts(inst_id)
+        wanted = self._wanted_bars(max_days)
+        rows = []
+        after = None
+        fetch = market_api.get_candlesticks
+        while True:
+            params = {'instId': inst_id, 'bar': self.bar, 'limit': str(CANDLES_PAGE_LIMIT)}
+            if after:
+                params['after'] = after
+            result = fetch(**params)
+            if not result or result.get('code') != '0':
+                raise RuntimeError(f"OKX candles error for {inst_id}: {(result or {}).get('msg', 'empty response')}")
+            page = result.get('data') or []
+            rows.extend(page)
+            if len(page) < CANDLES_PAGE_LIMIT:
+                if backfill:
+                    self._history_exhausted.add(inst_id)
+                break
+            if last is not None and int(page[-1][0]) <= last:
+                break
+            if backfill and len(rows) >= wanted:
+                break
+            after = page[-1][0]
+            fetch = market_api.get_history_candlesticks
+        candles = okx_rows_to_candles(rows)
+        if backfill:
+            # Whole pages overshoot; keep just the requested window
+            stored = self.merge(inst_id, candles[-wanted:])
+        else:
+            stored = self.append(inst_id, candles)
+        logger.debug(f"📈 {inst_id} | Stored {stored} new {self.bar} candle(s)")
+        return stored
+
+
+# Global store instances, one per bar size
+_candle_stores: Dict[str, CandleStore] = {}
+_candle_store_lock = threading.Lock()
+
+
+def get_candle_store(bar: str = CANDLE_BAR) -> CandleStore:
+    """Get the process-wide candle store for ``bar``"""
+    with _candle_store_lock:
+        if bar not in _candle_stores:
+            _candle_stores[bar] = CandleStore(bar=bar)
+        return _candle_stores[bar]
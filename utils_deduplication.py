@@ -1,27 +1,98 @@
 """
 去重/幂等机制工具模块
 防止定时任务重试导致的重复执行
+每次 cron 运行都是新进程，因此记录写入 PostgreSQL（dedup_actions 表），
+进程内字典只作为热缓存。
 """
+import os
 import json
 import time
 import hashlib
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, Set, Optional
+from typing import Any, Dict, Iterable, List, Set, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+class PostgresDedupStore:
+    """持久化去重存储：以 MD5 动作ID为主键，按 expires_at 过期"""
+
+    def __init__(self):
+        self._table_ready = False
+        self._lock = threading.Lock()
+
+    def _ensure_table(self, conn):
+        """首次使用时建表，并顺带清理过期记录（独立事务，提交成功后才标记就绪）"""
+        if self._table_ready:
+            return
+        with self._lock:
+            if self._table_ready:
+                return
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS dedup_actions (
+                            action_id CHAR(32) PRIMARY KEY,
+                            action_type VARCHAR(64) NOT NULL,
+                            processed_at BIGINT NOT NULL,
+                            expires_at BIGINT NOT NULL
+                        )
+                    ''')
+                    cursor.execute('CREATE INDEX IF NOT EXISTS idx_dedup_actions_expires_at ON dedup_actions (expires_at)')
+                    cursor.execute('DELETE FROM dedup_actions WHERE expires_at <= %s', (int(time.time() * 1000),))
+                conn.commit()
+            except Exception:
+                # 建表回滚后下次调用重试
+                conn.rollback()
+                raise
+            self._table_ready = True
+
+    def get_many(self, action_ids: List[str], now_ms: int) -> Dict[str, int]:
+        """一次查询返回未过期的 {action_id: processed_at}"""
+        from lib.database import pooled_connection
+        with pooled_connection() as conn:
+            self._ensure_table(conn)
+            with conn.cursor() as cursor:
+                cursor.execute('''
+                    SELECT action_id, processed_at FROM dedup_actions
+                    WHERE action_id = ANY(%s) AND expires_at > %s
+                ''', (list(action_ids), now_ms))
+                rows = cursor.fetchall()
+            conn.commit()
+        return {action_id: int(processed_at) for action_id, processed_at in rows}
+
+    def put_many(self, action_ids: List[str], action_type: str, processed_ms: int, expires_ms: int):
+        """一条多行 INSERT 写入或刷新多条记录"""
+        from psycopg2.extras import execute_values
+        from lib.database import pooled_connection
+        rows = [(action_id, action_type[:64], processed_ms, expires_ms) for action_id in sorted(set(action_ids))]
+        with pooled_connection() as conn:
+            self._ensure_table(conn)
+            with conn.cursor() as cursor:
+                execute_values(cursor, '''
+                    INSERT INTO dedup_actions (action_id, action_type, processed_at, expires_at)
+                    VALUES %s
+                    ON CONFLICT (action_id) DO UPDATE
+                    SET processed_at = EXCLUDED.processed_at, expires_at = EXCLUDED.expires_at
+                ''', rows, page_size=len(rows))
+            conn.commit()
+
+
 class DeduplicationManager:
     """去重管理器"""
     
-    def __init__(self, ttl_hours: int = 48):
+    def __init__(self, ttl_hours: int = 48, store: Optional[PostgresDedupStore] = None):
         """
         初始化去重管理器
         
         Args:
             ttl_hours (int): 去重记录存活时间（小时）
+            store (PostgresDedupStore, optional): 持久化存储；为None时仅在进程内去重
         """
         self.ttl_hours = ttl_hours
+        self.store = store
         self.processed_actions: Dict[str, float] = {}  # action_id -> timestamp
         self.cleanup_threshold = 1000  # 清理阈值
         
@@ -68,20 +139,50 @@ class DeduplicationManager:
         Returns:
             bool: 是否已处理
         """
-        action_id = self._generate_action_id(action_type, **kwargs)
+        return self.is_processed_many(action_type, [kwargs])[0]
+    
+    def _cached(self, action_id: str, current_time: float) -> bool:
+        """热缓存命中且未过期"""
+        timestamp = self.processed_actions.get(action_id)
+        if timestamp is None:
+            return False
+        if current_time - timestamp <= self.ttl_hours * 3600:
+            return True
+        # 过期了，删除记录
+        del self.processed_actions[action_id]
+        return False
+    
+    def is_processed_many(self, action_type: str, params_list: Iterable[Dict[str, Any]]) -> List[bool]:
+        """
+        批量检查动作是否已处理（缓存未命中的部分只查询一次数据库）
+        
+        Args:
+            action_type (str): 动作类型
+            params_list: 每个动作的参数字典
+            
+        Returns:
+            List[bool]: 与 params_list 顺序一致的结果
+        """
+        action_ids = [self._generate_action_id(action_type, **params) for params in params_list]
         current_time = time.time()
+        missing = [action_id for action_id in action_ids if not self._cached(action_id, current_time)]
         
-        # 检查是否存在且未过期
-        if action_id in self.processed_actions:
-            timestamp = self.processed_actions[action_id]
-            if current_time - timestamp <= self.ttl_hours * 3600:
-                logger.info(f"Action already processed: {action_type} - {action_id}")
-                return True
-            else:
-                # 过期了，删除记录
-                del self.processed_actions[action_id]
+        if missing and self.store is not None:
+            try:
+                found = self.store.get_many(sorted(set(missing)), int(current_time * 1000))
+                for action_id, processed_ms in found.items():
+                    self.processed_actions[action_id] = processed_ms / 1000.0
+            except Exception as e:
+                # 存储不可用时按未处理返回，由调用方的权威检查兜底
+                logger.warning(f"Dedup store lookup failed, using in-memory records only: {e}")
         
-        return False
+        results = []
+        for action_id in action_ids:
+            processed = action_id in self.processed_actions
+            if processed:
+                logger.info(f"Action already processed: {action_type} - {action_id}")
+            results.append(processed)
+        return results
     
     def mark_processed(self, action_type: str, **kwargs) -> str:
         """
@@ -94,14 +195,39 @@ class DeduplicationManager:
         Returns:
             str: 动作ID
         """
-        action_id = self._generate_action_id(action_type, **kwargs)
-        self.processed_actions[action_id] = time.time()
+        return self.mark_processed_many(action_type, [kwargs])[0]
+    
+    def mark_processed_many(self, action_type: str, params_list: Iterable[Dict[str, Any]]) -> List[str]:
+        """
+        批量标记动作为已处理（持久化存储只写一次）
+        
+        Args:
+            action_type (str): 动作类型
+            params_list: 每个动作的参数字典
+            
+        Returns:
+            List[str]: 与 params_list 顺序一致的动作ID
+        """
+        action_ids = [self._generate_action_id(action_type, **params) for params in params_list]
+        if not action_ids:
+            return []
+        current_time = time.time()
+        for action_id in action_ids:
+            self.processed_actions[action_id] = current_time
+        
+        if self.store is not None:
+            try:
+                processed_ms = int(current_time * 1000)
+                self.store.put_many(action_ids, action_type, processed_ms, processed_ms + self.ttl_hours * 3600 * 1000)
+            except Exception as e:
+                logger.warning(f"Dedup store write failed, records kept in memory only: {e}")
         
         # 定期清理
         self._cleanup_expired()
         
-        logger.info(f"Marked action as processed: {action_type} - {action_id}")
-        return action_id
+        for action_id in action_ids:
+            logger.info(f"Marked action as processed: {action_type} - {action_id}")
+        return action_ids
     
     def get_run_key(self, cron_expression: str, timestamp: Optional[str] = None) -> str:
         """
@@ -123,16 +249,25 @@ class DeduplicationManager:
 _dedup_manager = None
 
 def get_dedup_manager() -> DeduplicationManager:
-    """获取全局去重管理器实例"""
+    """获取全局去重管理器实例（配置了 DATABASE_URL 时使用 PostgreSQL 持久化，DEDUP_BACKEND=memory 可关闭）"""
     global _dedup_manager
     if _dedup_manager is None:
-        _dedup_manager = DeduplicationManager()
+        persistent = os.getenv('DATABASE_URL') and os.getenv('DEDUP_BACKEND', 'postgres').lower() != 'memory'
+        _dedup_manager = DeduplicationManager(store=PostgresDedupStore() if persistent else None)
     return _dedup_manager
 
 def is_action_processed(action_type: str, **kwargs) -> bool:
     """检查动作是否已处理的便捷函数"""
     return get_dedup_manager().is_processed(action_type, **kwargs)
 
+def are_actions_processed(action_type: str, params_list: Iterable[Dict[str, Any]]) -> List[bool]:
+    """批量检查动作是否已处理的便捷函数"""
+    return get_dedup_manager().is_processed_many(action_type, params_list)
+
 def mark_action_processed(action_type: str, **kwargs) -> str:
     """标记动作为已处理的便捷函数"""
     return get_dedup_manager().mark_processed(action_type, **kwargs)
+
+def mark_actions_processed(action_type: str, params_list: Iterable[Dict[str, Any]]) -> List[str]:
+    """批量标记动作为已处理的便捷函数"""
+    return get_dedup_manager().mark_processed_many(action_type, params_list)
@@ -0,0 +1,129 @@
+"""
+OKX spot instrument metadata store
+Loads tickSz/lotSz/minSz for every spot instrument with a single
+get_instruments(instType='SPOT') call and persists them to a local JSON file,
+so each cron process reads precision rules with a dict lookup instead of one
+metadata request per instrument.
+"""
+
+import json
+import os
+import threading
+import time
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INSTRUMENT_CACHE_PATH = os.path.join('cache', 'okx_spot_instruments.json')
+DEFAULT_INSTRUMENT_CACHE_TTL_HOURS = 24.0
+# A stale snapshot or unknown instId triggers at most one refresh per interval,
+# so a long-running process still picks up new listings and rule changes
+DEFAULT_INSTRUMENT_REFRESH_INTERVAL_SECONDS = 300.0
+
+# Fields kept per instrument; values stay as the exchange's decimal strings
+INSTRUMENT_FIELDS = ('tickSz', 'lotSz', 'minSz', 'state')
+
+
+class InstrumentRulesStore:
+    """Process-wide, file-backed map of spot instId -> precision rules."""
+
+    def __init__(self, path: Optional[str] = None, ttl_hours: Optional[float] = None,
+                 refresh_interval_seconds: float = DEFAULT_INSTRUMENT_REFRESH_INTERVAL_SECONDS):
+        self.path = path or os.getenv('OKX_INSTRUMENT_CACHE_PATH', DEFAULT_INSTRUMENT_CACHE_PATH)
+        self.ttl_seconds = 3600 * float(
+            ttl_hours if ttl_hours is not None
+            else os.getenv('OKX_INSTRUMENT_CACHE_TTL_HOURS', DEFAULT_INSTRUMENT_CACHE_TTL_HOURS)
+        )
+        self.instruments: Dict[str, Dict[str, str]] = {}
+        self.fetched_at = 0.0
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self._loaded = False
+        self._last_refresh_attempt: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """Read the persisted snapshot once per process."""
+        self._loaded = True
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            self.instruments = payload.get('instruments', {})
+            self.fetched_at = float(payload.get('fetched_at', 0))
+            logger.debug(f"📦 Loaded {len(self.instruments)} spot instruments from {self.path}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable instrument cache {self.path}: {e}")
+            self.instruments = {}
+            self.fetched_at = 0.0
+
+    def _save(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'fetched_at': self.fetched_at, 'instruments': self.instruments}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not persist instrument cache to {self.path}: {e}")
+
+    def is_fresh(self) -> bool:
+        return bool(self.instruments) and time.time() - self.fetched_at < self.ttl_seconds
+
+    def refresh(self, api) -> bool:
+        """Replace the snapshot with one get_instruments(instType='SPOT') call."""
+        if not api or not hasattr(api, 'get_instruments'):
+            logger.warning("⚠️ No API with get_instruments; cannot refresh instrument cache")
+            return False
+        try:
+            result = api.get_instruments(instType='SPOT')
+            if not result or result.get('code') != '0' or not result.get('data'):
+                logger.warning(f"⚠️ Failed to load spot instruments: {result.get('msg') if result else 'empty response'}")
+                return False
+            self.instruments = {
+                item['instId']: {field: item.get(field, '') for field in INSTRUMENT_FIELDS}
+                for item in result['data'] if item.get('instId')
+            }
+            self.fetched_at = time.time()
+            self._save()
+            logger.info(f"📦 Cached {len(self.instruments)} spot instruments")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Error refreshing spot instrument cache: {e}")
+            return False
+
+    def get(self, inst_id: str, api=None) -> Optional[Dict[str, Any]]:
+        """Return the raw rules for ``inst_id``, refreshing at most once per refresh interval.
+
+        A stale snapshot is still used when the refresh fails, since precision
+        rules change rarely and the caller has its own fallback for ``None``.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            needs_refresh = not self.is_fresh() or inst_id not in self.instruments
+            now = time.monotonic()
+            refresh_due = (self._last_refresh_attempt is None
+                           or now - self._last_refresh_attempt >= self.refresh_interval_seconds)
+            if needs_refresh and refresh_due and api is not None:
+                self._last_refresh_attempt = now
+                self.refresh(api)
+            return self.instruments.get(inst_id)
+
+
+# Global store instance
+_instrument_store = None
+_instrument_store_lock = threading.Lock()
+
+
+def get_instrument_store() -> InstrumentRulesStore:
+    """Get the process-wide instrument rules store"""
+    global _instrument_store
+    if _instrument_store is None:
+        with _instrument_store_lock:
+            if _instrument_store is None:
+                _instrument_store = InstrumentRulesStore()
+    return _instrument_store
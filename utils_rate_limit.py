@@ -0,0 +1,201 @@
+"""
+OKX rate limiting utilities
+Per-endpoint token buckets shared by every OKX client in the process, so
+scripts run at the highest rate the exchange allows instead of sleeping for
+a fixed worst-case interval before every request.
+"""
+
+import threading
+import time
+import logging
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Documented OKX v5 limits: (requests, window seconds).  Trade endpoints are
+# limited per user ID, public market endpoints per IP.
+OKX_ENDPOINT_LIMITS: Dict[str, Tuple[int, float]] = {
+    # Trade
+    'place_order': (60, 2.0),
+    'place_multiple_orders': (300, 2.0),
+    'cancel_order': (60, 2.0),
+    'cancel_multiple_orders': (300, 2.0),
+    'get_order': (60, 2.0),
+    'get_order_list': (60, 2.0),
+    'get_orders_history': (40, 2.0),
+    'get_orders_history_archive': (20, 2.0),
+    'get_fills': (60, 2.0),
+    'get_fills_history': (10, 2.0),
+    'place_algo_order': (20, 2.0),
+    'cancel_algo_order': (20, 2.0),
+    'order_algos_list': (20, 2.0),
+    'order_algos_history': (20, 2.0),
+    # Account
+    'get_account_balance': (10, 2.0),
+    # Market / public data
+    'get_ticker': (20, 2.0),
+    'get_tickers': (20, 2.0),
+    'get_candlesticks': (40, 2.0),
+    'get_history_candlesticks': (20, 2.0),
+    'get_instruments': (20, 2.0),
+    # Support (called over plain HTTP by monitor_delist)
+    'get_announcements': (5, 2.0),
+}
+
+# Conservative limit for SDK methods not listed above.
+DEFAULT_ENDPOINT_LIMIT: Tuple[int, float] = (10, 2.0)
+
+# Stay slightly below the documented ceiling to absorb clock skew between
+# our buckets and the exchange's sliding windows.
+RATE_LIMIT_SAFETY_FACTOR = 0.9
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    ``acquire`` reserves a token immediately (the balance may go negative)
+    and sleeps outside the lock, so concurrent callers queue fairly instead
+    of spinning.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Reserve tokens and return how long the caller must wait (seconds)."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self.updated_at
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+            self.updated_at = now
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.refill_per_second
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until tokens are available; return the time spent waiting."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RateLimiter:
+    """Registry of per-endpoint token buckets with throttling counters."""
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[int, float]]] = None,
+                 default_limit: Tuple[int, float] = DEFAULT_ENDPOINT_LIMIT,
+                 safety_factor: float = RATE_LIMIT_SAFETY_FACTOR):
+        self.limits = dict(OKX_ENDPOINT_LIMITS if limits is None else limits)
+        self.default_limit = default_limit
+        self.safety_factor = safety_factor
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _get_bucket(self, endpoint: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(endpoint)
+            if bucket is None:
+                requests, window = self.limits.get(endpoint, self.default_limit)
+                capacity = max(1.0, requests * self.safety_factor)
+                bucket = TokenBucket(capacity, capacity / window)
+                self._buckets[endpoint] = bucket
+                self._stats[endpoint] = {'calls': 0, 'throttled_calls': 0, 'wait_seconds': 0.0}
+            return bucket
+
+    def acquire(self, endpoint: str, tokens: float = 1.0) -> float:
+        """Wait for capacity on ``endpoint`` and record the throttled time."""
+        waited = self._get_bucket(endpoint).acquire(tokens)
+        with self._lock:
+            stats = self._stats[endpoint]
+            stats['calls'] += 1
+            if waited > 0:
+                stats['throttled_calls'] += 1
+                stats['wait_seconds'] += waited
+        return waited
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Return a copy of per-endpoint counters."""
+        with self._lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._stats.items()}
+
+    def total_wait_seconds(self) -> float:
+        with self._lock:
+            return sum(stats['wait_seconds'] for stats in self._stats.values())
+
+    def log_stats(self, log: Optional[logging.Logger] = None):
+        """Log how many calls each endpoint made and how long they were throttled."""
+        log = log or logger
+        stats = self.get_stats()
+        if not stats:
+            return
+        total_calls = int(sum(s['calls'] for s in stats.values()))
+        log.info(
+            f"🚦 OKX rate limiter: {total_calls} calls, "
+            f"{self.total_wait_seconds():.2f}s spent throttled"
+        )
+        for endpoint, s in sorted(stats.items()):
+            if s['throttled_calls']:
+                log.info(
+                    f"   {endpoint}: {int(s['calls'])} calls, "
+                    f"{int(s['throttled_calls'])} throttled ({s['wait_seconds']:.2f}s)"
+                )
+
+    def reset_stats(self):
+        with self._lock:
+            for stats in self._stats.values():
+                stats.update(calls=0, throttled_calls=0, wait_seconds=0.0)
+
+
+class RateLimitedAPI:
+    """Proxy around an OKX SDK API object that rate limits every public method.
+
+    Each method name is its own endpoint bucket, which matches how the SDK
+    maps one method to one REST path.
+    """
+
+    def __init__(self, api, limiter: 'RateLimiter'):
+        self._api = api
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        limiter = self._limiter
+
+        def rate_limited(*args, **kwargs):
+            limiter.acquire(name)
+            return attr(*args, **kwargs)
+
+        rate_limited.__name__ = name
+        return rate_limited
+
+
+# Global limiter shared by all clients in the process (OKX limits are per account)
+_global_rate_limiter = None
+_global_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the process-wide rate limiter instance"""
+    global _global_rate_limiter
+    if _global_rate_limiter is None:
+        with _global_rate_limiter_lock:
+            if _global_rate_limiter is None:
+                _global_rate_limiter = RateLimiter()
+    return _global_rate_limiter
+
+
+def rate_limited(api, limiter: Optional[RateLimiter] = None):
+    """Wrap an SDK API object with the shared limiter (``None`` passes through)."""
+    if api is None:
+        return None
+    return RateLimitedAPI(api, limiter or get_rate_limiter())
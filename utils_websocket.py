@@ -0,0 +1,240 @@
+"""
+Minimal WebSocket (RFC 6455) client utilities
+Standard-library only (socket/ssl), enough for OKX's JSON text channels:
+client handshake, masked text frames, ping/pong, close and fragmented
+messages.  The frame helpers are shared with the local test server.
+"""
+
+import base64
+import hashlib
+import os
+import socket
+import ssl
+import struct
+import logging
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+# OKX pushes are small JSON documents; refuse anything absurd
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+
+
+class WebSocketError(Exception):
+    """Protocol or handshake failure"""
+
+
+class WebSocketClosed(WebSocketError):
+    """The peer closed the connection"""
+
+
+def websocket_accept_key(key: str) -> str:
+    """Expected Sec-WebSocket-Accept value for a Sec-WebSocket-Key"""
+    digest = hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+def encode_frame(opcode: int, payload: bytes = b'', mask: bool = True, fin: bool = True) -> bytes:
+    """Encode one frame; clients must mask, servers must not"""
+    header = bytearray([(0x80 if fin else 0) | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack('!H', length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack('!Q', length)
+    if not mask:
+        return bytes(header) + payload
+    mask_key = os.urandom(4)
+    masked = bytes(b ^ mask_key[i % 4] for i, b in enumerate(payload))
+    return bytes(header) + mask_key + masked
+
+
+def decode_frame(buffer: bytearray) -> Optional[Tuple[bool, int, bytes, int]]:
+    """Parse one frame from ``buffer``.
+
+    Returns ``(fin, opcode, payload, consumed)`` or ``None`` when the buffer
+    does not yet hold a complete frame.
+    """
+    if len(buffer) < 2:
+        return None
+    fin = bool(buffer[0] & 0x80)
+    opcode = buffer[0] & 0x0F
+    masked = bool(buffer[1] & 0x80)
+    length = buffer[1] & 0x7F
+    offset = 2
+    if length == 126:
+        if len(buffer) < offset + 2:
+            return None
+        length = struct.unpack('!H', bytes(buffer[offset:offset + 2]))[0]
+        offset += 2
+    elif length == 127:
+        if len(buffer) < offset + 8:
+            return None
+        length = struct.unpack('!Q', bytes(buffer[offset:offset + 8]))[0]
+        offset += 8
+    if length > MAX_MESSAGE_BYTES:
+        raise WebSocketError(f"Frame of {length} bytes exceeds limit")
+    mask_key = b''
+    if masked:
+        if len(buffer) < offset + 4:
+            return None
+        mask_key = bytes(buffer[offset:offset + 4])
+        offset += 4
+    if len(buffer) < offset + length:
+        return None
+    payload = bytes(buffer[offset:offset + length])
+    if masked:
+        payload = bytes(b ^ mask_key[i % 4] for i, b in enumerate(payload))
+    return fin, opcode, payload, offset + length
+
+
+class WebSocketConnection:
+    """Blocking WebSocket client connection for text messages"""
+
+    def __init__(self, url: str, timeout: float = 10.0, ssl_context: Optional[ssl.SSLContext] = None):
+        self.url = url
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.sock = None
+        self._buffer = bytearray()
+        self._fragments = []
+
+    def connect(self) -> 'WebSocketConnection':
+        parts = urlsplit(self.url)
+        if parts.scheme not in ('ws', 'wss'):
+            raise WebSocketError(f"Unsupported WebSocket URL: {self.url}")
+        secure = parts.scheme == 'wss'
+        host = parts.hostname
+        port = parts.port or (443 if secure else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        sock = socket.create_connection((host, port), timeout=self.timeout)
+        try:
+            if secure:
+                context = self.ssl_context or ssl.create_default_context()
+                sock = context.wrap_socket(sock, server_hostname=host)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            key = base64.b64encode(os.urandom(16)).decode('ascii')
+            host_header = host if parts.port is None else f"{host}:{port}"
+            request = (
+                f"GET {path} HTTP/1.1\r\n"
+                f"Host: {host_header}\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {key}\r\n"
+                "Sec-WebSocket-Version: 13\r\n"
+                "\r\n"
+            )
+            sock.sendall(request.encode('ascii'))
+            self.sock = sock
+            self._read_handshake(key)
+        except Exception:
+            sock.close()
+            self.sock = None
+            raise
+        return self
+
+    def _read_handshake(self, key: str):
+        while b'\r\n\r\n' not in self._buffer:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise WebSocketError("Connection closed during handshake")
+            self._buffer += chunk
+            if len(self._buffer) > 65536:
+                raise WebSocketError("Handshake response too large")
+        head, _, rest = bytes(self._buffer).partition(b'\r\n\r\n')
+        self._buffer = bytearray(rest)
+
+        lines = head.decode('latin-1').split('\r\n')
+        status = lines[0].split(' ', 2)
+        if len(status) < 2 or status[1] != '101':
+            raise WebSocketError(f"WebSocket upgrade rejected: {lines[0]}")
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('sec-websocket-accept') != websocket_accept_key(key):
+            raise WebSocketError("Invalid Sec-WebSocket-Accept in handshake response")
+
+    def send_frame(self, opcode: int, payload: bytes = b''):
+        if self.sock is None:
+            raise WebSocketClosed("WebSocket is not connected")
+        self.sock.sendall(encode_frame(opcode, payload, mask=True))
+
+    def send_text(self, text: str):
+        self.send_frame(OPCODE_TEXT, text.encode('utf-8'))
+
+    def recv(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Return the next text message, or ``None`` if ``timeout`` elapses first.
+
+        Control frames are handled here: pings are answered, a close frame
+        raises ``WebSocketClosed``.
+        """
+        if self.sock is None:
+            raise WebSocketClosed("WebSocket is not connected")
+        self.sock.settimeout(timeout)
+        while True:
+            frame = decode_frame(self._buffer)
+            if frame is None:
+                try:
+                    chunk = self.sock.recv(65536)
+                except socket.timeout:
+                    # Partial frames stay buffered for the next call
+                    return None
+                if not chunk:
+                    self.close()
+                    raise WebSocketClosed("Connection closed by peer")
+                self._buffer += chunk
+                continue
+
+            fin, opcode, payload, consumed = frame
+            del self._buffer[:consumed]
+
+            if opcode == OPCODE_PING:
+                self.send_frame(OPCODE_PONG, payload)
+            elif opcode == OPCODE_PONG:
+                continue
+            elif opcode == OPCODE_CLOSE:
+                code = struct.unpack('!H', payload[:2])[0] if len(payload) >= 2 else None
+                self.close()
+                raise WebSocketClosed(f"Connection closed by peer (code {code})")
+            elif opcode in (OPCODE_TEXT, OPCODE_BINARY, OPCODE_CONTINUATION):
+                self._fragments.append(payload)
+                if fin:
+                    message = b''.join(self._fragments)
+                    self._fragments = []
+                    return message.decode('utf-8')
+            else:
+                raise WebSocketError(f"Unsupported opcode {opcode}")
+
+    def close(self):
+        if self.sock is None:
+            return
+        try:
+            self.sock.sendall(encode_frame(OPCODE_CLOSE, struct.pack('!H', 1000), mask=True))
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        finally:
+            self.sock = None
+            self._buffer = bytearray()
+            self._fragments = []